@@ -0,0 +1,68 @@
+"""
+Counts how many `FuseNumber`s and `RuntimeResult`s the interpreter makes per run, and times the run.
+
+Run with `python -m bench.allocations`.
+"""
+import time
+
+from core.classes.fuse_classes.number import FuseNumber
+from core.interpreter import Interpreter, Context, SymbolTable, RuntimeResult
+from core.lexer import RegexLexer
+from core.parser import Parser
+
+workloads = {
+    "arithmetic": "var a = 1+(3*2)^3\nvar b = a*2-a/4\nvar c = (a+b)*(a-b)/(b+1)\nc",
+    "comparisons": "var x = 5\nif x < 3 then 1 elif x == 4 then 2 elif x >= 5 and x != 7 then 3 else 4",
+    "variables": "var x = 2\nvar y = x\nvar z = y\nx + y + z + x + y + z",
+}
+
+
+class Counter:
+    """
+    Wraps a class's `__init__` to count how many instances get made.
+    """
+    def __init__(self, cls):
+        self.cls = cls
+        self.count = 0
+        self.original = cls.__init__
+
+    def __enter__(self):
+        original = self.original
+
+        def counting_init(instance, *args, **kwargs):
+            self.count += 1
+            original(instance, *args, **kwargs)
+        self.cls.__init__ = counting_init
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cls.__init__ = self.original
+
+
+def make_context():
+    context = Context("<bench>")
+    context.symbol_table = SymbolTable()
+    context.symbol_table.set("false", FuseNumber(0), True)
+    context.symbol_table.set("true", FuseNumber(1), True)
+    return context
+
+
+def main(number=5000):
+    print(f"{'workload':<14}{'FuseNumbers':>12}{'results':>10}{'time':>12}")
+    for name, text in workloads.items():
+        node = Parser(RegexLexer("<bench>", text).parse()[0]).parse().node
+        interpreter = Interpreter()
+        context = make_context()
+
+        with Counter(FuseNumber) as numbers, Counter(RuntimeResult) as results:
+            interpreter.visit(node, context)
+
+        start = time.perf_counter()
+        for _ in range(number):
+            interpreter.visit(node, context)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<14}{numbers.count:>12}{results.count:>10}{elapsed / number * 1e6:>10.1f}us")
+
+
+if __name__ == '__main__':
+    main()
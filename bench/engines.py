@@ -0,0 +1,49 @@
+"""
+Compares the tree-walking `Interpreter` against the `Compiler` and `VM` engines on already-parsed programs.
+
+Run with `python -m bench.engines`.
+"""
+import timeit
+
+from core.bytecode import BytecodeCompiler
+from core.compiler import Compiler
+from core.interpreter import Interpreter, Context, SymbolTable, FuseNumber
+from core.lexer import Lexer
+from core.parser import Parser
+from core.vm import VM
+
+workloads = {
+    "arithmetic": "var a = 1+(3*2)^3\nvar b = a*2-a/4\nvar c = (a+b)*(a-b)/(b+1)\nc",
+    "comparisons": "var x = 5\nif x < 3 then 1 elif x == 4 then 2 elif x >= 5 and x < 7 then 3 else 4",
+    "long chain": "var x = 2\n" + "+".join(["x*3"] * 200),
+    "if ladder": "var x = 150\n" + "if x == 0 then 0 " + " ".join(f"elif x == {i} then {i}" for i in range(1, 200)) + " else -1",
+}
+
+
+def make_context():
+    context = Context("<bench>")
+    context.symbol_table = SymbolTable()
+    context.symbol_table.set("false", FuseNumber(0), True)
+    context.symbol_table.set("true", FuseNumber(1), True)
+    return context
+
+
+def main(number=2000):
+    print(f"{'workload':<14}{'interpreter':>14}{'compiled':>14}{'vm':>14}")
+    for name, text in workloads.items():
+        node = Parser(Lexer("<bench>", text).parse()[0]).parse().node
+        program = Compiler().compile(node)
+        code = BytecodeCompiler().compile(node)
+        interpreter = Interpreter()
+        vm = VM()
+
+        timings = [
+            min(timeit.repeat(lambda: interpreter.visit(node, make_context()), number=number, repeat=3)),
+            min(timeit.repeat(lambda: program.execute(make_context()), number=number, repeat=3)),
+            min(timeit.repeat(lambda: vm.execute(code, make_context()), number=number, repeat=3)),
+        ]
+        print(f"{name:<14}" + "".join(f"{timing / number * 1e6:>12.1f}us" for timing in timings))
+
+
+if __name__ == '__main__':
+    main()
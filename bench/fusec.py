@@ -0,0 +1,60 @@
+"""
+Compares getting a program's AST by lexing and parsing its source against loading it from a `.fusec` file, and the
+sizes of the two.
+
+Run with `python -m bench.fusec [lines]`.
+"""
+import statistics
+import sys
+import time
+
+from core.lexer import RegexLexer
+from core.parser import Parser
+from core.serializer import dumps, loads, equivalent
+
+templates = [
+    "var v{i} = {i} * 3 + (base - 2.5) / 4",
+    "if base > {i} then base - {i} elif base == 0 then 1 else 2 ^ 3",
+    "for k = 0 to 3 step 1 then var base = base + -k",
+    "while not (base > {i}) then var base = base + 1",
+    "const c{i} = 2",
+]
+
+
+def make_text(count):
+    lines = (templates[i % len(templates)].format(i=i) for i in range(count))
+    return "var base = 1\n" + "\n".join(lines)
+
+
+def parse(text):
+    return Parser(RegexLexer("<bench>", text).parse()[0]).parse().node
+
+
+def median_time(func, number):
+    times = []
+    for _ in range(number):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 10_000
+    text = make_text(count)
+    node = parse(text)
+    data = dumps(node)
+    assert equivalent(node, loads(data))
+
+    parse_time = median_time(lambda: parse(text), 5)
+    load_time = median_time(lambda: loads(data), 5)
+    print(f"{count:,} lines")
+    print(f"{'':<14}{'time':>12}{'size':>12}")
+    print(f"{'lex + parse':<14}{parse_time * 1e3:>10.1f}ms{len(text.encode()) / 1e3:>10.1f}kB")
+    print(f"{'load .fusec':<14}{load_time * 1e3:>10.1f}ms{len(data) / 1e3:>10.1f}kB")
+    print(f"loading is {parse_time / load_time:.1f}x faster")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Compares a one-character edit to a big `Document` against lexing and parsing the whole file again, and against lexing
+and parsing one line of it.
+
+Run with `python -m bench.incremental [lines]`.
+"""
+import statistics
+import sys
+import time
+
+from core.document import Document
+from core.lexer import RegexLexer
+from core.parser import Parser
+
+templates = [
+    "var v{i} = {i} * 3 + (v{j} - 2) / 4",
+    "if v{j} > {i} then v{j} - {i} elif v{j} == 0 then 1 else 2 ^ 3",
+    "for k = 0 to {i} step 2 then var v{i} = v{i} + k",
+    "",
+]
+
+
+def make_text(count):
+    return "\n".join(templates[i % len(templates)].format(i=i, j=max(i - 4, 0)) for i in range(count))
+
+
+def parse(text):
+    tokens, error = RegexLexer("<bench>", text).parse()
+    return Parser(tokens).parse()
+
+
+def median_time(func, number):
+    times = []
+    for _ in range(number):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 50_000
+    text = make_text(count)
+
+    full = median_time(lambda: parse(text), 3)
+    one_line = median_time(lambda: parse(templates[0].format(i=count // 2, j=count // 2 - 4)), 200)
+    start = time.perf_counter()
+    document = Document("<bench>", text)
+    build = time.perf_counter() - start
+
+    line = count // 2 - count // 2 % len(templates)  # an assignment
+    edits = iter(range(10 ** 9))
+
+    def edit():
+        letter = "abcdefghij"[next(edits) % 10]
+        document.edit(line, 4, line, 5, letter)  # renames the variable
+
+    one_edit = median_time(edit, 200)
+    edit_and_parse = median_time(lambda: (edit(), document.parse()), 20)
+    assert document.parse().error is None
+
+    print(f"{count:,} lines")
+    print(f"{'full lex + parse':<28}{full * 1e3:>12.3f}ms")
+    print(f"{'lex + parse one line':<28}{one_line * 1e3:>12.3f}ms")
+    print(f"{'Document(...) from scratch':<28}{build * 1e3:>12.3f}ms")
+    print(f"{'one-character edit':<28}{one_edit * 1e3:>12.3f}ms{one_edit / one_line:>8.1f}x one line")
+    print(f"{'edit, then the whole AST':<28}{edit_and_parse * 1e3:>12.3f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Measures how late other coroutines run while a long program runs on the same event loop: once with the blocking `run`,
+and once with `run_async` at a few `yield_every` intervals.
+
+Run with `python -m bench.latency`.
+"""
+import asyncio
+import time
+
+from core.executor import run, run_async, new_symbol_table
+
+text = "var total = 0\nfor i = 0 to 300000 then var total = total + i * 2 - 1\ntotal"
+interval = 0.001
+
+
+async def ticker(lateness, stop):
+    """
+    Sleeps for `interval` over and over, recording how much later than asked it wakes up.
+    """
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lateness.append(time.perf_counter() - start - interval)
+
+
+async def measure(evaluate):
+    lateness, stop = [], asyncio.Event()
+    task = asyncio.ensure_future(ticker(lateness, stop))
+    await asyncio.sleep(interval * 5)
+    lateness.clear()
+
+    start = time.perf_counter()
+    await evaluate()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await task
+
+    lateness.sort()
+    p50 = lateness[len(lateness) // 2]
+    p99 = lateness[min(int(len(lateness) * 0.99), len(lateness) - 1)]
+    return elapsed, p50, p99, lateness[-1]
+
+
+async def main():
+    async def blocking():
+        run("<bench>", text, engine="vm", symbol_table=new_symbol_table())
+
+    def sliced(yield_every):
+        async def evaluate():
+            await run_async("<bench>", text, symbol_table=new_symbol_table(), yield_every=yield_every)
+        return evaluate
+
+    print(f"{'':<18}{'total ms':>10}{'p50 late ms':>13}{'p99 late ms':>13}{'max late ms':>13}")
+    for name, evaluate in [("run (blocking)", blocking), *((f"run_async {b}", sliced(b)) for b in (100, 1000, 10000))]:
+        elapsed, p50, p99, worst = await measure(evaluate)
+        print(f"{name:<18}{elapsed * 1e3:>10.1f}{p50 * 1e3:>13.2f}{p99 * 1e3:>13.2f}{worst * 1e3:>13.2f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+"""
+Measures lexer throughput in tokens per second, for `Lexer` and `RegexLexer`.
+
+Run with `python -m bench.lexer`.
+"""
+import time
+
+from core.lexer import Lexer, RegexLexer
+
+
+def make_script(lines):
+    return "\n".join(
+        f"var value_{i} = (value_{i - 1} + {i}.5) * 3 ^ 2 / 7 - {i}" if i % 3 else
+        f"if value_{i - 1} >= {i} and not value_{i - 2} == 0 then value_{i - 1} elif true then 1 else 0"
+        for i in range(lines)
+    )
+
+
+def measure(lexer_class, text, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens, error = lexer_class("<bench>", text).parse()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(tokens), best
+
+
+def main(lines=40000):
+    text = make_script(lines)
+    print(f"{len(text) / 1e6:.1f} MB of source")
+    results = {}
+    for lexer_class in (Lexer, RegexLexer):
+        count, elapsed = measure(lexer_class, text)
+        results[lexer_class] = elapsed
+        print(f"{lexer_class.__name__:<12}{count:>10} tokens{elapsed:>8.2f}s{count / elapsed:>14,.0f} tokens/s")
+    print(f"speedup: {results[Lexer] / results[RegexLexer]:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
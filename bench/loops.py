@@ -0,0 +1,49 @@
+"""
+Measures `for` and `while` loop throughput, in iterations per second, on each engine.
+
+Run with `python -m bench.loops`.
+"""
+import time
+
+from core.bytecode import BytecodeCompiler
+from core.compiler import Compiler
+from core.interpreter import Interpreter, Context, SymbolTable
+from core.lexer import RegexLexer
+from core.parser import Parser
+from core.vm import VM
+
+workloads = {
+    "for, empty body": ("for i = 0 to {n} then i", 1),
+    "for, sum": ("var total = 0\nfor i = 0 to {n} then var total = total + i", 1),
+    "for, step 2": ("var total = 0\nfor i = 0 to {n} step 2 then var total = total + i * i", 2),
+    "while, count": ("var i = 0\nwhile i < {n} then var i = i + 1", 1),
+}
+
+
+def measure(execute, node, iterations, repeat=3):
+    best = None
+    for _ in range(repeat):
+        context = Context("<bench>")
+        context.symbol_table = SymbolTable()
+        start = time.perf_counter()
+        execute(node, context)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return iterations / best
+
+
+def main(n=200000):
+    engines = {
+        "interpreter": lambda node, context: Interpreter().visit(node, context),
+        "compiled": lambda node, context: Compiler().compile(node).execute(context),
+        "vm": lambda node, context: VM().execute(BytecodeCompiler().compile(node), context),
+    }
+    print(f"{'workload':<18}" + "".join(f"{name:>14}" for name in engines) + "   (iterations/s)")
+    for name, (template, stride) in workloads.items():
+        node = Parser(RegexLexer("<bench>", template.format(n=n)).parse()[0]).parse().node
+        rates = [measure(execute, node, n // stride) for execute in engines.values()]
+        print(f"{name:<18}" + "".join(f"{rate:>14,.0f}" for rate in rates))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Compares the peak RSS and time of `run_file`, which lexes a memory-mapped file, against reading the file into a str and
+running that with `run`. Each is measured in a fresh process.
+
+Run with `python -m bench.mapped [lines]`.
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from core.executor import run, run_file, new_symbol_table
+
+templates = [
+    "var v{i} = {i} * 3 + (base - 2) / 4",
+    "if base > {i} then base - {i} elif base == 0 then 1 else 2 ^ 3",
+    "var base = base + v{j}",
+    "",
+]
+
+
+def write_file(path, count):
+    with open(path, "w") as file:
+        file.write("var base = 1\n")
+        for i in range(count):
+            file.write(templates[i % len(templates)].format(i=i, j=i - 2) + "\n")
+
+
+def child(mode, path):
+    start = time.perf_counter()
+    if mode == "mapped":
+        result, error = run_file(path, symbol_table=new_symbol_table())
+    else:
+        with open(path, encoding="utf-8") as file:
+            text = file.read()
+        result, error = run(path, text, cache=None, symbol_table=new_symbol_table())
+    assert error is None, error
+    elapsed = time.perf_counter() - start
+    print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)  # linux gives kilobytes
+
+
+def measure(mode, path):
+    output = subprocess.run(
+        [sys.executable, "-m", "bench.mapped", "--child", mode, path],
+        check=True, capture_output=True, text=True
+    ).stdout
+    elapsed, peak = output.split()
+    return float(elapsed), int(peak)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["--child"]:
+        return child(argv[1], argv[2])
+    count = int(argv[0]) if argv else 100_000
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.fuse")
+        write_file(path, count)
+        print(f"{count:,} lines, {os.path.getsize(path) / 1e6:.1f}MB")
+        print(f"{'':<12}{'time':>12}{'peak RSS':>14}")
+        for mode in ("str", "mapped"):
+            elapsed, peak = measure(mode, path)
+            print(f"{mode:<12}{elapsed * 1e3:>10.1f}ms{peak / 1e6:>12.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Measures how `run_many`'s throughput scales with the number of worker processes, against running the same jobs one by
+one with `run` in this process.
+
+Run with `python -m bench.parallel [jobs]`.
+"""
+import os
+import sys
+import time
+
+from core.executor import run, run_many, new_symbol_table
+
+job_text = "var total = 0\nfor i = 0 to {n} then var total = total + i * i\ntotal"
+
+
+def make_jobs(count):
+    return [(f"job{i}.fuse", job_text.format(n=2000 + i % 7)) for i in range(count)]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    jobs = make_jobs(int(argv[0]) if argv else 400)
+
+    start = time.perf_counter()
+    for filename, text in jobs:
+        run(filename, text, symbol_table=new_symbol_table())
+    serial = len(jobs) / (time.perf_counter() - start)
+    print(f"{'serial':<12}{serial:>12,.1f} jobs/sec")
+
+    cpus = os.cpu_count() or 1
+    for workers in sorted({1, 2, 4, cpus}):
+        start = time.perf_counter()
+        for _ in run_many(jobs, workers=workers):
+            pass
+        rate = len(jobs) / (time.perf_counter() - start)
+        print(f"{f'{workers} workers':<12}{rate:>12,.1f} jobs/sec{rate / serial:>8.2f}x")
+    print(f"({cpus} CPUs)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Compares the interpreter with and without quickening on loops of arithmetic and comparisons, and shows how many of the
+binary ops ran quickened.
+
+Run with `python -m bench.quicken [iterations]`.
+"""
+import sys
+import time
+
+from core.executor import new_symbol_table
+from core.interpreter import Interpreter, Context, Frame
+from core.lexer import RegexLexer
+from core.parser import Parser
+from core.profiler import Profiler, ProfilingInterpreter
+from core.resolver import Resolver
+
+workloads = {
+    "int arithmetic": "var t = 0\nfor i = 0 to {n} then var t = t + i * 3 - i / 4",
+    "float arithmetic": "var t = 0.5\nfor i = 0 to {n} then var t = t * 0.999 + 1.5",
+    "comparisons": "var t = 0\nfor i = 0 to {n} then var t = t + (if i > 100 and i <= 5000 then 1 else 0)",
+    "mixed": "var t = 0\nfor i = 0 to {n} then var t = t + (i * 3 - 2) / (i + 1.5) + (if i > 5 then i * i else 2)",
+}
+
+
+class UnquickenedInterpreter(Interpreter):
+    quicken = False
+
+
+def parse(text):
+    node = Parser(RegexLexer("<bench>", text).parse()[0]).parse().node
+    return node, Resolver().resolve(node)
+
+
+def run_once(interpreter, node, names):
+    context = Context("<bench>")
+    context.symbol_table = new_symbol_table()
+    context.frame = Frame(names, context.symbol_table)
+    result = interpreter.run(node, context)
+    assert result.error is None, result.error
+    return result.value
+
+
+def best_time(interpreter, text, number):
+    times = []
+    for _ in range(number):
+        node, names = parse(text)  # a fresh tree, so every run warms up from scratch
+        start = time.perf_counter()
+        run_once(interpreter, node, names)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    n = int(argv[0]) if argv else 5_000
+
+    print(f"{'':<20}{'generic':>12}{'quickened':>12}{'speedup':>10}{'hit rate':>10}")
+    for name, template in workloads.items():
+        text = template.format(n=n)
+        generic = best_time(UnquickenedInterpreter(), text, 5)
+        quickened = best_time(Interpreter(), text, 5)
+
+        profiler = Profiler()
+        run_once(ProfilingInterpreter(profiler), *parse(text))
+        print(f"{name:<20}{generic * 1e3:>10.1f}ms{quickened * 1e3:>10.1f}ms{generic / quickened:>9.2f}x"
+              f"{profiler.quickening_hit_rate:>9.1%}")
+
+
+if __name__ == '__main__':
+    main()
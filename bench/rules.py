@@ -0,0 +1,49 @@
+"""
+Times a branch-heavy rule script, where most rules have a cheap guard in front of an expensive check, on each engine.
+
+Run with `python -m bench.rules [rows]`.
+"""
+import statistics
+import sys
+import time
+
+from core.executor import run, new_symbol_table, engines
+
+# each rule's guard only passes for a few rows, so with short-circuiting the expensive side rarely runs
+rules = [
+    "i > 1990 and (i * i + 3 * i - 7) / (i + 1) > 50",
+    "i < 5 and (i ^ 3 - i ^ 2) / 7 < i * i * i",
+    "i >= 0 or (i + 1) * (i + 2) * (i + 3) < 0",
+    "i == 42 and (i * 2 + 1) * (i * 3 + 2) - i * i > 100",
+]
+
+
+def make_text(rows):
+    checks = " + ".join(f"(if {rule} then 1 else 0)" for rule in rules)
+    return f"var hits = 0\nfor i = 0 to {rows} then var hits = hits + {checks}\nhits"
+
+
+def median_time(func, number):
+    times = []
+    for _ in range(number):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    rows = int(argv[0]) if argv else 2_000
+    text = make_text(rows)
+
+    print(f"{rows:,} rows, {len(rules)} rules")
+    for engine in engines:
+        result, error = run("<bench>", text, engine, symbol_table=new_symbol_table())
+        assert error is None, error
+        elapsed = median_time(lambda: run("<bench>", text, engine, symbol_table=new_symbol_table()), 5)
+        print(f"{engine:<14}{elapsed * 1e3:>10.1f}ms   hits: {result}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""
+Shows that lexing, parsing and running grow linearly with the number of statements.
+
+Run with `python -m bench.scaling`.
+"""
+import time
+
+from core.interpreter import Interpreter, Context, SymbolTable
+from core.lexer import RegexLexer
+from core.parser import Parser
+
+
+def main(counts=(25000, 50000, 100000, 200000)):
+    print(f"{'statements':>10}{'lex':>9}{'parse':>9}{'run':>9}{'us/statement':>14}")
+    for count in counts:
+        text = "\n".join(f"var a{i % 100} = {i} * 2 + 1" for i in range(count))
+        start = time.perf_counter()
+        tokens, error = RegexLexer("<bench>", text).parse()
+        lexed = time.perf_counter()
+        node = Parser(tokens).parse().node
+        parsed = time.perf_counter()
+        context = Context("<bench>")
+        context.symbol_table = SymbolTable()
+        Interpreter().visit(node, context)
+        ran = time.perf_counter()
+        print(f"{count:>10}{lexed - start:>8.2f}s{parsed - lexed:>8.2f}s{ran - parsed:>8.2f}s"
+              f"{(ran - start) / count * 1e6:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
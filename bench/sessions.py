@@ -0,0 +1,66 @@
+"""
+Compares three ways of giving many sessions their own copy of a warmed environment: running the setup script again in
+a new symbol table, copying a table the setup ran in, and forking a frozen one. Shows the time to make a session and
+the memory all of them take, while each session changes a few variables.
+
+Run with `python -m bench.sessions [sessions]`.
+"""
+import sys
+import time
+import tracemalloc
+
+from core.executor import run, new_symbol_table
+from core.interpreter import SymbolTable
+
+prelude = "\n".join(f"var setting{i} = {i} * 2 + 1" for i in range(500))
+session_script = "var setting3 = setting3 + 1\nvar mine = setting10 * setting3"
+
+
+def rerun_prelude(base):
+    symbol_table = new_symbol_table()
+    run("<prelude>", prelude, symbol_table=symbol_table)
+    return symbol_table
+
+
+def copy_table(base):
+    symbol_table = SymbolTable(base.parent)
+    symbol_table.symbols = dict(base.symbols)
+    return symbol_table
+
+
+def fork_table(base):
+    return base.fork()
+
+
+def measure(make_session, base, count):
+    tracemalloc.start()
+    start = time.perf_counter()
+    sessions = []
+    for _ in range(count):
+        symbol_table = make_session(base)
+        result, error = run("<session>", session_script, symbol_table=symbol_table)
+        assert error is None, error
+        sessions.append(symbol_table)
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed, memory
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 2_000
+
+    base = new_symbol_table()
+    run("<prelude>", prelude, symbol_table=base)
+    base.freeze()
+
+    print(f"{count:,} sessions over a {len(base.symbols)} variable base")
+    print(f"{'':<16}{'per session':>14}{'memory':>12}")
+    for name, make_session in (("rerun prelude", rerun_prelude), ("copy", copy_table), ("fork", fork_table)):
+        elapsed, memory = measure(make_session, base, count)
+        print(f"{name:<16}{elapsed / count * 1e6:>12.1f}us{memory / 1e6:>10.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
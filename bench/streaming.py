@@ -0,0 +1,71 @@
+"""
+Compares running a big script with `run_stream` against reading it whole and running it with `run`: the time taken,
+the peak memory traced while running, and how long until the first statement has run.
+
+Run with `python -m bench.streaming [lines]`.
+"""
+import io
+import sys
+import time
+import tracemalloc
+
+from core.executor import run, run_stream, new_symbol_table
+
+templates = [
+    "var v{i} = {i} * 3 + (base - 2) / 4",
+    "if base > {i} then base - {i} elif base == 0 then 1 else 2 ^ 3",
+    "var base = base + v{j}",
+    "",
+]
+
+
+def make_text(count):
+    lines = (templates[i % len(templates)].format(i=i, j=i - 2) for i in range(count))
+    return "var base = 1\n" + "\n".join(lines)
+
+
+class FirstLine:
+    """
+    Lines of a file, noting when the second one is asked for, which is after the first statement has run.
+    """
+    def __init__(self, text):
+        self.lines = io.StringIO(text)
+        self.start = time.perf_counter()
+        self.first = None
+
+    def __iter__(self):
+        for number, line in enumerate(self.lines):
+            if number == 1:
+                self.first = time.perf_counter() - self.start
+            yield line
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result, error = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert error is None, error
+    return elapsed, peak
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 20_000
+    text = make_text(count)
+
+    whole_time, whole_peak = measure(lambda: run("<bench>", text, cache=None, symbol_table=new_symbol_table()))
+    lines = FirstLine(text)
+    stream_time, stream_peak = measure(lambda: run_stream("<bench>", lines, symbol_table=new_symbol_table()))
+
+    print(f"{count:,} lines, {len(text) / 1e6:.1f}MB")
+    print(f"{'':<12}{'time':>12}{'peak memory':>16}")
+    print(f"{'run':<12}{whole_time * 1e3:>10.1f}ms{whole_peak / 1e6:>14.1f}MB")
+    print(f"{'run_stream':<12}{stream_time * 1e3:>10.1f}ms{stream_peak / 1e6:>14.1f}MB")
+    print(f"first statement run after {lines.first * 1e3:.3f}ms streaming")
+
+
+if __name__ == '__main__':
+    main()
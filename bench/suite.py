@@ -0,0 +1,192 @@
+"""
+Times each stage of the pipeline (lexing, parsing, interpreting, and all of it through `core.executor.run`) on a set of
+representative workloads, with the peak memory of each, and compares the results against a saved baseline.
+
+Run with `python -m bench.suite`. The report is also written to `bench_output.txt`.
+    --save              save the results as the new baseline
+    --baseline PATH     the baseline to compare against (default: bench/baseline.json)
+    --tolerance 0.2     how much slower than the baseline a stage can be before it counts as a regression
+    --quick             shorter timings, for a rough check
+
+It exits with status 1 if any stage regressed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from core import executor
+from core.interpreter import Interpreter, Context, SymbolTable, FuseNumber
+from core.lexer import RegexLexer
+from core.parser import Parser
+
+default_baseline = os.path.join(os.path.dirname(__file__), "baseline.json")
+output_file = "bench_output.txt"
+
+stages = ("lex", "parse", "interpret", "run")
+
+workloads = {
+    "arithmetic chain": "var x = 3\n" + " + ".join(f"x * {i} - {i} / 2" for i in range(1, 150)),
+    "deep parentheses": "(" * 60 + "1" + " + 1)" * 60 + "\n" + "(" * 60 + "2" + " * 2 - 1)" * 60,
+    "assignments": "\n".join(
+        [f"var v{i} = {i}" for i in range(50)] +
+        [f"const c{i} = {i} * 2" if i % 4 == 0 else f"var v{i % 50} = {i} + v{(i - 1) % 50}" for i in range(1000)]
+    ),
+    "if ladder": "var x = 180\n" + "if x == 0 then 0 " + " ".join(
+        f"elif x == {i} then {i} * 2" for i in range(1, 200)) + " else -1",
+}
+
+
+def make_context():
+    context = Context("<bench>")
+    context.symbol_table = SymbolTable()
+    for name, value in executor.builtin_constants.items():
+        context.symbol_table.set(name, FuseNumber(value), True)
+    return context
+
+
+def run_fresh(text):
+    """
+    Runs through `core.executor.run`, without the compile cache, after dropping whatever the last run assigned, so
+    workloads with `const`s can run more than once.
+    """
+    symbols = executor.global_symbol_table.symbols
+    for name in [name for name in symbols if name not in executor.builtin_constants]:
+        del symbols[name]
+    return executor.run("<bench>", text, cache=None)
+
+
+def prepare(text):
+    """
+    :return: a dict of stage name to a function that runs just that stage.
+    """
+    tokens, error = RegexLexer("<bench>", text).parse()
+    if error:
+        raise Exception(f"workload doesn't lex:\n{error!r}")
+    ast = Parser(tokens).parse()
+    if ast.error:
+        raise Exception(f"workload doesn't parse:\n{ast.error!r}")
+    result, error = run_fresh(text)
+    if error:
+        raise Exception(f"workload doesn't run:\n{error!r}")
+
+    interpreter = Interpreter()
+    return {
+        "lex": lambda: RegexLexer("<bench>", text).parse(),
+        "parse": lambda: Parser(tokens).parse(),
+        "interpret": lambda: interpreter.visit(ast.node, make_context()),
+        "run": lambda: run_fresh(text),
+    }
+
+
+def time_stage(func, min_time, repeat=3):
+    """
+    Calls `func` in batches big enough to take at least `min_time` seconds, and keeps the fastest batch.
+    :return: operations per second.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed * 4 > min_time else 10
+
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return number / best
+
+
+def peak_memory(func):
+    """
+    :return: the most memory, in bytes, in use at once while `func` ran.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(min_time=0.2):
+    """
+    :return: a dict of workload name to a dict of stage name to {"ops": ops/sec, "peak": bytes}.
+    """
+    results = {}
+    for name, text in workloads.items():
+        funcs = prepare(text)
+        results[name] = {
+            stage: {"ops": time_stage(funcs[stage], min_time), "peak": peak_memory(funcs[stage])}
+            for stage in stages
+        }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Formats the results as a table, next to the baseline if there is one.
+    :return: a tuple of (report lines, list of "workload/stage" names that regressed).
+    """
+    lines = [f"{'workload':<18}{'stage':<11}{'ops/sec':>12}{'peak':>11}{'vs baseline':>14}"]
+    regressions = []
+
+    for name, stage_results in results.items():
+        for stage, result in stage_results.items():
+            line = f"{name:<18}{stage:<11}{result['ops']:>12,.1f}{result['peak'] / 1024:>9.0f}KB"
+            old = baseline.get(name, {}).get(stage)
+            if old:
+                ratio = result["ops"] / old["ops"]
+                line += f"{ratio:>13.2f}x"
+                if ratio < 1 - tolerance:
+                    line += "  REGRESSION"
+                    regressions.append(f"{name}/{stage}")
+            lines.append(line)
+
+    return lines, regressions
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(prog="python -m bench.suite")
+    arguments.add_argument("--save", action="store_true")
+    arguments.add_argument("--baseline", default=default_baseline)
+    arguments.add_argument("--tolerance", type=float, default=0.2)
+    arguments.add_argument("--quick", action="store_true")
+    options = arguments.parse_args(argv)
+
+    results = measure(min_time=0.05 if options.quick else 0.2)
+
+    baseline = {}
+    if os.path.exists(options.baseline) and not options.save:
+        with open(options.baseline) as file:
+            baseline = json.load(file)
+
+    lines, regressions = compare(results, baseline, options.tolerance)
+    if regressions:
+        lines.append(f"\n{len(regressions)} regression(s) over {options.tolerance:.0%}: {', '.join(regressions)}")
+    elif baseline:
+        lines.append(f"\nno regressions over {options.tolerance:.0%}")
+
+    report = "\n".join(lines)
+    print(report)
+    with open(output_file, "w") as file:
+        file.write(report + "\n")
+
+    if options.save:
+        with open(options.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"saved baseline to {options.baseline}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""
+Measures how many cached runs per second `run` gets through from different numbers of threads, each with its own
+`thread_symbol_table()`. With the GIL, throughput stays about flat as threads are added; on a free-threaded build
+(python3.13t and later, run with PYTHON_GIL=0) it should grow with the number of cores.
+
+Run with `python -m bench.threads [runs per thread]`.
+"""
+import os
+import sys
+import threading
+import time
+
+from core.executor import run, thread_symbol_table, engines
+
+programs = [
+    "var t = 0\nfor i = 0 to 20 then var t = t + i * 3",
+    "if base > 5 then base * 2 - 1 elif base == 0 then 1 else 2 ^ 3",
+    "var base = base + 1\nbase / 3 + (base - 2) * 4",
+]
+
+
+def worker(engine, count, barrier):
+    symbol_table = thread_symbol_table()
+    run("<bench>", "var base = 3", engine, symbol_table=symbol_table)
+    barrier.wait()
+    for step in range(count):
+        result, error = run("<bench>", programs[step % len(programs)], engine, symbol_table=symbol_table)
+        assert error is None, error
+
+
+def throughput(engine, threads, count):
+    barrier = threading.Barrier(threads + 1)
+    workers = [threading.Thread(target=worker, args=(engine, count, barrier)) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return threads * count / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 500
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    thread_counts = [threads for threads in (1, 2, 4, 8) if threads <= max(os.cpu_count() or 1, 2) * 2]
+
+    print(f"python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}, {os.cpu_count()} CPUs")
+    print(f"{'':<14}" + "".join(f"{f'{threads} threads':>16}" for threads in thread_counts))
+    for engine in engines:
+        rates = [throughput(engine, threads, count) for threads in thread_counts]
+        cells = "".join(f"{rate:>9,.0f} ({rate / rates[0]:.1f}x)" for rate in rates)
+        print(f"{engine:<14}{cells}  runs/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+from core.classes.errors import *
+from core.lexer import token_list
+
+try:
+    import numpy
+except ImportError:  # without numpy every batch runs row by row
+    numpy = None
+
+# ints whose magnitude could get this big might not fit in numpy's int64, so they're left to python's own ints
+max_vector_int = 2 ** 62
+
+ambiguous = object()  # the position of a value that came out of an if, which depends on the row
+
+
+class Unvectorizable(Exception):
+    """
+    Raised when a program can't be evaluated on whole columns with the same results as running it row by row.
+    """
+
+
+def to_column(values):
+    """
+    Turns a list or array into a numpy column the `VectorEvaluator` can use.
+    :raises Unvectorizable: if the values aren't all numbers that fit in 64 bits, or mix ints and floats.
+    """
+    column = numpy.asarray(values)
+    if column.dtype == numpy.bool_:
+        return column.astype(numpy.int64)
+    if column.dtype.kind not in "iuf":
+        raise Unvectorizable(f"can't vectorize a column of {column.dtype}")
+    # numpy makes a list of ints and floats all floats, which changes the results of ints running row by row
+    if column.dtype.kind == "f" and not isinstance(values, numpy.ndarray) and \
+            not all(isinstance(value, float) for value in values):
+        raise Unvectorizable("a column mixes ints and floats")
+    if column.dtype.kind in "iu" and column.size and \
+            max(abs(int(column.max())), abs(int(column.min()))) >= max_vector_int:
+        raise Unvectorizable("a column has ints that might not fit in 64 bits")
+    return column
+
+
+class BatchResult:
+    def __init__(self, values, errors, vectorized):
+        self.values = values          # one python value per row, None for rows with an error or no value
+        self.errors = errors          # one error or None per row. rows that failed the same way can share an error
+        self.vectorized = vectorized  # whether it ran in one pass over the columns, instead of row by row
+
+    @property
+    def error_count(self):
+        return sum(error is not None for error in self.errors)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __repr__(self):
+        mode = "vectorized" if self.vectorized else "row by row"
+        return f"<BatchResult: {len(self.values)} rows, {self.error_count} errors, {mode}>"
+
+
+class VectorEvaluator:
+    """
+    Evaluates an AST over whole numpy columns at once. Arithmetic, comparisons, logic, top level assignments, and ifs
+    with an else (as a select) are supported; anything else raises `Unvectorizable`.
+
+    Rows are failed one by one though: an error only applies to the rows that reach the node that caused it, and a row
+    stops at its first error, like it would if it ran on its own.
+    """
+    def __init__(self, columns, size, constants, context):
+        """
+        :param columns: a dict of variable name to numpy array, all of length `size`.
+        :param size: the number of rows.
+        :param constants: a dict of constant name to value, like `builtin_constants`.
+        :param context: the `Context` errors are made in.
+        """
+        self.values = dict(constants)
+        self.values.update(columns)
+        self.constants = set(constants)
+        self.size = size
+        self.context = context
+        self.live = numpy.ones(size, dtype=bool)       # rows that haven't failed yet
+        self.error_index = numpy.full(size, -1)       # for each row, an index into `error_list`, or -1
+        self.error_list = []
+
+    def evaluate(self, node):
+        """
+        :return: a tuple of (list of python values, list of errors or None), one of each per row.
+        """
+        value, _ = self.visit(node, None)
+        if value is None:
+            raise Unvectorizable("the program has no value")
+        column = numpy.broadcast_to(numpy.asarray(value), (self.size,))
+        if column.dtype.kind not in "biuf":
+            raise Unvectorizable(f"can't return a column of {column.dtype}")
+        values = column.tolist()
+
+        errors = [None] * self.size
+        for row in numpy.flatnonzero(self.error_index >= 0).tolist():
+            errors[row] = self.error_list[self.error_index[row]]
+            values[row] = None
+        return values, errors
+
+    # helpers
+
+    def rows(self, mask):
+        """
+        :param mask: the rows a node runs for, or None for all of them.
+        :return: the rows in `mask` that haven't failed yet.
+        """
+        return self.live if mask is None else mask & self.live
+
+    def fail(self, rows, error):
+        """
+        Gives an error to some rows, which then stop running.
+        :param rows: a boolean array of the rows to fail. Rows that already failed are skipped.
+        """
+        rows = rows & self.live
+        if rows.any():
+            self.error_index[rows] = len(self.error_list)
+            self.error_list.append(error)
+            self.live &= ~rows
+
+    def check_int(self, result, function, left, right):
+        """
+        Makes sure an int result didn't overflow, by doing the same operation with floats.
+        """
+        if numpy.result_type(result).kind in "iu":
+            with numpy.errstate(all="ignore"):
+                estimate = function(numpy.asarray(left, dtype=numpy.float64), numpy.asarray(right, dtype=numpy.float64))
+            if numpy.any(numpy.abs(estimate) >= max_vector_int):
+                raise Unvectorizable("an int might not fit in 64 bits")
+
+    def visit(self, node, mask):
+        """
+        :param mask: a boolean array of the rows this node runs for, or None for all of them.
+        :return: a tuple of (value, position node). The value is a numpy array or a python number, and the position
+        node is the one whose position the value has, which division errors point at.
+        """
+        method = getattr(self, f"visit_{type(node).__name__}", None)
+        if method is None:
+            raise Unvectorizable(f"can't vectorize {type(node).__name__}")
+        return method(node, mask)
+
+    # nodes
+
+    def visit_BlockNode(self, node, mask):
+        value, position = None, None
+        for statement in node.statements:
+            value, position = self.visit(statement, mask)
+        return value, position
+
+    def visit_NumberNode(self, node, mask):
+        if type(node.token.value) is int and abs(node.token.value) >= max_vector_int:
+            raise Unvectorizable("an int literal might not fit in 64 bits")
+        return node.token.value, node
+
+    def visit_VarAccessNode(self, node, mask):
+        var_name = node.var_name_token.value
+        if var_name not in self.values:
+            self.fail(self.rows(mask), VariableUndefinedError(
+                node.pos_start, node.pos_end,
+                f"{var_name} is not defined",
+                self.context
+            ))
+            return 0, node
+        return self.values[var_name], node
+
+    def visit_VarAssignNode(self, node, mask):
+        if mask is not None:
+            raise Unvectorizable("can't vectorize an assignment that only some rows run")
+        var_name = node.var_name_token.value
+        value, position = self.visit(node.value_node, mask)
+
+        if var_name in self.constants:
+            self.fail(self.rows(mask), ConstantAssignmentError(
+                node.pos_start, node.pos_end,
+                f"'{var_name}' is a constant",
+                self.context
+            ))
+            return value, position
+
+        self.values[var_name] = value
+        if node.const:
+            self.constants.add(var_name)
+        return value, position
+
+    def visit_BinaryOpNode(self, node, mask):
+        left, _ = self.visit(node.left_node, mask)
+        op = node.op_token
+        if op.type == token_list["keyword"].type:
+            op = op.value
+        else:
+            op = op.type
+        if op == "and" or op == "or":
+            return self.short_circuit(op, left, node, mask), node
+        right, right_position = self.visit(node.right_node, mask)
+
+        with numpy.errstate(all="ignore"):
+            if op in ("plus", "minus", "mul"):
+                function = {"plus": numpy.add, "minus": numpy.subtract, "mul": numpy.multiply}[op]
+                result = function(left, right)
+                self.check_int(result, function, left, right)
+            elif op == "div":
+                zeros = numpy.equal(right, 0) & self.rows(mask)
+                if zeros.any():
+                    if right_position is ambiguous:
+                        raise Unvectorizable("a division by zero whose position depends on the row")
+                    position = right_position or node.right_node
+                    self.fail(zeros, FuseRuntimeError(
+                        position.pos_start, position.pos_end,
+                        "Division by zero",
+                        self.context
+                    ))
+                result = numpy.true_divide(left, numpy.where(numpy.equal(right, 0), 1, right))
+            elif op == "pow":
+                result = self.power(left, right, mask)
+            elif op == "eq":
+                result = numpy.equal(left, right)
+            elif op == "neq":
+                result = numpy.logical_not(numpy.equal(left, right))
+            elif op == "lt":
+                result = numpy.less(left, right)
+            elif op == "lte":
+                result = numpy.logical_not(numpy.greater(left, right))
+            elif op == "gt":
+                result = numpy.greater(left, right)
+            elif op == "gte":
+                result = numpy.logical_not(numpy.less(left, right))
+            elif op == "xor":
+                result = numpy.logical_xor(numpy.not_equal(left, 0), numpy.not_equal(right, 0))
+            else:
+                raise Unvectorizable(f"can't vectorize the operator {node.op_token}")
+
+        if numpy.result_type(result) == numpy.bool_:
+            result = numpy.asarray(result, dtype=numpy.int64)
+        return result, node
+
+    def short_circuit(self, op, left, node, mask):
+        """
+        Evaluates an and or an or, running the right side only for the rows whose left side doesn't decide it.
+        """
+        truthy = numpy.broadcast_to(numpy.not_equal(left, 0), (self.size,))
+        undecided = (truthy if op == "and" else ~truthy) & (numpy.ones(self.size, dtype=bool) if mask is None else mask)
+        right, _ = self.visit(node.right_node, undecided)
+        with numpy.errstate(all="ignore"):
+            if op == "and":
+                result = numpy.logical_and(truthy, numpy.not_equal(right, 0))
+            else:
+                result = numpy.logical_or(truthy, numpy.not_equal(right, 0))
+        return numpy.asarray(result, dtype=numpy.int64)
+
+    def power(self, base, exponent, mask):
+        rows = self.rows(mask)
+        negative = numpy.less(exponent, 0)
+        if numpy.any(negative & numpy.equal(base, 0) & rows):
+            raise Unvectorizable("0 to a negative power")
+        if numpy.any(numpy.less(base, 0) & numpy.not_equal(exponent, numpy.floor(exponent)) & rows):
+            raise Unvectorizable("a negative number to a fractional power")
+        if numpy.result_type(base).kind in "iu" and numpy.any(negative):
+            base = numpy.asarray(base, dtype=numpy.float64)  # like python, ints to negative powers give floats
+
+        result = numpy.power(base, exponent)
+        self.check_int(result, numpy.power, base, exponent)
+        if numpy.result_type(result).kind == "f" \
+                and numpy.any(numpy.isinf(result) & numpy.isfinite(base) & numpy.isfinite(exponent) & rows):
+            raise Unvectorizable("a float power overflowed")
+        return result
+
+    def visit_UnaryOpNode(self, node, mask):
+        operand, _ = self.visit(node.node, mask)
+        if node.op_token.type == token_list["minus"].type:
+            return numpy.multiply(operand, -1), node
+        if node.op_token.matches("keyword", "not"):
+            return numpy.asarray(numpy.equal(operand, 0), dtype=numpy.int64), node
+        return operand, node
+
+    def visit_IfNode(self, node, mask):
+        expr = node.only_case()
+        if expr is not None:
+            return self.visit(expr, mask)
+        if node.else_case is None:
+            raise Unvectorizable("can't vectorize an if without an else, since some rows would have no value")
+
+        remaining = numpy.ones(self.size, dtype=bool) if mask is None else mask
+        choices, values = [], []
+
+        for condition, expr in node.cases:
+            condition_value, _ = self.visit(condition, remaining)
+            chosen = numpy.broadcast_to(numpy.not_equal(condition_value, 0), (self.size,)) & remaining
+            value, _ = self.visit(expr, chosen)
+            choices.append(chosen)
+            values.append(value)
+            remaining = remaining & ~chosen
+
+        default, _ = self.visit(node.else_case, remaining)
+        return numpy.select(choices, values, default), ambiguous
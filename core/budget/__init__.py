@@ -0,0 +1,123 @@
+from time import monotonic
+
+from core.classes.errors import ResourceExhaustedError
+from core.interpreter import Interpreter, RuntimeResult, arithmetic_ops
+
+# how many visits the metered interpreter makes between looking at the fuel and the clock
+check_interval = 1024
+
+
+class Budget:
+    """
+    Limits on what one run may use. Pass one to `run(..., budget=Budget(...))`, and a run that goes over any of them
+    fails with a `ResourceExhaustedError`. Limits left as None aren't checked.
+    """
+    def __init__(self, fuel=None, timeout=None, max_int_bits=None):
+        """
+        :param fuel: how many AST nodes the run may visit.
+        :param timeout: how many seconds the run may take, not counting lexing and parsing. It's checked every
+        `check_interval` visits, so it can be overshot by the time those take.
+        :param max_int_bits: how big, in bits, the ints that `*` and `^` give may get. Too big powers fail before python
+        starts working them out.
+        """
+        for name, value in (("fuel", fuel), ("timeout", timeout), ("max_int_bits", max_int_bits)):
+            if value is not None and value < 0:
+                raise ValueError(f"{name} can't be negative")
+        self.fuel = fuel
+        self.timeout = timeout
+        self.max_int_bits = max_int_bits
+
+    def __repr__(self):
+        return f"<Budget: fuel={self.fuel}, timeout={self.timeout}, max_int_bits={self.max_int_bits}>"
+
+
+class Exhausted(Exception):
+    """
+    Unwinds a metered run once a budget runs out, so nothing else gets visited on the way back up.
+    """
+    def __init__(self, details, node=None, context=None):
+        super().__init__(details)
+        self.details = details
+        self.node = node
+        self.context = context
+
+
+class MeteredInterpreter(Interpreter):
+    """
+    An `Interpreter` that keeps to a `Budget`. Fuel is handed out `check_interval` visits at a time, so a visit only
+    costs a counter decrement, and the clock is only read when a batch runs out. Kept separate so the normal interpreter
+    pays nothing when there's no budget.
+    """
+    quicken = False  # quickened ops skip visiting their operands, which would use less fuel than the same run unquickened
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.fuel = budget.fuel  # visits not handed out yet
+        self.countdown = 0       # visits left in the current batch
+        self.deadline = None if budget.timeout is None else monotonic() + budget.timeout
+        if budget.max_int_bits is not None:
+            self.arithmetic_ops = dict(arithmetic_ops, mul=self.multiply, pow=self.power)
+
+    def run(self, node, context):
+        """
+        Visits the root node.
+        :return: a `RuntimeResult`, with a `ResourceExhaustedError` if the budget ran out.
+        """
+        try:
+            return self.visit(node, context)
+        except Exhausted as exhausted:
+            node = exhausted.node or node
+            return RuntimeResult().failure(ResourceExhaustedError(
+                node.pos_start, node.pos_end,
+                exhausted.details,
+                exhausted.context or context
+            ))
+
+    def visit(self, node, context):
+        if not self.countdown:
+            self.refill(node, context)
+        self.countdown -= 1
+        try:
+            # the same as `Interpreter.visit`, inlined, since another call per visit would cost more than the metering
+            return getattr(self, f"visit_{type(node).__name__}", self.no_visit_method)(node, context)
+        except Exhausted as exhausted:
+            if exhausted.node is None:  # raised by `multiply` or `power`, which don't know their node
+                exhausted.node, exhausted.context = node, context
+            raise
+
+    def refill(self, node, context):
+        """
+        Hands out the next batch of visits, once the last one is used up.
+        :raises Exhausted: if there's no fuel or time left.
+        """
+        if self.fuel == 0:
+            raise Exhausted(f"Ran out of fuel after {self.budget.fuel} node visits", node, context)
+        if self.deadline is not None and monotonic() > self.deadline:
+            raise Exhausted(f"Ran out of time after {self.budget.timeout}s", node, context)
+
+        self.countdown = check_interval if self.fuel is None else min(check_interval, self.fuel)
+        if self.fuel is not None:
+            self.fuel -= self.countdown
+
+    # int size checks, used in place of `arithmetic_ops`' when there's a `max_int_bits`
+
+    def too_big(self):
+        return Exhausted(f"The result would be more than {self.budget.max_int_bits} bits long")
+
+    def multiply(self, left, right):
+        # the operands are under the limit already, or came straight from the source, so this can't take long
+        result = left * right
+        if type(result) is int and result.bit_length() > self.budget.max_int_bits:
+            raise self.too_big()
+        return result
+
+    def power(self, base, exponent):
+        if type(base) is int and type(exponent) is int and exponent > 1 and abs(base) > 1:
+            # a power is at least this long, which is checked first since working it out could take forever
+            if (abs(base).bit_length() - 1) * exponent + 1 > self.budget.max_int_bits:
+                raise self.too_big()
+            result = base ** exponent
+            if result.bit_length() > self.budget.max_int_bits:
+                raise self.too_big()
+            return result
+        return base ** exponent
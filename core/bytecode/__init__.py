@@ -0,0 +1,355 @@
+from array import array
+
+from core.lexer import token_list
+from core.parser import BinaryOpNode, VarAssignNode, IfNode, BlockNode
+from core.resolver import can_be_none, nullable_names
+
+# instruction set. every instruction is two words in `Code.code`: the opcode, then its argument (0 if unused)
+
+LOAD_CONST = 0          # push consts[arg]
+LOAD_NAME = 1           # push the value of names[arg]
+STORE_VAR = 2           # assign the top of the stack to names[arg], leaving it on the stack
+STORE_CONST = 3         # same as STORE_VAR, but the variable becomes a constant
+POP_TOP = 4
+BINARY_ADD = 5
+BINARY_SUB = 6
+BINARY_MUL = 7
+BINARY_DIV = 8          # arg is the position of the divisor, or -1 to use the last SET_POS
+BINARY_POW = 9
+COMPARE_EQ = 10
+COMPARE_NEQ = 11
+COMPARE_LT = 12
+COMPARE_LTE = 13
+COMPARE_GT = 14
+COMPARE_GTE = 15
+LOGIC_AND = 16
+LOGIC_OR = 17
+LOGIC_XOR = 18
+UNARY_NEGATIVE = 19
+UNARY_NOT = 20
+JUMP = 21               # jump to word offset arg
+POP_JUMP_IF_FALSE = 22  # pop, and jump to word offset arg if it was 0
+SET_POS = 23            # remember position arg for a BINARY_DIV whose divisor came out of an if
+RETURN_VALUE = 24
+GET_RANGE = 25          # pop the step, end and start of a for loop, and push an iterator over them
+FOR_ITER = 26           # push the next value of the iterator on top of the stack, or pop it and jump to arg if it's done
+JUMP_IF_FALSE_OR_KEEP = 27  # if the top of the stack is 0, make it 0 and jump to arg, past the rest of an and
+JUMP_IF_TRUE_OR_KEEP = 28   # if it isn't 0, make it 1 and jump to arg, past the rest of an or
+CHECK_NUMBER = 29       # error if the top of the stack is None, naming it number_checks[arg]
+
+opnames = [
+    "LOAD_CONST", "LOAD_NAME", "STORE_VAR", "STORE_CONST", "POP_TOP",
+    "BINARY_ADD", "BINARY_SUB", "BINARY_MUL", "BINARY_DIV", "BINARY_POW",
+    "COMPARE_EQ", "COMPARE_NEQ", "COMPARE_LT", "COMPARE_LTE", "COMPARE_GT", "COMPARE_GTE",
+    "LOGIC_AND", "LOGIC_OR", "LOGIC_XOR", "UNARY_NEGATIVE", "UNARY_NOT",
+    "JUMP", "POP_JUMP_IF_FALSE", "SET_POS", "RETURN_VALUE", "GET_RANGE", "FOR_ITER",
+    "JUMP_IF_FALSE_OR_KEEP", "JUMP_IF_TRUE_OR_KEEP", "CHECK_NUMBER",
+]
+
+# what CHECK_NUMBER's argument says the value was for
+number_checks = ("the start", "the end", "the step", "the left operand", "the right operand", "the operand")
+
+binary_ops = {
+    "plus": BINARY_ADD,
+    "minus": BINARY_SUB,
+    "mul": BINARY_MUL,
+    "div": BINARY_DIV,
+    "pow": BINARY_POW,
+    "eq": COMPARE_EQ,
+    "neq": COMPARE_NEQ,
+    "lt": COMPARE_LT,
+    "lte": COMPARE_LTE,
+    "gt": COMPARE_GT,
+    "gte": COMPARE_GTE,
+}
+
+logic_ops = {
+    "and": LOGIC_AND,
+    "or": LOGIC_OR,
+    "xor": LOGIC_XOR,
+}
+
+# the jumps that skip the right side of an and or an or when the left side decides it
+short_circuit_jumps = {
+    "and": JUMP_IF_FALSE_OR_KEEP,
+    "or": JUMP_IF_TRUE_OR_KEEP,
+}
+
+
+class Code:
+    def __init__(self):
+        self.code = array("i")          # opcode, argument, opcode, argument...
+        self.line_table = array("i")    # one entry per instruction: an index into `positions`, or -1
+        self.consts = []
+        self.names = []
+        self.positions = []             # (pos_start, pos_end) pairs
+        self.position = -1              # the position of the whole program
+
+    def __len__(self):
+        return len(self.line_table)
+
+    def __repr__(self):
+        return f"<Code: {len(self)} instructions, {len(self.consts)} consts, {len(self.names)} names>"
+
+
+class BytecodeCompiler:
+    """
+    Compiles a parsed AST into a `Code` object for the `VM`. Like with the `Compiler`, only the values that could be
+    None get checked for it.
+    """
+    def __init__(self):
+        self.code = None
+        self.const_indices = {}
+        self.name_indices = {}
+        self.nullable = set()
+
+    def compile(self, node):
+        """
+        Turns an AST into bytecode.
+        :param node: the root node, as returned by `Parser.parse`.
+        :return: a `Code` object.
+        """
+        self.code = Code()
+        self.const_indices = {}
+        self.name_indices = {}
+        self.nullable = nullable_names(node)
+        self.code.position = self.position(node)
+        self.visit(node)
+        self.emit(RETURN_VALUE)
+        return self.code
+
+    # helpers
+
+    def emit(self, op, arg=0, position=-1):
+        """
+        Appends an instruction.
+        :return: the word offset of its argument, for patching jumps later.
+        """
+        self.code.code.append(op)
+        self.code.code.append(arg)
+        self.code.line_table.append(position)
+        return len(self.code.code) - 1
+
+    def patch(self, offset):
+        """
+        Points the jump at `offset` to the next instruction.
+        """
+        self.code.code[offset] = len(self.code.code)
+
+    def position(self, node):
+        self.code.positions.append((node.pos_start, node.pos_end))
+        return len(self.code.positions) - 1
+
+    def const(self, value):
+        key = (type(value), value)
+        if key not in self.const_indices:
+            self.const_indices[key] = len(self.code.consts)
+            self.code.consts.append(value)
+        return self.const_indices[key]
+
+    def check_number(self, node, check):
+        """
+        Emits a CHECK_NUMBER for a value that's on top of the stack, if it could be None.
+        :param check: the index of what it is in `number_checks`.
+        """
+        if can_be_none(node, self.nullable):
+            self.emit(CHECK_NUMBER, check, self.position(node))
+
+    def name(self, name):
+        if name not in self.name_indices:
+            self.name_indices[name] = len(self.code.names)
+            self.code.names.append(name)
+        return self.name_indices[name]
+
+    def value_position(self, node):
+        """
+        Gets the position a node's value carries, which errors about that value point at.
+        :return: an index into `positions`, or None if it depends on which branch of an if runs.
+        """
+        while True:
+            if isinstance(node, IfNode):
+                if node.only_case() is None:
+                    return None
+                node = node.only_case()
+            if isinstance(node, VarAssignNode):
+                node = node.value_node
+            elif isinstance(node, BlockNode):
+                node = node.statements[-1]
+            else:
+                return self.position(node)
+
+    def visit(self, node, track_position=False):
+        """
+        Compiles a node so that its value ends up on top of the stack.
+        :param track_position: emit SET_POS so a BINARY_DIV knows where the value came from.
+        """
+        method_name = f"visit_{type(node).__name__}"
+        method = getattr(self, method_name, self.no_visit_method)
+        return method(node, track_position)
+
+    def no_visit_method(self, node, track_position):
+        raise Exception(f"no compile method for {type(node).__name__}")
+
+    # nodes
+
+    def visit_BlockNode(self, node, track_position):
+        for statement in node.statements[:-1]:
+            self.visit(statement)
+            self.emit(POP_TOP)
+        self.visit(node.statements[-1], track_position)
+
+    def visit_NumberNode(self, node, track_position):
+        self.emit(LOAD_CONST, self.const(node.token.value))
+
+    def visit_VarAccessNode(self, node, track_position):
+        self.emit(LOAD_NAME, self.name(node.var_name_token.value), self.position(node))
+
+    def visit_VarAssignNode(self, node, track_position):
+        self.visit(node.value_node, track_position)
+        op = STORE_CONST if node.const else STORE_VAR
+        self.emit(op, self.name(node.var_name_token.value), self.position(node))
+
+    def visit_BinaryOpNode(self, node, track_position):
+        # walk down the left side of chains like 1+2+3+... without recursing, since the parser builds them left-nested
+        chain = []
+        while isinstance(node, BinaryOpNode):
+            chain.append(node)
+            node = node.left_node
+        self.visit(node)
+        self.check_number(node, 3)
+
+        for node in reversed(chain):
+            op_token = node.op_token
+
+            if op_token.type == token_list["div"].type:
+                divisor = self.value_position(node.right_node)
+                self.visit(node.right_node, divisor is None)
+                self.check_number(node.right_node, 4)
+                self.emit(BINARY_DIV, -1 if divisor is None else divisor, self.position(node))
+                continue
+
+            skip = None
+            if op_token.type == token_list["keyword"].type and op_token.value in short_circuit_jumps:
+                skip = self.emit(short_circuit_jumps[op_token.value])
+            self.visit(node.right_node)
+            self.check_number(node.right_node, 4)
+            if op_token.type in binary_ops:
+                self.emit(binary_ops[op_token.type], 0, self.position(node))
+            elif op_token.type == token_list["keyword"].type and op_token.value in logic_ops:
+                self.emit(logic_ops[op_token.value], 0, self.position(node))
+            else:
+                raise Exception(f"no compile method for operator {op_token}")
+            if skip is not None:
+                self.patch(skip)
+
+    def visit_UnaryOpNode(self, node, track_position):
+        self.visit(node.node)
+        self.check_number(node.node, 5)
+        if node.op_token.type == token_list["minus"].type:
+            self.emit(UNARY_NEGATIVE, 0, self.position(node))
+        elif node.op_token.matches("keyword", "not"):
+            self.emit(UNARY_NOT, 0, self.position(node))
+
+    def visit_IfNode(self, node, track_position):
+        expr = node.only_case()
+        if expr is not None:
+            return self.branch(expr, track_position)
+        exits = []
+
+        for condition, expr in node.cases:
+            self.visit(condition)
+            skip = self.emit(POP_JUMP_IF_FALSE, 0, self.position(condition))
+            self.branch(expr, track_position)
+            exits.append(self.emit(JUMP))
+            self.patch(skip)
+
+        if node.else_case:
+            self.branch(node.else_case, track_position)
+        else:
+            self.emit(LOAD_CONST, self.const(None))
+
+        for offset in exits:
+            self.patch(offset)
+
+    def visit_ForNode(self, node, track_position):
+        self.visit(node.start_value_node)
+        self.check_number(node.start_value_node, 0)
+        self.visit(node.end_value_node)
+        self.check_number(node.end_value_node, 1)
+        if node.step_value_node:
+            self.visit(node.step_value_node)
+            self.check_number(node.step_value_node, 2)
+            self.emit(GET_RANGE, 0, self.position(node.step_value_node))
+        else:
+            self.emit(LOAD_CONST, self.const(1))
+            self.emit(GET_RANGE)
+
+        loop = len(self.code.code)
+        done = self.emit(FOR_ITER)
+        self.emit(STORE_VAR, self.name(node.var_name_token.value), self.position(node.var_name_token))
+        self.emit(POP_TOP)
+        self.visit(node.body_node)
+        self.emit(POP_TOP)
+        self.emit(JUMP, loop)
+        self.patch(done)
+        self.emit(LOAD_CONST, self.const(None))
+
+    def visit_WhileNode(self, node, track_position):
+        loop = len(self.code.code)
+        self.visit(node.condition_node)
+        done = self.emit(POP_JUMP_IF_FALSE, 0, self.position(node.condition_node))
+        self.visit(node.body_node)
+        self.emit(POP_TOP)
+        self.emit(JUMP, loop)
+        self.patch(done)
+        self.emit(LOAD_CONST, self.const(None))
+
+    def branch(self, expr, track_position):
+        if not track_position:
+            self.visit(expr)
+            return
+        position = self.value_position(expr)
+        self.visit(expr, position is None)
+        if position is not None:
+            self.emit(SET_POS, position)
+
+
+def disassemble(code):
+    """
+    Makes a human-readable listing of a `Code` object, for debugging.
+    :param code: the `Code` to list.
+    :return: a string with one instruction per line.
+    """
+    lines = []
+    last_line = None
+
+    for index in range(len(code)):
+        op = code.code[index * 2]
+        arg = code.code[index * 2 + 1]
+        position = code.line_table[index]
+
+        line = ""
+        if position >= 0:
+            line_number = code.positions[position][0].line + 1
+            if line_number != last_line:
+                line = str(line_number)
+                last_line = line_number
+
+        if op == LOAD_CONST:
+            detail = f"{arg} ({code.consts[arg]})"
+        elif op in (LOAD_NAME, STORE_VAR, STORE_CONST):
+            detail = f"{arg} ({code.names[arg]})"
+        elif op in (JUMP, POP_JUMP_IF_FALSE, FOR_ITER, JUMP_IF_FALSE_OR_KEEP, JUMP_IF_TRUE_OR_KEEP):
+            detail = f"to {arg // 2}"
+        elif op == BINARY_DIV:
+            detail = "(divisor from SET_POS)" if arg < 0 else f"(divisor at {code.positions[arg][0]})"
+        elif op == SET_POS:
+            detail = f"({code.positions[arg][0]})"
+        elif op == CHECK_NUMBER:
+            detail = f"({number_checks[arg]})"
+        else:
+            detail = ""
+
+        lines.append(f"{line:>5} {index:>6}  {opnames[op]:<20}{detail}".rstrip())
+
+    return "\n".join(lines)
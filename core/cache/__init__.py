@@ -0,0 +1,118 @@
+import hashlib
+from threading import Lock
+
+# rough memory use of a cached program per token, measured with tracemalloc: ~250 bytes for the AST, ~80 more for its
+# bytecode and ~180 more for a compiled python function
+bytes_per_token = 512
+
+
+class CacheEntry:
+    """
+    Everything made from one source: its AST, and each engine's compiled form of it as they get asked for.
+    """
+    def __init__(self, node, size):
+        self.node = node
+        self.size = size
+        # engine name -> CompiledProgram, Code, or for the interpreter the slot names from the `Resolver`. two
+        # threads may both compile one the first time, and then the last one stored is kept, which is fine since
+        # they're the same
+        self.programs = {}
+        self.used = False   # whether it's been hit since eviction last looked at it
+
+
+class CompileCache:
+    """
+    A thread-safe cache of parsed programs, keyed by a hash of their source. Once full, by entry count or by estimated
+    memory, entries that haven't been used lately are dropped.
+
+    Hits don't take the lock, so threads running cached programs never wait on each other. They only mark the entry as
+    used, and eviction gives used entries a second chance: it goes through the entries oldest first, moving used ones to
+    the back and dropping the first unused one, which comes close to dropping the least recently used. Under heavy
+    concurrent use, the hit and miss counters may miss a few counts.
+    """
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        """
+        :param max_entries: the most programs to keep.
+        :param max_bytes: roughly how much memory the cached programs may use, estimated from their token counts.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = {}  # in the order they were added, or last given a second chance
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = Lock()
+
+    @staticmethod
+    def key(text, optimize):
+        if isinstance(text, str):
+            text = text.encode("utf-8", "surrogatepass")
+        return hashlib.blake2b(text, digest_size=16).digest(), optimize
+
+    def get(self, key):
+        """
+        Looks up an entry, marking it as used.
+        :return: the `CacheEntry`, or None on a miss.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        entry.used = True
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        """
+        Adds an entry, evicting the least recently used ones until it fits. Entries bigger than the whole cache aren't
+        kept.
+        :return: the entry.
+        """
+        if entry.size > self.max_bytes or self.max_entries <= 0:
+            return entry
+
+        with self.lock:
+            entries = self.entries
+            old = entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+
+            # make room first, so the new entry can't be the one that goes when all the others have been used
+            while entries and (len(entries) >= self.max_entries or self.size + entry.size > self.max_bytes):
+                oldest = next(iter(entries))
+                evicted = entries.pop(oldest)
+                if evicted.used:
+                    evicted.used = False
+                    entries[oldest] = evicted
+                    continue
+                self.size -= evicted.size
+                self.evictions += 1
+
+            entries[key] = entry
+            self.size += entry.size
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """
+        :return: a dict of the counters and current size, for monitoring.
+        """
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return f"<CompileCache: {len(self.entries)}/{self.max_entries} entries, {self.hits} hits, {self.misses} misses>"
@@ -14,9 +14,67 @@ class Error:
             result += f"\n... at {self.pos_start.filename}, {str(self.pos_start)}"
         else:
             result += f"\n... at {self.pos_start.filename}, ({str(self.pos_start)}) to ({str(self.pos_end)})"
-        result += '\n\n' + string_with_arrows(self.pos_start.filetext, self.pos_start, self.pos_end)
+        result += '\n\n' + string_with_arrows(self.pos_start, self.pos_end)
         return result
 
+    def portable(self):
+        """
+        Makes a copy of the error that can be pickled, e.g. to send it to another process. Its positions no longer keep
+        the whole source and its context no longer keeps any symbol tables; only what's needed to show it is kept.
+        :return: a `PortableError`.
+        """
+        return PortableError(
+            type(self).__name__, self.key, self.details,
+            FixedPosition.of(self.pos_start), FixedPosition.of(self.pos_end),
+            repr(self)
+        )
+
+
+class FixedPosition:
+    """
+    A position whose line and column are already worked out, standing in for a `Position` in a `PortableError`.
+    """
+    __slots__ = ("filename", "index", "line", "column")
+
+    def __init__(self, filename, index, line, column):
+        self.filename = filename
+        self.index = index
+        self.line = line
+        self.column = column
+
+    @classmethod
+    def of(cls, position):
+        if position is None:
+            return None
+        line, column = position.location()
+        return cls(position.filename, position.index, line, column)
+
+    def __eq__(self, other):
+        return isinstance(other, FixedPosition) and \
+            (self.filename, self.index, self.line, self.column) == (other.filename, other.index, other.line, other.column)
+
+    def __str__(self):
+        return f"line {self.line + 1}, column {self.column + 1}"
+
+
+class PortableError:
+    """
+    An error after `Error.portable`: the same key, details and positions, and the text it was shown as.
+    """
+    def __init__(self, error_type, key, details, pos_start, pos_end, text):
+        self.error_type = error_type  # the name of the original error's class
+        self.key = key
+        self.details = details
+        self.pos_start = pos_start
+        self.pos_end = pos_end
+        self.text = text
+
+    def portable(self):
+        return self
+
+    def __repr__(self):
+        return self.text
+
 
 class IllegalCharError(Error):
     def __init__(self, pos_start, pos_end, details):
@@ -41,7 +99,7 @@ class FuseRuntimeError(Error):
     def __repr__(self):
         result = self.generate_traceback()
         result += f"\n{self.key}: {self.details}"
-        result += '\n\n' + string_with_arrows(self.pos_start.filetext, self.pos_start, self.pos_end)
+        result += '\n\n' + string_with_arrows(self.pos_start, self.pos_end)
         return result
 
     def generate_traceback(self):
@@ -57,6 +115,16 @@ class FuseRuntimeError(Error):
         return "Traceback: [most recent call last]:" + result
 
 
+def not_a_number(value, pos_start, pos_end, what, context):
+    """
+    The error every engine gives when a condition or a for loop bound isn't a number.
+    :param value: the value that was found instead, `None` for an if without a matching case.
+    :param what: what the value was for, like "the condition" or "the step".
+    :return: a `FuseRuntimeError`.
+    """
+    return FuseRuntimeError(pos_start, pos_end, f"Expected a number as {what}, not a {type(value).__name__}", context)
+
+
 class VariableUndefinedError(FuseRuntimeError):
     def __init__(self, pos_start, pos_end, details, context):
         super().__init__(pos_start, pos_end, details, context, key="VariableUndefinedError")
@@ -67,3 +135,15 @@ class ConstantAssignmentError(FuseRuntimeError):
     def __init__(self, pos_start, pos_end, details, context):
         super().__init__(pos_start, pos_end, details, context, key="ConstantAssignmentError")
         self.context = context
+
+
+class EvaluationCancelledError(FuseRuntimeError):
+    def __init__(self, pos_start, pos_end, details, context):
+        super().__init__(pos_start, pos_end, details, context, key="EvaluationCancelledError")
+        self.context = context
+
+
+class ResourceExhaustedError(FuseRuntimeError):
+    def __init__(self, pos_start, pos_end, details, context):
+        super().__init__(pos_start, pos_end, details, context, key="ResourceExhaustedError")
+        self.context = context
@@ -1,6 +1,25 @@
+from core.classes.errors import FuseRuntimeError
+
+
 class FuseClass:
+    __slots__ = ()
+
     def __init__(self):
         pass
 
     def f__type__(self):
-        return type(self)
\ No newline at end of file
+        return type(self)
+
+    def f__reflect__(self, operation, other):
+        """
+        Called as the fallback of `other.operation(self)`, when `other` doesn't know how to do it with this type, so
+        this type gets a chance to do it instead. The default is to give an error.
+        :param operation: the name of the method that was called, like "add".
+        :param other: the value on the left of the operation.
+        :return: a tuple of (result, error), like the operation itself.
+        """
+        return None, FuseRuntimeError(
+            None, None,
+            f"Can't {operation} {type(other).__name__} and {type(self).__name__}",
+            None
+        )
@@ -3,18 +3,24 @@ from core.classes.fuse_classes.base import FuseClass
 
 
 class FuseNumber(FuseClass):
+    __slots__ = ("value", "pos_start", "pos_end", "context")
+
     def __init__(self, value):
         self.value = value
-        self.set_pos()
-        self.set_context()
+        self.pos_start = None
+        self.pos_end = None
+        self.context = None
 
     def set_pos(self, pos_start=None, pos_end=None):
         """
         Sets the position of the FuseNumber. Not required for function, but generally recommended for error handling.
+        The shared `true` and `false` are never changed; a positioned copy of them is returned instead.
         :param pos_start: The starting position.
         :param pos_end: The ending position.
         :return:
         """
+        if self is true or self is false:
+            return self.copy().set_pos(pos_start, pos_end)
         self.pos_start = pos_start
         self.pos_end = pos_end
         return self
@@ -22,9 +28,12 @@ class FuseNumber(FuseClass):
     def set_context(self, context=None):
         """
         Adds a context. Not required for functionality, but recommended for error handling.
+        The shared `true` and `false` are never changed; a copy of them with the context is returned instead.
         :param context: the `Context` class to give it.
         :return:
         """
+        if self is true or self is false:
+            return self.copy().set_context(context)
         self.context = context
         return self
 
@@ -35,7 +44,8 @@ class FuseNumber(FuseClass):
         :return: The sum of the FuseNumbers.
         """
         if isinstance(other, FuseNumber):
-            return FuseNumber(self.value + other.value).set_context(self.context), None
+            return FuseNumber(self.value + other.value), None
+        return other.f__reflect__("add", self)
 
     def sub(self, other):
         """
@@ -44,7 +54,8 @@ class FuseNumber(FuseClass):
         :return: The FuseNumber being called, minus the FuseNumber provided.
         """
         if isinstance(other, FuseNumber):
-            return FuseNumber(self.value - other.value).set_context(self.context), None
+            return FuseNumber(self.value - other.value), None
+        return other.f__reflect__("sub", self)
 
     def multiply(self, other):
         """
@@ -53,7 +64,8 @@ class FuseNumber(FuseClass):
         :return: The product of the two FuseNumbers.
         """
         if isinstance(other, FuseNumber):
-            return FuseNumber(self.value * other.value).set_context(self.context), None
+            return FuseNumber(self.value * other.value), None
+        return other.f__reflect__("multiply", self)
 
     def power(self, other):
         """
@@ -62,13 +74,15 @@ class FuseNumber(FuseClass):
         :return: The two numbers, powered together.
         """
         if isinstance(other, FuseNumber):
-            return FuseNumber(self.value ** other.value).set_context(self.context), None
+            return FuseNumber(self.value ** other.value), None
+        return other.f__reflect__("power", self)
 
     def divide(self, other):
         """
         Divides two FuseNumbers. Note that this can return an error.
         :param other: The other FuseNumber to subtract.
         :return: The FuseNumber being called, divided by the FuseNumber provided. Note that this can return a FuseRuntimeError.
+        If the numbers have no position or context, the error doesn't either, and the caller has to fill them in.
         """
         if isinstance(other, FuseNumber):
             if other.value == 0:
@@ -77,7 +91,8 @@ class FuseNumber(FuseClass):
                     "Division by zero",
                     self.context
                 )
-            return FuseNumber(self.value / other.value).set_context(self.context), None
+            return FuseNumber(self.value / other.value), None
+        return other.f__reflect__("divide", self)
 
     def copy(self):
         """
@@ -85,8 +100,9 @@ class FuseNumber(FuseClass):
         :return: a copy of the FuseNumber.
         """
         copy = FuseNumber(self.value)
-        copy.set_pos(self.pos_start, self.pos_end)
-        copy.set_context(self.context)
+        copy.pos_start = self.pos_start
+        copy.pos_end = self.pos_end
+        copy.context = self.context
         return copy
 
     def equals(self, other):
@@ -95,10 +111,9 @@ class FuseNumber(FuseClass):
         :param other: The other FuseNumber to compare.
         :return: 1 if equivalent, 0 if not.
         """
-        if self.value == other.value:
-            return FuseNumber(1).set_context(self.context), None
-        else:
-            return FuseNumber(0).set_context(self.context), None
+        if isinstance(other, FuseNumber):
+            return (true if self.value == other.value else false), None
+        return other.f__reflect__("equals", self)
 
     def less(self, other):
         """
@@ -106,10 +121,9 @@ class FuseNumber(FuseClass):
         :param other: The other FuseNumber to compare.
         :return: 1 if less, 0 if not.
         """
-        if self.value < other.value:
-            return FuseNumber(1).set_context(self.context), None
-        else:
-            return FuseNumber(0).set_context(self.context), None
+        if isinstance(other, FuseNumber):
+            return (true if self.value < other.value else false), None
+        return other.f__reflect__("less", self)
 
     def greater(self, other):
         """
@@ -117,20 +131,16 @@ class FuseNumber(FuseClass):
         :param other: The other FuseNumber to compare.
         :return: 1 if greater, 0 if not.
         """
-        if self.value > other.value:
-            return FuseNumber(1).set_context(self.context), None
-        else:
-            return FuseNumber(0).set_context(self.context), None
+        if isinstance(other, FuseNumber):
+            return (true if self.value > other.value else false), None
+        return other.f__reflect__("greater", self)
 
     def not_l(self):
         """
         Inverts the value, assuming it is a logical boolean. 0 is falsy, everything else is truthy.
         :return: 1 if the number isn't 0, otherwise returns a 1.
         """
-        if self.value == 0:
-            return FuseNumber(1).set_context(self.context), None
-        else:
-            return FuseNumber(0).set_context(self.context), None
+        return (true if self.value == 0 else false), None
 
     def or_l(self, other):
         """
@@ -138,10 +148,9 @@ class FuseNumber(FuseClass):
         :param other: The other value to compare.
         :return: The values OR'd together.
         """
-        if bool(self.value) or bool(other.value):
-            return FuseNumber(1).set_context(self.context), None
-        else:
-            return FuseNumber(0).set_context(self.context), None
+        if isinstance(other, FuseNumber):
+            return (true if bool(self.value) or bool(other.value) else false), None
+        return other.f__reflect__("or_l", self)
 
     def xor_l(self, other):
         """
@@ -149,10 +158,9 @@ class FuseNumber(FuseClass):
         :param other: The other value to compare.
         :return: The values XOR'd together.
         """
-        if bool(self.value) + bool(other.value) == 1:
-            return FuseNumber(1).set_context(self.context), None
-        else:
-            return FuseNumber(0).set_context(self.context), None
+        if isinstance(other, FuseNumber):
+            return (true if bool(self.value) + bool(other.value) == 1 else false), None
+        return other.f__reflect__("xor_l", self)
 
     def and_l(self, other):
         """
@@ -160,11 +168,14 @@ class FuseNumber(FuseClass):
         :param other: The other value to compare.
         :return: The values AND'd together.
         """
-        if bool(self.value) and bool(other.value):
-            return FuseNumber(1).set_context(self.context), None
-        else:
-            return FuseNumber(0).set_context(self.context), None
-
+        if isinstance(other, FuseNumber):
+            return (true if bool(self.value) and bool(other.value) else false), None
+        return other.f__reflect__("and_l", self)
 
     def __repr__(self):
         return str(self.value)
+
+
+# shared results of every comparison and logic operation. nothing should ever change these
+true = FuseNumber(1)
+false = FuseNumber(0)
@@ -2,16 +2,40 @@ from core.classes.fuse_classes.iterable import FuseIterable
 
 
 class FuseRange(FuseIterable):
+    """
+    The numbers from `start` up to (not including) `stop`, `step` apart, like python's `range` but for floats too. With
+    a negative step it counts down, and stops above `stop`.
+    """
     def __init__(self, stop, start=0, step=1):
+        if step == 0:
+            raise ValueError("FuseRange step can't be 0")
         self.stop = stop
         self.start = start
         self.step = step
-        if self.stop < self.start:  # invert so that stop is always greater than or equal to start
-            self.stop, self.start = self.start, self.stop
         self._count = self.start - self.step  # this is so that f__next__ works on first iteration
 
     def f__next__(self):
         self._count += self.step
-        if self._count < self.stop:
+        if self._count < self.stop if self.step > 0 else self._count > self.stop:
             return self._count
         raise StopIteration
+
+    def __iter__(self):
+        """
+        Iterates natively, for loops: ints go through python's own `range`, and floats add up the step each time like
+        `f__next__` does. Neither raises an exception per step or touches `_count`.
+        """
+        if type(self.start) is int and type(self.stop) is int and type(self.step) is int:
+            return iter(range(self.start, self.stop, self.step))
+        return self.float_iter()
+
+    def float_iter(self):
+        count = self.start
+        if self.step > 0:
+            while count < self.stop:
+                yield count
+                count += self.step
+        else:
+            while count > self.stop:
+                yield count
+                count += self.step
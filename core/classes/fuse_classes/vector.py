@@ -0,0 +1,215 @@
+from core.classes.errors import FuseRuntimeError
+from core.classes.fuse_classes.base import FuseClass
+from core.classes.fuse_classes.number import FuseNumber
+
+try:
+    import numpy
+except ImportError:  # numpy is only needed for vectors
+    numpy = None
+
+# the operations a FuseNumber can hand over to a FuseVector on its right
+reflected_operations = frozenset((
+    "add", "sub", "multiply", "divide", "power", "equals", "less", "greater", "and_l", "or_l", "xor_l",
+))
+
+class FuseVector(FuseClass):
+    """
+    A NumPy array of numbers. Every operation works elementwise, and a FuseNumber on either side is broadcast against
+    every element. Comparisons and logic ops give vectors of 1s and 0s. Unlike FuseNumbers, the elements have numpy's
+    fixed-size types, so ints can overflow.
+    """
+    __slots__ = ("value", "pos_start", "pos_end", "context")
+
+    def __init__(self, value):
+        if numpy is None:
+            raise ImportError("FuseVector needs numpy, which isn't installed")
+        self.value = numpy.asarray(value)
+        self.pos_start = None
+        self.pos_end = None
+        self.context = None
+
+    def set_pos(self, pos_start=None, pos_end=None):
+        """
+        Sets the position of the FuseVector, for error handling.
+        :param pos_start: The starting position.
+        :param pos_end: The ending position.
+        :return:
+        """
+        self.pos_start = pos_start
+        self.pos_end = pos_end
+        return self
+
+    def set_context(self, context=None):
+        """
+        Adds a context, for error handling.
+        :param context: the `Context` class to give it.
+        :return:
+        """
+        self.context = context
+        return self
+
+    def operate(self, other, function, reflected, name):
+        """
+        Runs a numpy function on this vector and a FuseNumber or FuseVector.
+        :param other: the other value.
+        :param function: the numpy function, taking (left, right).
+        :param reflected: whether `other` is on the left.
+        :param name: the name of the operation, for errors.
+        :return: a tuple of (FuseVector, error).
+        """
+        if not isinstance(other, (FuseNumber, FuseVector)):
+            if reflected:
+                return FuseClass.f__reflect__(self, name, other)
+            return other.f__reflect__(name, self)
+        left, right = (other.value, self.value) if reflected else (self.value, other.value)
+        try:
+            with numpy.errstate(all="ignore"):
+                return FuseVector(function(left, right)), None
+        except ValueError:
+            return None, FuseRuntimeError(
+                None, None,
+                f"Can't {name} vectors of shapes {numpy.shape(left)} and {numpy.shape(right)}",
+                self.context
+            )
+
+    def compare(self, other, function, reflected, name):
+        """
+        Like `operate`, but turns the booleans into 1s and 0s.
+        """
+        result, error = self.operate(other, function, reflected, name)
+        if error:
+            return None, error
+        result.value = result.value.astype(numpy.int64)
+        return result, None
+
+    def add(self, other, reflected=False):
+        """
+        Adds elementwise.
+        :param other: The FuseNumber or FuseVector to add.
+        :param reflected: whether `other` is on the left.
+        :return: The sums.
+        """
+        return self.operate(other, numpy.add, reflected, "add")
+
+    def sub(self, other, reflected=False):
+        """
+        Subtracts elementwise.
+        :param other: The FuseNumber or FuseVector to subtract.
+        :param reflected: whether `other` is on the left.
+        :return: The differences.
+        """
+        return self.operate(other, numpy.subtract, reflected, "sub")
+
+    def multiply(self, other, reflected=False):
+        """
+        Multiplies elementwise.
+        :param other: The FuseNumber or FuseVector to multiply.
+        :param reflected: whether `other` is on the left.
+        :return: The products.
+        """
+        return self.operate(other, numpy.multiply, reflected, "multiply")
+
+    def power(self, other, reflected=False):
+        """
+        Exponentiates elementwise. Integers raised to negative powers give floats, like with FuseNumbers.
+        :param other: The FuseNumber or FuseVector exponent, or base if reflected.
+        :param reflected: whether `other` is on the left.
+        :return: The powers.
+        """
+        def power(base, exponent):
+            if numpy.issubdtype(numpy.result_type(base), numpy.integer) and numpy.any(numpy.less(exponent, 0)):
+                base = numpy.asarray(base, dtype=numpy.float64)
+            return numpy.power(base, exponent)
+        return self.operate(other, power, reflected, "power")
+
+    def divide(self, other, reflected=False):
+        """
+        Divides elementwise. Note that this can return an error.
+        :param other: The FuseNumber or FuseVector to divide by, or to divide if reflected.
+        :param reflected: whether `other` is on the left.
+        :return: The quotients. If any divisor is 0, a FuseRuntimeError saying how many there are and where the first
+        one is instead.
+        """
+        if isinstance(other, (FuseNumber, FuseVector)):
+            divisor = self if reflected else other
+            zeros = numpy.asarray(divisor.value) == 0
+            if zeros.any():
+                if zeros.ndim == 0:
+                    details = "Division by zero"
+                else:
+                    first = numpy.unravel_index(numpy.argmax(zeros), zeros.shape)
+                    index = int(first[0]) if len(first) == 1 else tuple(int(i) for i in first)
+                    details = f"Division by zero in {numpy.count_nonzero(zeros)} of {zeros.size} elements, first at {index}"
+                return None, FuseRuntimeError(divisor.pos_start, divisor.pos_end, details, self.context)
+        return self.operate(other, numpy.true_divide, reflected, "divide")
+
+    def equals(self, other, reflected=False):
+        """
+        Compares elementwise.
+        :return: 1 where equal, 0 where not.
+        """
+        return self.compare(other, numpy.equal, reflected, "equals")
+
+    def less(self, other, reflected=False):
+        """
+        Compares elementwise.
+        :return: 1 where the left is less, 0 where not.
+        """
+        return self.compare(other, numpy.less, reflected, "less")
+
+    def greater(self, other, reflected=False):
+        """
+        Compares elementwise.
+        :return: 1 where the left is greater, 0 where not.
+        """
+        return self.compare(other, numpy.greater, reflected, "greater")
+
+    def not_l(self):
+        """
+        Inverts elementwise. 0 is falsy, everything else is truthy.
+        :return: 1 where the element is 0, otherwise 0.
+        """
+        return FuseVector((self.value == 0).astype(numpy.int64)), None
+
+    def and_l(self, other, reflected=False):
+        """
+        Logically ANDs elementwise. 0 is falsy, everything else is truthy.
+        """
+        return self.compare(other, lambda left, right: numpy.logical_and(left != 0, right != 0), reflected, "and_l")
+
+    def or_l(self, other, reflected=False):
+        """
+        Logically ORs elementwise. 0 is falsy, everything else is truthy.
+        """
+        return self.compare(other, lambda left, right: numpy.logical_or(left != 0, right != 0), reflected, "or_l")
+
+    def xor_l(self, other, reflected=False):
+        """
+        Logically XORs elementwise. 0 is falsy, everything else is truthy.
+        """
+        return self.compare(other, lambda left, right: numpy.logical_xor(left != 0, right != 0), reflected, "xor_l")
+
+    def f__reflect__(self, operation, other):
+        """
+        Does `other.operation(self)` for a FuseNumber on the left.
+        """
+        if operation not in reflected_operations:
+            return super().f__reflect__(operation, other)
+        return getattr(self, operation)(other, reflected=True)
+
+    def copy(self):
+        """
+        Makes a clone of a FuseVector. The array itself is shared, since operations never change it.
+        :return: a copy of the FuseVector.
+        """
+        copy = FuseVector(self.value)
+        copy.pos_start = self.pos_start
+        copy.pos_end = self.pos_end
+        copy.context = self.context
+        return copy
+
+    def __len__(self):
+        return len(self.value)
+
+    def __repr__(self):
+        return str(self.value)
@@ -0,0 +1,402 @@
+from core.classes.fuse_classes.number import FuseNumber
+from core.classes.fuse_classes.range import FuseRange
+from core.lexer import token_list
+from core.parser import NumberNode, BinaryOpNode
+from core.resolver import can_be_none, nullable_names
+from core.classes.errors import *
+
+# expressions nested deeper than this get spilled into a temporary, so CPython's own compiler never recurses too far
+max_expression_depth = 40
+
+
+class _Fault(Exception):
+    """
+    Carries a Fuse error out of generated code. Never escapes `CompiledProgram.execute`.
+    """
+    def __init__(self, error):
+        super().__init__()
+        self.error = error
+
+
+def _undefined(context, positions, index, var_name):
+    pos_start, pos_end = positions[index]
+    raise _Fault(VariableUndefinedError(pos_start, pos_end, f"{var_name} is not defined", context))
+
+
+def _constant(context, positions, index, var_name):
+    pos_start, pos_end = positions[index]
+    raise _Fault(ConstantAssignmentError(pos_start, pos_end, f"'{var_name}' is a constant", context))
+
+
+def _division_by_zero(context, positions, index):
+    pos_start, pos_end = positions[index]
+    raise _Fault(FuseRuntimeError(pos_start, pos_end, "Division by zero", context))
+
+
+def _zero_step(context, positions, index):
+    pos_start, pos_end = positions[index]
+    raise _Fault(FuseRuntimeError(pos_start, pos_end, "The step of a for loop can't be 0", context))
+
+
+def _not_a_number(context, positions, index, what):
+    pos_start, pos_end = positions[index]
+    raise _Fault(not_a_number(None, pos_start, pos_end, what, context))
+
+
+class CompiledProgram:
+    def __init__(self, function, positions, source, names):
+        self.function = function
+        self.positions = positions
+        self.source = source  # the generated python, kept around for debugging
+        self.names = names    # the variables it uses
+
+    def execute(self, context):
+        """
+        Runs the program against `context.symbol_table`.
+        :param context: the `Context` to run in.
+        :return: a tuple of (FuseNumber or None, error or None), like `Interpreter.visit` would give.
+        """
+        try:
+            value, index = self.function(context, self.positions)
+        except _Fault as fault:
+            return None, fault.error
+
+        if value is None:
+            return None, None
+        return FuseNumber(value).set_context(context).set_pos(*self.positions[index]), None
+
+
+class Compiler:
+    """
+    Compiles a parsed AST into a python function through `compile()`, so running it skips the per-node
+    `Interpreter.visit` dispatch. Values are kept as plain python numbers and only boxed into a `FuseNumber` at the end.
+
+    The only other value there can be is None, from an if where no case ran. Only the variables and operands that could
+    get one are checked for it, so the program has to start with a number in each variable it uses.
+    """
+    def __init__(self):
+        self.lines = []
+        self.indent = 1
+        self.positions = []
+        self.temp_count = 0
+        self.names = set()
+        self.nullable = set()
+
+    def compile(self, node, filename="<fuse>"):
+        """
+        Turns an AST into a `CompiledProgram`.
+        :param node: the root node, as returned by `Parser.parse`.
+        :param filename: the name shown in python tracebacks from the generated code.
+        :return: a `CompiledProgram`.
+        """
+        self.lines = []
+        self.indent = 1
+        self.positions = []
+        self.temp_count = 0
+        self.names = set()
+        self.nullable = nullable_names(node)
+
+        code, _, pos = self.visit(node)
+        self.emit(f"return {code}, {pos}")
+
+        source = "def __fuse_program__(context, _positions):\n" \
+                 "    _get = context.symbol_table.get\n" \
+                 "    _set = context.symbol_table.set\n" + "\n".join(self.lines)
+        namespace = {
+            "FuseNumber": FuseNumber,
+            "FuseRange": FuseRange,
+            "_undefined": _undefined,
+            "_constant": _constant,
+            "_division_by_zero": _division_by_zero,
+            "_zero_step": _zero_step,
+            "_not_a_number": _not_a_number,
+        }
+        exec(compile(source, filename, "exec"), namespace)
+        return CompiledProgram(namespace["__fuse_program__"], self.positions, source, tuple(self.names))
+
+    # helpers
+
+    def emit(self, line):
+        self.lines.append("    " * self.indent + line)
+
+    def temp(self):
+        self.temp_count += 1
+        return f"t{self.temp_count}"
+
+    def position(self, node):
+        self.positions.append((node.pos_start, node.pos_end))
+        return len(self.positions) - 1
+
+    def spill(self, code):
+        name = self.temp()
+        self.emit(f"{name} = {code}")
+        return name
+
+    def visit(self, node):
+        """
+        Compiles a node into a python expression. Anything that needs statements is emitted into `self.lines` first.
+        :return: a tuple of (expression, nesting depth, position) where the position is either an index into
+        `self.positions` or the name of a variable holding one.
+        """
+        method_name = f"visit_{type(node).__name__}"
+        method = getattr(self, method_name, self.no_visit_method)
+        code, depth, pos = method(node)
+        if depth > max_expression_depth:
+            return self.spill(code), 0, pos
+        return code, depth, pos
+
+    def no_visit_method(self, node):
+        raise Exception(f"no compile method for {type(node).__name__}")
+
+    # nodes
+
+    def visit_BlockNode(self, node):
+        for statement in node.statements[:-1]:
+            code, _, _ = self.visit(statement)
+            self.emit(code)
+        return self.visit(node.statements[-1])
+
+    def visit_NumberNode(self, node):
+        value = node.token.value
+        if value != value or value in (float("inf"), float("-inf")):
+            return f"float({str(value)!r})", 1, self.position(node)
+        if repr(value).startswith("-"):  # folded negatives, which would otherwise bind looser than `**`
+            return f"({value!r})", 0, self.position(node)
+        return repr(value), 0, self.position(node)
+
+    def visit_VarAccessNode(self, node):
+        var_name = node.var_name_token.value
+        self.names.add(var_name)
+        pos = self.position(node)
+        variable = f"(_get({var_name!r}) or _undefined(context, _positions, {pos}, {var_name!r}))"
+        if var_name in self.nullable:
+            value = self.temp()
+            return f"({value}.value if ({value} := {variable}.value) is not None else None)", 1, pos
+        return f"{variable}.value.value", 1, pos
+
+    def visit_VarAssignNode(self, node):
+        var_name = node.var_name_token.value
+        self.names.add(var_name)
+        code, _, value_pos = self.visit(node.value_node)
+        name = self.spill(code)
+        pos = self.position(node)
+        value = f"FuseNumber({name})"
+        if var_name in self.nullable:
+            value = f"None if {name} is None else {value}"
+        self.emit(f"if _set({var_name!r}, {value}, {node.const!r}):")
+        self.emit(f"    _constant(context, _positions, {pos}, {var_name!r})")
+        return name, 0, value_pos
+
+    def visit_BinaryOpNode(self, node):
+        # walk down the left side of chains like 1+2+3+... without recursing, since the parser builds them left-nested
+        chain = []
+        while isinstance(node, BinaryOpNode):
+            chain.append(node)
+            node = node.left_node
+        code, depth, pos = self.visit(node)
+
+        for node in reversed(chain):
+            code, depth, pos = self.binary_op(node, code, depth)
+            if depth > max_expression_depth:
+                code, depth = self.spill(code), 0
+        return code, depth, pos
+
+    def binary_op(self, node, left, left_depth):
+        """
+        Compiles one binary op whose left side has already been compiled.
+        :return: a tuple like `visit` gives.
+        """
+        if can_be_none(node.left_node, self.nullable):
+            left, left_depth = self.checked(left, node.left_node, "the left operand"), 0
+        mark = len(self.lines)
+        right, right_depth, right_pos = self.visit(node.right_node)
+        if can_be_none(node.right_node, self.nullable):
+            right, right_depth = self.checked(right, node.right_node, "the right operand"), 0
+        if len(self.lines) != mark and left_depth:
+            # the right side emitted statements, so the left side has to be evaluated before them
+            name = self.temp()
+            self.lines.insert(mark, "    " * self.indent + f"{name} = {left}")
+            left, left_depth = name, 0
+            mark += 1
+        depth = max(left_depth, right_depth) + 1
+        op = node.op_token
+
+        if op.type == token_list["plus"].type:
+            code = f"({left} + {right})"
+        elif op.type == token_list["minus"].type:
+            code = f"({left} - {right})"
+        elif op.type == token_list["mul"].type:
+            code = f"({left} * {right})"
+        elif op.type == token_list["pow"].type:
+            code = f"({left} ** {right})"
+        elif op.type == token_list["div"].type:
+            code = self.divide(left, right, right_pos, node.right_node)
+        elif op.type == token_list["eq"].type:
+            code = f"(1 if {left} == {right} else 0)"
+        elif op.type == token_list["neq"].type:
+            code = f"(0 if {left} == {right} else 1)"
+        elif op.type == token_list["lt"].type:
+            code = f"(1 if {left} < {right} else 0)"
+        elif op.type == token_list["lte"].type:
+            code = f"(0 if {left} > {right} else 1)"
+        elif op.type == token_list["gt"].type:
+            code = f"(1 if {left} > {right} else 0)"
+        elif op.type == token_list["gte"].type:
+            code = f"(0 if {left} < {right} else 1)"
+        elif op.matches("keyword", "and") or op.matches("keyword", "or"):
+            if len(self.lines) != mark:
+                return self.short_circuit(op.value, left, right, mark), 0, self.position(node)
+            code = f"(1 if {left} != 0 {op.value} {right} != 0 else 0)"
+        elif op.matches("keyword", "xor"):
+            code = f"(1 if ({left} != 0) ^ ({right} != 0) else 0)"
+        else:
+            raise Exception(f"no compile method for operator {op}")
+
+        return code, depth, self.position(node)
+
+    def short_circuit(self, op, left, right, mark):
+        """
+        Compiles an and or an or whose right side emitted statements, by moving them under an if so they only run
+        when the left side doesn't decide it.
+        :param mark: where in `self.lines` the right side's statements start.
+        :return: the name of the result.
+        """
+        result = self.temp()
+        self.lines[mark:] = ["    " + line for line in self.lines[mark:]]
+        self.lines.insert(mark, "    " * self.indent + f"if {left} {'!=' if op == 'and' else '=='} 0:")
+        self.emit(f"    {result} = 1 if {right} != 0 else 0")
+        self.emit("else:")
+        self.emit(f"    {result} = {0 if op == 'and' else 1}")
+        return result
+
+    def divide(self, left, right, right_pos, right_node):
+        if isinstance(right_node, NumberNode) and right_node.token.value != 0:
+            return f"({left} / {right})"
+        numerator, denominator = self.temp(), self.temp()
+        # walrus both sides in order so the left operand is still evaluated first
+        return f"({numerator} / {denominator} if (({numerator} := {left}) or True) and ({denominator} := {right}) != 0 " \
+               f"else _division_by_zero(context, _positions, {right_pos}))"
+
+    def visit_UnaryOpNode(self, node):
+        operand, depth, _ = self.visit(node.node)
+        if can_be_none(node.node, self.nullable):
+            operand, depth = self.checked(operand, node.node, "the operand"), 0
+        if node.op_token.type == token_list["minus"].type:
+            code = f"({operand} * -1)"
+        elif node.op_token.matches("keyword", "not"):
+            code = f"(1 if {operand} == 0 else 0)"
+        else:
+            code = operand
+        return code, depth + 1, self.position(node)
+
+    def visit_IfNode(self, node):
+        expr = node.only_case()
+        if expr is not None:
+            return self.visit(expr)
+        result, pos = self.temp(), self.temp()
+        base = level = self.indent
+
+        for i, (condition, expr) in enumerate(node.cases):
+            self.indent = level + (1 if i else 0)
+            mark = len(self.lines)
+            code, _, _ = self.visit(condition)
+            nullable = can_be_none(condition, self.nullable)
+            if nullable:
+                value = self.temp()
+                code = f"({value} := {code})"
+            if not i:
+                self.emit(f"if {code} != 0:")
+            elif len(self.lines) == mark:
+                # no statements needed for the condition, so it can be a plain elif
+                self.indent = level
+                self.emit(f"elif {code} != 0:")
+            else:
+                # the condition needs statements, which have to go inside the previous else
+                self.lines.insert(mark, "    " * level + "else:")
+                level += 1
+                self.emit(f"if {code} != 0:")
+            self.indent = level + 1
+            if nullable:  # None != 0, so it ends up here
+                self.check_number(value, condition, "the condition")
+            self.branch(expr, result, pos)
+
+        self.indent = level
+        self.emit("else:")
+        self.indent = level + 1
+        if node.else_case:
+            self.branch(node.else_case, result, pos)
+        else:
+            self.emit(f"{result} = None")
+            self.emit(f"{pos} = 0")
+        self.indent = base
+
+        return result, 0, pos
+
+    def check_number(self, code, node, what):
+        """
+        Emits the check that a value isn't None, the only value in compiled code that isn't a number.
+        """
+        self.emit(f"if {code} is None:")
+        self.emit(f"    _not_a_number(context, _positions, {self.position(node)}, {what!r})")
+
+    def checked(self, code, node, what):
+        """
+        Spills a value that could be None and checks it isn't, for the operands of ops.
+        :return: the name it was spilled to.
+        """
+        name = self.spill(code)
+        self.check_number(name, node, what)
+        return name
+
+    def branch(self, expr, result, pos):
+        code, _, expr_pos = self.visit(expr)
+        self.emit(f"{result} = {code}")
+        self.emit(f"{pos} = {expr_pos}")
+
+    def visit_ForNode(self, node):
+        bounds = []
+        for value_node, what in ((node.start_value_node, "the start"), (node.end_value_node, "the end"),
+                                 (node.step_value_node, "the step")):
+            if value_node is None:  # no step
+                bounds.append("1")
+                continue
+            code, _, _ = self.visit(value_node)
+            bounds.append(self.spill(code))
+            if can_be_none(value_node, self.nullable):
+                self.check_number(bounds[-1], value_node, what)
+        start, end, step = bounds
+
+        if node.step_value_node is not None:
+            self.emit(f"if {step} == 0:")
+            self.emit(f"    _zero_step(context, _positions, {self.position(node.step_value_node)})")
+
+        var_name = node.var_name_token.value
+        self.names.add(var_name)
+        value, pos = self.temp(), self.position(node.var_name_token)
+        self.emit(f"for {value} in FuseRange({end}, {start}, {step}):")
+        self.indent += 1
+        self.emit(f"if _set({var_name!r}, FuseNumber({value}), False):")
+        self.emit(f"    _constant(context, _positions, {pos}, {var_name!r})")
+        code, _, _ = self.visit(node.body_node)
+        self.emit(code)
+        self.indent -= 1
+
+        return "None", 0, 0
+
+    def visit_WhileNode(self, node):
+        self.emit("while True:")
+        self.indent += 1
+        code, _, _ = self.visit(node.condition_node)
+        if can_be_none(node.condition_node, self.nullable):
+            value = self.temp()
+            self.emit(f"if ({value} := {code}) == 0:")
+            self.emit("    break")
+            self.check_number(value, node.condition_node, "the condition")
+        else:
+            self.emit(f"if {code} == 0:")
+            self.emit("    break")
+        code, _, _ = self.visit(node.body_node)
+        self.emit(code)
+        self.indent -= 1
+
+        return "None", 0, 0
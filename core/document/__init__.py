@@ -0,0 +1,155 @@
+from core.lexer import RegexLexer, Source, Token, token_list
+from core.parser import Parser, ParseResult, BlockNode
+
+
+class LineSource(Source):
+    """
+    The `Source` of one line of a `Document`. Offsets into it start at the start of the line, so edits to other lines
+    never have to move its tokens, and which line it is is only looked up when a position is shown.
+    """
+    __slots__ = ("document", "line")
+
+    def __init__(self, document, line):
+        super().__init__(document.filename, line.text)
+        self.document = document
+        self.line = line
+
+    def location(self, index):
+        number = self.document.line_number(self.line)
+        if index > len(self.text) and number + 1 < len(self.document.lines):
+            return number + 1, index - len(self.text) - 1  # past the newline, like an error ending a character late
+        return number, index
+
+    def line_text(self, line):
+        lines = self.document.lines
+        return lines[line].text if line < len(lines) else ""
+
+
+class Line:
+    """
+    One line of a `Document`, with its tokens and the statement on it. Statements can't span lines, so every line can
+    be lexed and parsed on its own.
+    """
+    __slots__ = ("text", "source", "tokens", "newline", "node", "error", "lex_error")
+
+    def __init__(self, document, text):
+        self.text = text
+        self.source = LineSource(document, self)
+        self.tokens, self.lex_error = RegexLexer(document.filename, text, self.source).parse()
+        self.node = None
+        self.error = self.lex_error
+
+        if self.lex_error:
+            return
+        self.tokens.pop()  # the eof
+        # the token ending the line. it's a newline even on the last line, where a full lex has the eof instead, which
+        # parses the same and is in the same place
+        self.newline = Token.span(token_list["newline"].type, None, self.source, len(text), len(text) + 1)
+        if self.tokens:
+            self.parse()
+
+    def parse(self):
+        """
+        Parses the statement on this line, like `Parser.block` would as part of the whole document.
+        """
+        parser = Parser(self.tokens + [self.newline])
+        result = parser.expression()
+        if result.error:
+            self.error = result.error
+        elif parser.current_token is not self.newline:
+            self.error = parser.expected_operation()
+        else:
+            self.node = result.node
+
+
+class Document:
+    """
+    A source that's edited bit by bit, like in an editor, and keeps its tokens and AST between edits. Only the lines an
+    edit touches are lexed and parsed again, and the results are the same as lexing and parsing the whole text.
+    """
+    def __init__(self, filename, text=""):
+        self.filename = filename
+        self.lines = []
+        self.errors = set()    # the lines with lex or parse errors
+        self.numbers = None    # id(line) -> line number, built when a position needs one
+        self.result = None     # the last `parse()`, until the next edit
+        self.replace(0, 0, text.split("\n"))
+
+    @property
+    def text(self):
+        return "\n".join(line.text for line in self.lines)
+
+    def edit(self, start_line, start_column, end_line, end_column, text):
+        """
+        Replaces a range of the text, given like an editor would, with lines and columns starting at 0.
+        :param start_line: the line the range starts on.
+        :param start_column: the column it starts at.
+        :param end_line: the line it ends on.
+        :param end_column: the column it ends before.
+        :param text: what to put there.
+        """
+        if not 0 <= start_line <= end_line < len(self.lines):
+            raise IndexError(f"lines {start_line} to {end_line} aren't in the document, which has {len(self.lines)}")
+        before = self.lines[start_line].text[:start_column]
+        after = self.lines[end_line].text[end_column:]
+        self.replace(start_line, end_line + 1, (before + text + after).split("\n"))
+
+    def replace(self, start, end, texts):
+        """
+        Replaces `lines[start:end]` with new lines.
+        """
+        for line in self.lines[start:end]:
+            self.errors.discard(line)
+            if self.numbers is not None:
+                del self.numbers[id(line)]
+        lines = [Line(self, text) for text in texts]
+        self.errors.update(line for line in lines if line.error)
+        self.lines[start:end] = lines
+
+        if end - start != len(lines):
+            self.numbers = None  # every line after these moved
+        elif self.numbers is not None:
+            for number, line in enumerate(lines, start):
+                self.numbers[id(line)] = number
+        self.result = None
+
+    def line_number(self, line):
+        if self.numbers is None:
+            self.numbers = {id(line): number for number, line in enumerate(self.lines)}
+        return self.numbers[id(line)]
+
+    def lex(self):
+        """
+        :return: a tuple of (tokens, error), like `RegexLexer.parse` gives for the whole text.
+        """
+        lex_errors = [line for line in self.errors if line.lex_error]
+        if lex_errors:
+            return [], min(lex_errors, key=self.line_number).lex_error
+
+        tokens = []
+        for line in self.lines:
+            tokens.extend(line.tokens)
+            tokens.append(line.newline)
+        last = self.lines[-1]
+        tokens[-1] = Token.span(token_list["eof"].type, None, last.source, len(last.text), len(last.text) + 1)
+        return tokens, None
+
+    def parse(self):
+        """
+        :return: a `ParseResult`, like `Parser.parse` gives for the whole text. A lex error is given as its error too.
+        """
+        if self.result is not None:
+            return self.result
+
+        result = ParseResult()
+        if self.errors:
+            lex_errors = [line for line in self.errors if line.lex_error]  # a full parse never starts with one of these
+            result.failure(min(lex_errors or self.errors, key=self.line_number).error)
+        else:
+            statements = [line.node for line in self.lines if line.node is not None]
+            if statements:
+                result.success(BlockNode(statements))
+            else:
+                result = Parser(self.lex()[0]).parse()  # there's nothing to parse, which fails like a full parse does
+        self.result = result
+        return result
@@ -1,15 +1,496 @@
+"""
+Runs Fuse programs, with one of the engines, from source, files, streams or saved ASTs.
+
+`run` and the other entry points can be called from many threads at once, as long as the runs don't share a symbol
+table: pass each thread's own, from `thread_symbol_table()`, or give every run a fresh `new_symbol_table()`. Forking
+shares a frozen base between all of them without copying it. Nothing else is shared that isn't safe to share:
+
+- contexts, interpreters, compilers, VMs and optimizer passes are made for each run
+- the compile cache only locks to add entries, and cached ASTs, compiled programs and bytecode are never changed by
+  running them, apart from the interpreter's quickening state, where a race only means an op is quickened again
+- the values runs can share, like the numbers kept on the AST and the shared `true` and `false`, are never changed
+
+A `Profiler`, a `Document` or a table that isn't frozen must still only be used by one thread at a time.
+"""
+import asyncio
+import mmap
+import os
+import threading
+from collections import deque
+from copy import copy
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+
+from core.batch import BatchResult, VectorEvaluator, Unvectorizable, to_column, numpy
+from core.budget import Budget, MeteredInterpreter
+from core.bytecode import BytecodeCompiler
+from core.cache import CompileCache, CacheEntry, bytes_per_token
+from core.classes.errors import FuseRuntimeError
 from core.classes.fuse_classes.number import FuseNumber
-from core.interpreter import Interpreter, Context, SymbolTable
-from core.lexer import Lexer
+from core.compiler import Compiler
+from core.interpreter import Interpreter, Context, SymbolTable, Frame
+from core.lexer import RegexLexer, StreamLexer, Position
+from core.optimizer import Optimizer, ConstantFolder, DeadBranchEliminator
 from core.parser import Parser
+from core.profiler import ProfilingInterpreter
+from core.resolver import Resolver
+from core import serializer
+from core.vm import VM
+
+builtin_constants = {
+    "false": 0,
+    "true": 1,
+}
+
+
+# the frozen base every new symbol table is forked from
+builtin_symbol_table = SymbolTable()
+for name, value in builtin_constants.items():
+    builtin_symbol_table.set(name, FuseNumber(value), True)
+builtin_symbol_table.freeze()
+
+
+def new_symbol_table():
+    """
+    :return: a `SymbolTable` with just the builtin constants in it. It's a fork of `builtin_symbol_table`, so making
+    one copies nothing.
+    """
+    return builtin_symbol_table.fork()
+
+
+global_symbol_table = new_symbol_table()
+
+thread_state = threading.local()  # each thread's own symbol tables, see `thread_symbol_table`
+
+
+def new_optimizer():
+    """
+    :return: an `Optimizer` with the passes `optimize=True` runs. Passes keep state while they run, so every load makes
+    its own, and loads on different threads can't mix theirs up.
+    """
+    return Optimizer([ConstantFolder(builtin_constants), DeadBranchEliminator()])
+
+
+def thread_symbol_table(base=None):
+    """
+    Gets the calling thread's own symbol table, for running programs from many threads at once. Runs given it keep
+    their variables from one run to the next, like with `global_symbol_table`, but threads never see each other's.
+    :param base: the frozen `SymbolTable` the thread's table is forked from, the first time the thread asks for one.
+    `builtin_symbol_table` by default. Each base gives a thread a different table.
+    :return: the `SymbolTable`.
+    """
+    base = builtin_symbol_table if base is None else base
+    if not base.frozen:
+        raise ValueError("the base has to be frozen, so that threads can share it")
+    tables = getattr(thread_state, "symbol_tables", None)
+    if tables is None:
+        tables = thread_state.symbol_tables = {}
+    symbol_table = tables.get(base)
+    if symbol_table is None:
+        symbol_table = tables[base] = base.fork()
+    return symbol_table
+
+engines = ("interpreter", "compiled", "vm")
+
+compile_cache = CompileCache()
+
+
+def run(filename, text, engine="interpreter", optimize=False, cache=compile_cache, profiler=None, symbol_table=None,
+        budget=None):
+    """
+    Lexes, parses and runs a Fuse program.
+    :param filename: the name shown in errors.
+    :param text: the program's source, as a str or as UTF-8 bytes.
+    :param engine: "interpreter" walks the AST, "compiled" turns it into a python function first, "vm" compiles it
+    to bytecode for the `VM`.
+    :param optimize: run the AST through `new_optimizer`'s passes before executing it.
+    :param cache: the `CompileCache` to keep the parsed and compiled program in, or None to always start from scratch.
+    Running the same text again then skips lexing, parsing and compiling.
+    :param profiler: a `Profiler` to record the time spent in each node type and line. Only works with the
+    interpreter engine.
+    :param symbol_table: the `SymbolTable` to run in. By default that's `global_symbol_table`, which every run shares,
+    on every thread. To run from more than one thread at once, give each thread its own, like `thread_symbol_table()`.
+    :param budget: a `Budget` limiting the run's node visits, time and int sizes. Only works with the interpreter
+    engine, and not together with a profiler.
+    :return: a tuple of (result, error).
+    """
+    check_options(engine, profiler, budget)
+    entry, error = load(filename, text, optimize, cache)
+    if error:
+        return None, error
+    result, error = execute(entry, filename, engine, profiler, symbol_table, budget)
+    return result, rebind(error, filename)
+
+
+def check_options(engine, profiler, budget):
+    if engine not in engines:
+        raise ValueError(f"unknown engine '{engine}', expected one of {', '.join(engines)}")
+    if profiler is not None and engine != "interpreter":
+        raise ValueError(f"profiling needs the interpreter engine, not '{engine}'")
+    if budget is not None and engine != "interpreter":
+        raise ValueError(f"budgets need the interpreter engine, not '{engine}'")
+    if budget is not None and profiler is not None:
+        raise ValueError("can't profile a run with a budget")
+
+
+def execute(entry, filename, engine, profiler, symbol_table, budget):
+    """
+    Runs a loaded program with one of the engines, compiling it for that engine first if it hasn't been yet.
+
+    The compiled and vm engines only hold numbers, so a program whose variables start out as anything else, like a
+    vector, runs on the interpreter instead.
+    :return: a tuple of (result, error).
+    """
+    node = entry.node
+    context = Context("<shell>")
+    context.symbol_table = global_symbol_table if symbol_table is None else symbol_table
+
+    if engine == "compiled":
+        program = entry.programs.get(engine)
+        if program is None:
+            program = entry.programs[engine] = Compiler().compile(node, filename)
+        if numbers_only(program.names, context.symbol_table):
+            return program.execute(context)
+    elif engine == "vm":
+        code = entry.programs.get(engine)
+        if code is None:
+            code = entry.programs[engine] = BytecodeCompiler().compile(node)
+        if numbers_only(code.names, context.symbol_table):
+            return VM().execute(code, context)
+
+    if budget is not None:
+        interpreter = MeteredInterpreter(budget)
+    elif profiler is not None:
+        interpreter = ProfilingInterpreter(profiler)
+    else:
+        interpreter = Interpreter()
+    names = entry.programs.get("interpreter")
+    if names is None:
+        names = entry.programs["interpreter"] = Resolver().resolve(node)
+    context.frame = Frame(names, context.symbol_table)
+    try:
+        runtime_result = interpreter.run(node, context)
+    finally:
+        context.frame.store()
+    return runtime_result.value, runtime_result.error
+
+
+def numbers_only(names, symbol_table):
+    """
+    :return: whether each of the variables that's defined holds a number, which the compiled and vm engines need.
+    """
+    get = symbol_table.get
+    for name in names:
+        variable = get(name)
+        if variable is not None and type(variable.value) is not FuseNumber:
+            return False
+    return True
+
+
+def run_file(path, engine="interpreter", optimize=False, profiler=None, symbol_table=None, budget=None):
+    """
+    Runs a Fuse program from a file, like `run`. The file is memory-mapped and lexed as UTF-8 bytes, so it's never read
+    into a str; only the lines an error points at get decoded.
+
+    The tokens' positions keep the mapping open for as long as they're around, so changing the file while its result or
+    error is still used can change what errors show. It isn't cached either, since that would keep it open for good.
+    :param path: the file to run. Its path is the filename shown in errors.
+    :return: a tuple of (result, error).
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size:
+            text = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            text = b""  # empty files can't be mapped
+    return run(os.fspath(path), text, engine, optimize, None, profiler, symbol_table, budget)
+
+
+def save_compiled(path, filename, text, optimize=False):
+    """
+    Lexes and parses a Fuse program and saves its AST to a `.fusec` file, which `run_compiled` runs without lexing or
+    parsing it again. The file is checked to load back as the same AST.
+    :param path: the file to write.
+    :param filename: the name shown in errors, both now and when the saved program runs.
+    :param text: the program's source, as a str or as UTF-8 bytes.
+    :param optimize: run the AST through `new_optimizer`'s passes before saving it.
+    :return: the lexing or parsing error, or None if it was saved.
+    """
+    entry, error = load(filename, text, optimize, None)
+    if error:
+        return error
+    serializer.save(path, entry.node)
+    return None
+
+
+def run_compiled(path, engine="interpreter", profiler=None, symbol_table=None, budget=None):
+    """
+    Runs a program saved by `save_compiled`, like `run` but without lexing or parsing it. Errors show the filename and
+    source it was saved with.
+    :param path: the `.fusec` file.
+    :return: a tuple of (result, error).
+    """
+    check_options(engine, profiler, budget)
+    node = serializer.load(path)
+    entry = CacheEntry(node, 0)
+    return execute(entry, path, engine, profiler, symbol_table, budget)
+
+
+def run_stream(filename, lines, symbol_table=None, budget=None):
+    """
+    Runs a Fuse program while it's being read, one top-level statement at a time, with the interpreter. Each statement
+    is run as soon as it's parsed and then dropped, so memory use doesn't grow with the size of the program, and the
+    first statements run before the rest has been read.
 
-global_symbol_table = SymbolTable()
-global_symbol_table.set("false", FuseNumber(0), True)
-global_symbol_table.set("true", FuseNumber(1), True)
+    Unlike `run`, an error part of the way through only stops the program there: the statements before it have already
+    run, even if the error is a syntax error.
+    :param filename: the name shown in errors.
+    :param lines: the source, as an iterable of lines like an open file, or a string.
+    :param symbol_table: the `SymbolTable` to run in, `global_symbol_table` by default.
+    :param budget: a `Budget` for the whole program, like for `run`.
+    :return: a tuple of (result, error), where the result is the last statement's.
+    """
+    lexer = StreamLexer(filename, lines)
+    context = Context("<shell>")
+    context.symbol_table = global_symbol_table if symbol_table is None else symbol_table
+    interpreter = Interpreter() if budget is None else MeteredInterpreter(budget)
+
+    result = None
+    for statement in Parser(lexer).statements():
+        if lexer.error:  # the lexer stopped at an error, so the parser only saw part of the program
+            return None, lexer.error
+        if statement.error:
+            return None, statement.error
+        runtime_result = interpreter.run(statement.node, context)
+        if runtime_result.error:
+            return None, runtime_result.error
+        result = runtime_result.value
+
+    if lexer.error:
+        return None, lexer.error
+    return result, None
+
+
+async def run_async(filename, text, optimize=False, cache=compile_cache, symbol_table=None, yield_every=1000,
+        cancel=None):
+    """
+    Runs a Fuse program on the `VM` like `run(..., engine="vm")` does, but gives the event loop a turn after every
+    `yield_every` instructions, so other coroutines keep running while a long program does. Lexing, parsing and
+    compiling still happen in one go, but they're cached like with `run`. A program whose variables hold anything but
+    numbers, like vectors, runs on the interpreter in one go instead, since the `VM` only runs numbers.
+
+    To stop the program early, set `cancel`: it then finishes with an `EvaluationCancelledError` at the instruction it
+    was on. Cancelling the task running it also stops it, but raises `asyncio.CancelledError` like usual, so timeouts
+    and task groups keep working.
+    :param filename: the name shown in errors.
+    :param text: the program's source.
+    :param optimize: run the AST through `new_optimizer`'s passes first.
+    :param cache: the `CompileCache` to keep the parsed and compiled program in, or None.
+    :param symbol_table: the `SymbolTable` to run in, `global_symbol_table` by default.
+    :param yield_every: how many instructions to run between turns of the event loop. Each is about one node of the AST,
+    and a turn costs about as much as 15 of them. To limit how much a program can do, use `run` with a `Budget` instead.
+    :param cancel: an `asyncio.Event` (or anything with `is_set()`) that stops the program once it's set.
+    :return: a tuple of (result, error).
+    """
+    if isinstance(yield_every, Budget):
+        raise TypeError("run_async runs on the VM, which doesn't take a Budget; yield_every is an instruction count")
+    if yield_every < 1:
+        raise ValueError("yield_every has to be at least 1")
+    entry, error = load(filename, text, optimize, cache)
+    if error:
+        return None, error
+
+    code = entry.programs.get("vm")
+    if code is None:
+        code = entry.programs["vm"] = BytecodeCompiler().compile(entry.node)
+    context = Context("<shell>")
+    context.symbol_table = global_symbol_table if symbol_table is None else symbol_table
+    if not numbers_only(code.names, context.symbol_table):  # e.g. a vector, which only the interpreter runs
+        result, error = execute(entry, filename, "interpreter", None, symbol_table, None)
+        return result, rebind(error, filename)
+
+    steps = VM().steps(code, context, yield_every)
+    cancelled = bool if cancel is None else cancel.is_set  # bool() is False, so the program is never cancelled
+    try:
+        next(steps)
+        while True:
+            await asyncio.sleep(0)
+            steps.send(cancelled())
+    except StopIteration as stop:
+        result, error = stop.value
+    finally:
+        steps.close()
+
+    return result, rebind(error, filename)
+
+
+def run_batch(filename, text, columns, optimize=False, cache=compile_cache, vectorize=True):
+    """
+    Runs one program for every row of a set of columns, as if `run` was called once per row with that row's values as
+    variables. Each row starts from just the builtin constants, so rows can't see each other's assignments.
+
+    Programs that only use arithmetic, comparisons, logic, top level assignments, and ifs with an else run in one
+    vectorized pass over the columns with numpy, if it's installed. There, ints and floats mixed in one if come back as
+    floats. Everything else runs row by row with the compiled engine.
+    :param filename: the name shown in errors.
+    :param text: the program's source.
+    :param columns: a dict of variable name to a list or array of numbers. They all have to be the same length.
+    :param optimize: run the AST through `new_optimizer`'s passes first.
+    :param cache: the `CompileCache` to keep the parsed program in, or None.
+    :param vectorize: set to False to always run row by row.
+    :return: a tuple of (BatchResult or None, error or None). The error is only for errors in the program itself, like
+    syntax errors; errors in single rows are in `BatchResult.errors`.
+    """
+    sizes = {len(column) for column in columns.values()}
+    if len(sizes) != 1:
+        raise ValueError("run_batch needs at least one column, and all the columns have to be the same length")
+    size = sizes.pop()
+    for name in columns:
+        if name in builtin_constants:
+            raise ValueError(f"'{name}' is a constant, so it can't be a column")
+
+    entry, error = load(filename, text, optimize, cache)
+    if error:
+        return None, error
+
+    if vectorize and numpy is not None:
+        try:
+            vector_columns = {name: to_column(column) for name, column in columns.items()}
+            evaluator = VectorEvaluator(vector_columns, size, builtin_constants, Context("<shell>"))
+            values, errors = evaluator.evaluate(entry.node)
+        except Unvectorizable:
+            pass
+        else:
+            for error in evaluator.error_list:
+                rebind(error, filename)
+            return BatchResult(values, errors, True), None
+
+    program = entry.programs.get("compiled")
+    if program is None:
+        program = entry.programs["compiled"] = Compiler().compile(entry.node, filename)
+    rows = {name: column.tolist() if hasattr(column, "tolist") else list(column) for name, column in columns.items()}
+    values, errors = [], []
+
+    for row in range(size):
+        context = Context("<shell>")
+        context.symbol_table = new_symbol_table()
+        for name, column in rows.items():
+            context.symbol_table.set(name, FuseNumber(column[row]))
 
+        try:
+            result, error = program.execute(context)
+        except (ArithmeticError, ValueError) as exception:  # e.g. 0^-1, which python itself refuses
+            result, error = None, FuseRuntimeError(
+                entry.node.pos_start, entry.node.pos_end, str(exception) or type(exception).__name__, context)
+        values.append(None if result is None or error else result.value)
+        errors.append(rebind(error, filename))
 
-def run(filename, text):
-    lexer = Lexer(filename, text)
+    return BatchResult(values, errors, False), None
+
+
+class JobResult:
+    """
+    What one job of `run_many` gave. Both the result and the error can be pickled: the result has no position or
+    context, and the error is a `PortableError`.
+    """
+    __slots__ = ("index", "filename", "result", "error")
+
+    def __init__(self, index, filename, result, error):
+        self.index = index  # the job's position in the jobs given to `run_many`
+        self.filename = filename
+        self.result = result
+        self.error = error
+
+    def __iter__(self):
+        return iter((self.result, self.error))  # so it unpacks like what `run` returns
+
+    def __repr__(self):
+        return f"<JobResult {self.index} ({self.filename}): {self.error.key if self.error else self.result}>"
+
+
+def run_chunk(chunk, engine, optimize, budget):
+    """
+    Runs some of `run_many`'s jobs, in a worker process. Each job gets its own symbol table.
+    :param chunk: a list of (index, filename, text).
+    :return: a list of `JobResult`s.
+    """
+    results = []
+    for index, filename, text in chunk:
+        result, error = run(filename, text, engine, optimize, symbol_table=new_symbol_table(), budget=budget)
+        if result is not None:
+            result = result.copy().set_pos().set_context()
+        results.append(JobResult(index, filename, result, None if error is None else error.portable()))
+    return results
+
+
+def run_many(jobs, workers=None, engine="interpreter", optimize=False, chunk_size=16, ordered=True, budget=None):
+    """
+    Runs many independent programs across a pool of processes. Each program runs in its own symbol table, starting
+    from just the builtin constants, so they can't see each other's variables like programs given to `run` can.
+
+    Jobs are read lazily and sent to the workers in chunks, with only a few chunks per worker waiting at a time, so
+    `jobs` can be a generator of any length.
+    :param jobs: an iterable of (filename, text) pairs.
+    :param workers: how many processes to use. Defaults to one per CPU.
+    :param engine: the engine to run them with, like for `run`.
+    :param optimize: run the ASTs through `new_optimizer`'s passes first.
+    :param chunk_size: how many jobs to send to a worker at once. Bigger chunks cost less to send, smaller ones spread
+    uneven jobs out better.
+    :param ordered: yield the results in the order of `jobs`. Otherwise they're yielded as soon as their chunk is done,
+    and `JobResult.index` tells which job each was.
+    :param budget: a `Budget` for each job, like for `run`.
+    :return: a generator of `JobResult`s.
+    """
+    check_options(engine, None, budget)
+    if chunk_size < 1:
+        raise ValueError("chunk_size has to be at least 1")
+    workers = workers or os.cpu_count() or 1
+
+    numbered = ((index, filename, text) for index, (filename, text) in enumerate(jobs))
+    chunks = iter(lambda: list(islice(numbered, chunk_size)), [])
+
+    pool = ProcessPoolExecutor(workers)
+    pending = deque() if ordered else set()
+
+    def submit(chunk):
+        future = pool.submit(run_chunk, chunk, engine, optimize, budget)
+        if ordered:
+            pending.append(future)
+        else:
+            pending.add(future)
+
+    try:
+        for chunk in islice(chunks, workers * 2):
+            submit(chunk)
+
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                pending -= done
+
+            for future in done:
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    submit(chunk)
+                yield from future.result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def load(filename, text, optimize, cache):
+    """
+    Gets the AST for some source, from the cache if it's there.
+    :return: a tuple of (CacheEntry or None, error or None). Programs with errors aren't cached.
+    """
+    key = None
+    if cache is not None:
+        key = cache.key(text, optimize)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry, None
+
+    lexer = RegexLexer(filename, text)
     tokens, error = lexer.parse()
     if error:
         return None, error
@@ -18,10 +499,27 @@ def run(filename, text):
     ast = parser.parse()
     if ast.error:
         return None, ast.error
+    node = ast.node
+    if optimize:
+        node = new_optimizer().optimize(node)
+
+    entry = CacheEntry(node, len(text) + len(tokens) * bytes_per_token)
+    if cache is not None:
+        cache.put(key, entry)
+    return entry, None
 
-    context = Context("<shell>")
-    context.symbol_table = global_symbol_table
-    interpreter = Interpreter()
-    result = interpreter.visit(ast.node, context)
 
-    return result.value, result.error
+def rebind(error, filename):
+    """
+    Cached programs keep the filename they were first parsed with, so errors from them are moved to a copy of the
+    source with the filename of this run.
+    :return: the error.
+    """
+    if error is None or error.pos_start is None or error.pos_start.filename == filename:
+        return error
+    source = copy(error.pos_start.source)
+    source.filename = filename
+    error.pos_start = Position(error.pos_start.index, source, error.pos_start.end)
+    if error.pos_end is not None:
+        error.pos_end = Position(error.pos_end.index, source, error.pos_end.end)
+    return error
@@ -1,34 +1,283 @@
-from core.classes.fuse_classes.number import FuseNumber
+import operator
+
+from core.classes.fuse_classes.number import FuseNumber, true, false
+from core.classes.fuse_classes.range import FuseRange
 from core.lexer import token_list
+from core.parser import NumberNode, BinaryOpNode
 from core.classes.errors import *
 
+# plain python versions of the FuseNumber operations, used when both sides are FuseNumbers
+arithmetic_ops = {
+    "plus": operator.add,
+    "minus": operator.sub,
+    "mul": operator.mul,
+    "div": operator.truediv,
+    "pow": operator.pow,
+}
+
+comparison_ops = {
+    "eq": lambda left, right: left == right,
+    "neq": lambda left, right: not left == right,
+    "lt": lambda left, right: left < right,
+    "lte": lambda left, right: not left > right,
+    "gt": lambda left, right: left > right,
+    "gte": lambda left, right: not left < right,
+    "and": lambda left, right: bool(left) and bool(right),
+    "or": lambda left, right: bool(left) or bool(right),
+    "xor": lambda left, right: bool(left) + bool(right) == 1,
+}
+
+
+# comparisons that can use python's own operators when both sides are ints. with floats, `lte` and `gte` have to stay
+# "not greater" and "not less" for NaNs to compare like they do in the generic path
+int_comparisons = {
+    "eq": operator.eq,
+    "neq": operator.ne,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+}
+
+# how many visits in a row a binary op needs with the same operand types before it's quickened for them
+quicken_threshold = 8
+
+# the most tables a snapshot's lookups may go through before `SymbolTable.snapshot` flattens it
+max_layers = 8
+
+# what a `Frame` slot holds while its variable isn't defined, since a variable can be set to None
+undefined = object()
+
+
+def operand_reader(node):
+    """
+    :return: a function of the context that gives the value of an operand of a quickened op, or None if it can't: a
+    variable that isn't defined, or an op that isn't quickened or whose quickened version gave None.
+    """
+    if type(node) is NumberNode:
+        number = node.number
+        return lambda context: number
+    if type(node) is BinaryOpNode:
+        def evaluate(context):
+            quick = node.quick
+            return None if quick is None else quick(context)
+        return evaluate
+
+    var_name = node.var_name_token.value
+
+    def read(context):
+        frame = context.frame
+        if frame is not None:
+            value = frame.values[node.slot]
+            return None if value is undefined else value
+        variable = context.symbol_table.get(var_name)
+        return None if variable is None else variable.value
+    return read
+
+
+def specialize(node, left_type, right_type):
+    """
+    Makes a quickened version of a binary op whose operands are literals, variables or other such ops, for one pair of
+    operand value types. It gets the operands itself instead of visiting them, and skips working out the operator.
+    :return: a function of the context, giving the result, or None if an operand can't be got or has other types, or
+    the result needs the generic path, like a division by zero does. Getting operands changes nothing, so the op can
+    always be run the generic way after a None.
+    """
+    read_left, read_right = operand_reader(node.left_node), operand_reader(node.right_node)
+    op = node.op
+
+    if op in comparison_ops:
+        compare = comparison_ops[op]
+        if left_type is int and right_type is int:
+            compare = int_comparisons.get(op, compare)
+
+        def quick(context):
+            left, right = read_left(context), read_right(context)
+            if type(left) is FuseNumber and type(right) is FuseNumber:
+                left_value, right_value = left.value, right.value
+                if type(left_value) is left_type and type(right_value) is right_type:
+                    return true if compare(left_value, right_value) else false
+            return None
+    elif op == "div":
+        def quick(context):
+            left, right = read_left(context), read_right(context)
+            if type(left) is FuseNumber and type(right) is FuseNumber:
+                left_value, right_value = left.value, right.value
+                if type(left_value) is left_type and type(right_value) is right_type and right_value != 0:
+                    return FuseNumber(left_value / right_value)
+            return None
+    else:
+        function = arithmetic_ops[op]
+
+        def quick(context):
+            left, right = read_left(context), read_right(context)
+            if type(left) is FuseNumber and type(right) is FuseNumber:
+                left_value, right_value = left.value, right.value
+                if type(left_value) is left_type and type(right_value) is right_type:
+                    return FuseNumber(function(left_value, right_value))
+            return None
+    quick.kind = f"{left_type.__name__} {op} {right_type.__name__}"  # for the profiler's quickening stats
+    return quick
+
 
 class Variable:
+    __slots__ = ("value", "constant")
+
     def __init__(self, value, constant):
         self.value = value
         self.constant = constant
 
 
 class SymbolTable:
-    def __init__(self):
+    """
+    Variables by name. A table can sit over a parent, whose variables it sees until it sets its own, and whose constants
+    it can't set at all.
+
+    That's how `fork` makes a session over a shared base in O(1): the base is frozen, and each fork is an empty table
+    over it, which only ever holds what the session itself sets.
+    """
+    def __init__(self, parent=None):
         self.symbols = {}
-        self.parent = None
+        self.parent = parent
+        self.frozen = False
 
     def get(self, name):
-        value = self.symbols.get(name, None)
-        if value == None and self.parent:
-            return self.parent.get(name).value
-        return value
+        variable = self.symbols.get(name)
+        if variable is None:
+            table = self.parent
+            while variable is None and table is not None:
+                variable = table.symbols.get(name)
+                table = table.parent
+        return variable
 
     def set(self, name, value, constant=False):
-        if self.symbols.get(name, Variable("filler-to-have-no-constant", False)).constant:
+        if self.frozen:
+            raise ValueError("a frozen symbol table can't be changed, fork it instead")
+        variable = self.get(name)
+        if variable is not None and variable.constant:
             return 1
         self.symbols[name] = Variable(value, constant)
         return None
 
     def remove(self, name):
+        if self.frozen:
+            raise ValueError("a frozen symbol table can't be changed, fork it instead")
         del self.symbols[name]
 
+    def freeze(self):
+        """
+        Stops the table from being changed, so it can be shared by forks.
+        :return: the table.
+        """
+        self.frozen = True
+        return self
+
+    def layers(self):
+        """
+        :return: how many tables a lookup may go through, this one included.
+        """
+        count, table = 0, self
+        while table is not None:
+            count, table = count + 1, table.parent
+        return count
+
+    def snapshot(self):
+        """
+        Makes a frozen table with this one's variables as they are now. This table's own variables move into it, and
+        this table carries on as an empty table over it, so nothing is copied, and later changes to this table don't
+        show in the snapshot.
+
+        Once lookups would go through more than `max_layers` tables, the snapshot is flattened into one instead, which
+        copies the variables once.
+        :return: the frozen table.
+        """
+        if self.frozen:
+            return self
+        if not self.symbols and self.parent is not None and self.parent.frozen:
+            return self.parent  # nothing was set since the last snapshot
+
+        base = SymbolTable(self.parent)
+        base.symbols = self.symbols
+        if base.layers() > max_layers:
+            base = base.flattened()
+        self.symbols = {}
+        self.parent = base.freeze()
+        return base
+
+    def flattened(self):
+        """
+        :return: a new table, with no parent, of every variable this one sees.
+        """
+        tables = []
+        table = self
+        while table is not None:
+            tables.append(table)
+            table = table.parent
+        flat = SymbolTable()
+        for table in reversed(tables):
+            flat.symbols.update(table.symbols)
+        return flat
+
+    def fork(self):
+        """
+        Makes a table that starts out with this one's variables, in O(1), over a `snapshot` of this one. Forks and
+        the table they came from can then change without seeing each other's changes, and without copying anything but
+        what they set.
+        :return: the new table.
+        """
+        return SymbolTable(self.snapshot())
+
+
+class Frame:
+    """
+    The variables of one run of a resolved program, in flat lists indexed by the slots the `Resolver` gave its nodes.
+    They're loaded from a symbol table when the run starts, and the ones the program assigns are saved back to it by
+    `store` when it ends.
+    """
+    __slots__ = ("names", "symbol_table", "values", "constants", "assigned")
+
+    def __init__(self, names, symbol_table):
+        """
+        :param names: the name of each slot, as the `Resolver` gave them.
+        :param symbol_table: the `SymbolTable` to load from and save to.
+        """
+        self.names = names
+        self.symbol_table = symbol_table
+        self.values = []     # the value in each slot, or `undefined`
+        self.constants = []  # whether each slot is a constant
+        for name in names:
+            variable = symbol_table.get(name)
+            self.values.append(undefined if variable is None else variable.value)
+            self.constants.append(variable is not None and variable.constant)
+        self.assigned = [False] * len(names)
+
+    def set(self, slot, value, constant=False):
+        """
+        Like `SymbolTable.set`, but by slot. Like it, this raises a ValueError right away if the table is frozen, rather
+        than when the slots are saved, so the error comes from the assignment, as with the other engines.
+        :return: 1 if the slot is a constant, otherwise None.
+        """
+        if self.symbol_table.frozen:
+            raise ValueError("a frozen symbol table can't be changed, fork it instead")
+        if self.constants[slot]:
+            return 1
+        self.values[slot] = value
+        self.assigned[slot] = True
+        if constant:
+            self.constants[slot] = True
+        return None
+
+    def store(self):
+        """
+        Saves the assigned slots to the symbol table. A table that's been frozen is left alone, so that this never
+        raises over whatever error stopped the run.
+        """
+        if self.symbol_table.frozen:
+            return
+        for slot, assigned in enumerate(self.assigned):
+            if assigned:
+                self.symbol_table.set(self.names[slot], self.values[slot], self.constants[slot])
+
 
 class Context:
     def __init__(self, display_name, parent=None, parent_entry_pos=None):
@@ -36,12 +285,22 @@ class Context:
         self.parent = parent
         self.parent_entry_pos = parent_entry_pos
         self.symbol_table = None
+        self.frame = None  # a `Frame`, when running a resolved program. variables are then looked up by slot
+
+    def fork(self, display_name=None):
+        """
+        :return: a new context with a `SymbolTable.fork` of this one's symbol table.
+        """
+        context = Context(self.display_name if display_name is None else display_name)
+        context.symbol_table = self.symbol_table.fork()
+        return context
 
 
 class RuntimeResult:
     def __init__(self):
         self.value = None
         self.error = None
+        self.node = None  # the node whose position the value has, if it isn't the one that was visited
 
     def register(self, res):
         if res.error:
@@ -58,6 +317,16 @@ class RuntimeResult:
 
 
 class Interpreter:
+    arithmetic_ops = arithmetic_ops  # so subclasses can swap in their own, like `MeteredInterpreter`
+    quicken = True  # whether hot binary ops get quickened. it skips visits, so it's off where every visit counts
+
+    def run(self, node, context):
+        """
+        Runs a whole program.
+        :return: a `RuntimeResult`.
+        """
+        return self.visit(node, context)
+
     def visit(self, node, context):
         method_name = f"visit_{type(node).__name__}"
         # should be like "visit_BinaryOpNode"
@@ -69,39 +338,48 @@ class Interpreter:
 
     def visit_BlockNode(self, node, context):
         res = RuntimeResult()
-        out = res.register(self.visit(node.lead, context))
-        if node.rest:
-            out = res.register(self.visit(node.rest, context))
-        if res.error:
-            return res
+        out = None
+        for statement in node.statements:
+            statement_res = self.visit(statement, context)
+            out = res.register(statement_res)
+            if res.error:
+                return res
+        res.node = statement_res.node or statement
         return res.success(out)
 
     def visit_VarAccessNode(self, node, context):
         result = RuntimeResult()
-        var_name = node.var_name_token.value
-        value = context.symbol_table.get(var_name)
-
-        if not value:
-            return result.failure(
-                VariableUndefinedError(
-                    node.pos_start, node.pos_end,
-                    f"{var_name} is not defined",
-                    context
-                )
+        frame = context.frame
+        if frame is not None:
+            value = frame.values[node.slot]
+            if value is not undefined:
+                return result.success(value)
+        else:
+            variable = context.symbol_table.get(node.var_name_token.value)
+            if variable is not None:
+                return result.success(variable.value)  # values are never changed once made, so there's no need to copy
+
+        return result.failure(
+            VariableUndefinedError(
+                node.pos_start, node.pos_end,
+                f"{node.var_name_token.value} is not defined",
+                context
             )
-
-        value = value.value.copy().set_pos(node.pos_start, node.pos_end)
-        return result.success(value)
+        )
 
     def visit_VarAssignNode(self, node, context):
         result = RuntimeResult()
         var_name = node.var_name_token.value
-        value = result.register(self.visit(node.value_node, context))
+        value_result = self.visit(node.value_node, context)
+        value = result.register(value_result)
 
         if result.error:
             return result
 
-        error = context.symbol_table.set(var_name, value, node.const)
+        if context.frame is not None:
+            error = context.frame.set(node.slot, value, node.const)
+        else:
+            error = context.symbol_table.set(var_name, value, node.const)
         if isinstance(error, int):
             return result.failure(
                 ConstantAssignmentError(
@@ -111,17 +389,60 @@ class Interpreter:
                 )
             )
 
+        result.node = value_result.node or node.value_node
         return result.success(value)
 
     def visit_NumberNode(self, node, context):
-        return RuntimeResult().success(
-            FuseNumber(node.token.value).set_context(context).set_pos(node.pos_start, node.pos_end)
-        )
+        return RuntimeResult().success(node.number)
 
     def visit_BinaryOpNode(self, node, context):
+        # quickening: an op on literals, variables or other such ops that's had the same operand types for
+        # `quicken_threshold` visits in a row gets a version specialized for them, by `specialize`. it's kept on the
+        # node, so later runs of a cached program start out quickened
+        quick = node.quick
+        if quick is not None and self.quicken:
+            value = quick(context)
+            if value is not None:
+                return RuntimeResult().success(value)
+            node.quick = None  # the types changed, so it's back to the generic path until it warms up again
+
         res = RuntimeResult()
         left = res.register(self.visit(node.left_node, context))
-        right = res.register(self.visit(node.right_node, context))
+        if res.error:
+            return res
+        if left is None:
+            return res.failure(self.not_a_number(left, node.left_node, "the left operand", context))
+
+        op = node.op
+        if (op == "and" or op == "or") and type(left) is FuseNumber and (left.value != 0) == (op == "or"):
+            # the left side decides it, so the right side isn't run. vectors always run both, to work elementwise
+            return res.success(true if op == "or" else false)
+
+        right_res = self.visit(node.right_node, context)
+        right = res.register(right_res)
+        if res.error:
+            return res
+        if right is None:
+            return res.failure(self.not_a_number(right, node.right_node, "the right operand", context))
+
+        if type(left) is FuseNumber and type(right) is FuseNumber:
+            warmup = node.warmup
+            if warmup is not None and self.quicken:
+                types = (type(left.value), type(right.value))
+                if types != node.seen:
+                    node.seen, node.warmup = types, 1
+                elif warmup + 1 < quicken_threshold:
+                    node.warmup = warmup + 1
+                elif node.quick is None:
+                    node.quick = specialize(node, *types)
+
+            # fast path: work on the plain values, and only make a new FuseNumber for arithmetic results
+            if op in comparison_ops:
+                return res.success(true if comparison_ops[op](left.value, right.value) else false)
+            if op == "div" and right.value == 0:
+                error = FuseRuntimeError(None, None, "Division by zero", context)
+                return res.failure(self.attach(error, right_res.node or node.right_node, context))
+            return res.success(FuseNumber(self.arithmetic_ops[op](left.value, right.value)))
 
         if node.op_token.type == token_list["plus"].type:
             result, error = left.add(right)
@@ -138,21 +459,21 @@ class Interpreter:
         if node.op_token.type == token_list["neq"].type:
             result, error = left.equals(right)
             if error:
-                return res.failure(error)
+                return res.failure(self.attach(error, node, context))
             result, error = result.not_l()
         if node.op_token.type == token_list["lt"].type:
             result, error = left.less(right)
         if node.op_token.type == token_list["lte"].type:
             result, error = left.greater(right)
             if error:
-                return res.failure(error)
+                return res.failure(self.attach(error, node, context))
             result, error = result.not_l()
         if node.op_token.type == token_list["gt"].type:
             result, error = left.greater(right)
         if node.op_token.type == token_list["gte"].type:
             result, error = left.less(right)
             if error:
-                return res.failure(error)
+                return res.failure(self.attach(error, node, context))
             result, error = result.not_l()
         if node.op_token.matches("keyword", "and"):
             result, error = left.and_l(right)
@@ -162,24 +483,31 @@ class Interpreter:
             result, error = left.xor_l(right)
 
         if error:
-            return res.failure(error)
+            return res.failure(self.attach(error, right_res.node or node.right_node, context))
         else:
-            return res.success(result.set_pos(node.pos_start, node.pos_end))
+            return res.success(result)
 
     def visit_UnaryOpNode(self, node, context):
         result = RuntimeResult()
         operand = result.register(
             self.visit(node.node, context))  # this is the child node of the unary op [i.e. the 4 in -4]
+        if result.error:
+            return result
+        if operand is None:
+            return result.failure(self.not_a_number(operand, node.node, "the operand", context))
+        error = None
 
         if node.op_token.type == token_list["minus"].type:
+            if type(operand) is FuseNumber:
+                return result.success(FuseNumber(operand.value * -1))
             operand, error = operand.multiply(FuseNumber(-1))
         if node.op_token.matches("keyword", "not"):
             operand, error = operand.not_l()
 
         if error:
-            return result.failure(error)
+            return result.failure(self.attach(error, node, context))
         else:
-            return result.success(operand.set_pos(node.pos_start, node.pos_end))
+            return result.success(operand)
 
     def visit_IfNode(self, node, context):
         result = RuntimeResult()
@@ -188,17 +516,109 @@ class Interpreter:
             condition_value = result.register(self.visit(condition, context))
             if result.error:
                 return result
+            if not isinstance(condition_value, FuseNumber):
+                return result.failure(self.not_a_number(condition_value, condition, "the condition", context))
 
             if condition_value.value != 0:
-                expr_value = result.register(self.visit(expr, context))
+                expr_result = self.visit(expr, context)
+                expr_value = result.register(expr_result)
                 if result.error:
                     return result
+                result.node = expr_result.node or expr
                 return result.success(expr_value)
 
         if node.else_case:
-            else_value = result.register(self.visit(node.else_case, context))
+            else_result = self.visit(node.else_case, context)
+            else_value = result.register(else_result)
             if result.error:
                 return result
+            result.node = else_result.node or node.else_case
             return result.success(else_value)
 
         return result.success(None)
+
+    def visit_ForNode(self, node, context):
+        result = RuntimeResult()
+        bounds = []
+
+        for value_node, what in ((node.start_value_node, "the start"), (node.end_value_node, "the end"),
+                                 (node.step_value_node, "the step")):
+            if value_node is None:  # no step
+                bounds.append(1)
+                continue
+            value = result.register(self.visit(value_node, context))
+            if result.error:
+                return result
+            if not isinstance(value, FuseNumber):
+                return result.failure(self.not_a_number(value, value_node, what, context))
+            bounds.append(value.value)
+
+        start, end, step = bounds
+        if step == 0:
+            return result.failure(FuseRuntimeError(
+                node.step_value_node.pos_start, node.step_value_node.pos_end,
+                "The step of a for loop can't be 0",
+                context
+            ))
+
+        var_name = node.var_name_token.value
+        frame = context.frame
+        if frame is not None:
+            set_, key = frame.set, node.slot
+        else:
+            set_, key = context.symbol_table.set, var_name
+        body_node = node.body_node
+        visit = self.visit
+
+        # a native python loop, so each step only costs the FuseNumber for the loop variable and the body itself
+        for value in FuseRange(end, start, step):
+            if set_(key, FuseNumber(value)):
+                return result.failure(ConstantAssignmentError(
+                    node.var_name_token.pos_start, node.var_name_token.pos_end,
+                    f"'{var_name}' is a constant",
+                    context
+                ))
+            result.register(visit(body_node, context))
+            if result.error:
+                return result
+
+        return result.success(None)
+
+    def visit_WhileNode(self, node, context):
+        result = RuntimeResult()
+        condition_node = node.condition_node
+        body_node = node.body_node
+        visit = self.visit
+
+        while True:
+            condition_value = result.register(visit(condition_node, context))
+            if result.error:
+                return result
+            if not isinstance(condition_value, FuseNumber):
+                return result.failure(self.not_a_number(condition_value, condition_node, "the condition", context))
+            if condition_value.value == 0:
+                break
+
+            result.register(visit(body_node, context))
+            if result.error:
+                return result
+
+        return result.success(None)
+
+    def not_a_number(self, value, node, what, context):
+        return not_a_number(value, node.pos_start, node.pos_end, what, context)
+
+    def attach(self, error, node, context):
+        """
+        Values don't carry positions or contexts any more, so errors made by them get them here instead.
+        :param error: the error returned by a value's operation.
+        :param node: the node whose position the error should point at, if it doesn't have one.
+        :param context: the context to give the error, if it doesn't have one.
+        :return: the error.
+        """
+        if error.pos_start is None:
+            error.pos_start = node.pos_start
+            error.pos_end = node.pos_end
+        if isinstance(error, FuseRuntimeError) and error.context is None:
+            error.context = context
+        return error
@@ -1,4 +1,7 @@
+import io
+import re
 import string
+from bisect import bisect_right
 
 from core.classes.errors import *
 
@@ -19,47 +22,208 @@ keywords_list = [
     "if",
     "then",
     "elif",
-    "else"
+    "else",
+    "for",
+    "to",
+    "step",
+    "while"
 ]
 
-# position class
+# how many bytes a `MappedSource` copies at a time while it counts lines
+scan_chunk = 1 << 20
+
+# source and position classes
+
+class Source:
+    """
+    One program's text. Positions only store an offset into it, and the line index used to turn offsets into lines and
+    columns is built the first time one is asked for, which is usually only when an error is shown.
+    """
+    __slots__ = ("filename", "text", "_line_starts")
+
+    def __init__(self, filename, text):
+        self.filename = filename
+        self.text = text
+        self._line_starts = None
+
+    def line_starts(self):
+        if self._line_starts is None:
+            self._line_starts = [0] + [match.end() for match in re.finditer("\n", self.text)]
+        return self._line_starts
+
+    def location(self, index):
+        """
+        Finds the line and column of an offset.
+        :param index: the offset into `text`.
+        :return: a tuple of (line, column), both starting at 0.
+        """
+        line_starts = self.line_starts()
+        line = max(bisect_right(line_starts, index) - 1, 0)
+        return line, index - line_starts[line]
+
+    def line_text(self, line):
+        """
+        :param line: the line number, starting at 0.
+        :return: the text of that line, without its newline. Lines past the end are empty.
+        """
+        line_starts = self.line_starts()
+        if line >= len(line_starts):
+            return ""
+        end = line_starts[line + 1] - 1 if line + 1 < len(line_starts) else len(self.text)
+        return self.text[line_starts[line]:end]
+
+
+class MappedSource(Source):
+    """
+    The `Source` of a file's UTF-8 bytes, like an `mmap` of it, which are lexed as they are instead of being decoded
+    first. A program that lexes is all ASCII, so offsets into the bytes are offsets into the text too.
+
+    There's no index of line starts, which for a big file would take more memory than the mapped file saves. Lines are
+    counted from the last position looked up instead, and only the lines that are shown get decoded.
+    """
+    __slots__ = ("_last",)
+
+    def __init__(self, filename, text):
+        super().__init__(filename, text)
+        self._last = (0, 0)  # the start of a line and its number, which the next look up counts from
+
+    def count_lines(self, start, end):
+        count = 0
+        for chunk_start in range(start, end, scan_chunk):
+            count += self.text[chunk_start:min(chunk_start + scan_chunk, end)].count(b"\n")
+        return count
+
+    def location(self, index):
+        start, line = self._last
+        if index >= start:
+            line += self.count_lines(start, index)
+        else:
+            line -= self.count_lines(index, start)
+        start = self.text.rfind(b"\n", 0, index) + 1
+        self._last = (start, line)
+        return line, index - start
+
+    def line_text(self, line):
+        text = self.text
+        start, current = self._last
+        while current < line:
+            start = text.find(b"\n", start) + 1
+            if not start:
+                return ""
+            current += 1
+        while current > line:
+            start = text.rfind(b"\n", 0, start - 1) + 1
+            current -= 1
+        self._last = (start, current)
+
+        end = text.find(b"\n", start)
+        return text[start:len(text) if end == -1 else end].decode("utf-8", "replace")
+
+
+class StreamLine(Source):
+    """
+    The `Source` of one line of a `StreamLexer`, which is all that's kept of the source once it's been read.
+    """
+    __slots__ = ("number",)
+
+    def __init__(self, filename, text, number):
+        super().__init__(filename, text)
+        self.number = number
+
+    def location(self, index):
+        return self.number, index
+
+    def line_text(self, line):
+        return self.text if line == self.number else ""
+
 
 class Position:
-    def __init__(self, index, line, column, filename, filetext):
-        self.column = column
-        self.line = line
+    __slots__ = ("index", "source", "end")
+
+    def __init__(self, index, source, end=False):
+        """
+        :param index: the offset into the source.
+        :param source: the `Source` the offset is in.
+        :param end: whether this is the end of a span, which belongs to the character before it. The end of a newline
+        token is then still on the newline's line.
+        """
         self.index = index
-        self.filename = filename
-        self.filetext = filetext
+        self.source = source
+        self.end = end
+
+    @property
+    def line(self):
+        return self.location()[0]
+
+    @property
+    def column(self):
+        return self.location()[1]
+
+    @property
+    def filename(self):
+        return self.source.filename
+
+    @property
+    def filetext(self):
+        return self.source.text
+
+    def location(self):
+        if self.end:
+            line, column = self.source.location(self.index - 1)
+            return line, column + 1
+        return self.source.location(self.index)
 
     def advance(self, current_char=None):
         self.index += 1
-        self.column += 1
-
-        if current_char == "\n":
-            self.line += 1
-            self.column = 0
 
     def __str__(self):
-        return f"line {self.line + 1}, column {self.column + 1}"
+        line, column = self.location()
+        return f"line {line + 1}, column {column + 1}"
 
     def copy(self):
-        return Position(self.index, self.line, self.column, self.filename, self.filetext)
+        return Position(self.index, self.source, self.end)
 
 
 # token class
 
 class Token:
+    __slots__ = ("type", "value", "source", "start", "end")
+
     def __init__(self, type_, value=None, pos_start=None, pos_end=None):
         self.type = type_
         self.value = value
+        self.source = None
+        self.start = self.end = -1
 
         if pos_start:
-            self.pos_start = pos_start.copy()
-            self.pos_end = pos_start.copy()
-            self.pos_end.advance()
-        if pos_end:
-            self.pos_end = pos_end.copy()
+            self.source = pos_start.source
+            self.start = pos_start.index
+            self.end = pos_end.index if pos_end else pos_start.index + 1
+
+    @classmethod
+    def span(cls, type_, value, source, start, end):
+        """
+        Makes a token straight from offsets, without going through `Position`s.
+        """
+        token = cls.__new__(cls)
+        token.type = type_
+        token.value = value
+        token.source = source
+        token.start = start
+        token.end = end
+        return token
+
+    @property
+    def pos_start(self):
+        if self.source is None:
+            return None
+        return Position(self.start, self.source)
+
+    @property
+    def pos_end(self):
+        if self.source is None:
+            return None
+        return Position(self.end, self.source, True)
 
     def __repr__(self):
         if self.value:
@@ -75,10 +239,7 @@ class Token:
         if pos_start is None:
             pos_start = self.pos_start
         if pos_end is None:
-            try:
-                pos_end = self.pos_end
-            except:
-                pos_end = pos_start.copy().advance()
+            pos_end = self.pos_end
         return Token(self.type, value, pos_start, pos_end)
 
 
@@ -115,11 +276,18 @@ token_list = {
 # lexer class itself
 
 class Lexer:
-    def __init__(self, filename, text):
+    def __init__(self, filename, text, source=None):
+        """
+        :param text: the source, as a str. `RegexLexer` can also lex UTF-8 bytes, or anything that works like them.
+        :param source: the `Source` the tokens' positions point into. By default, a new one for `text`.
+        """
         self.filename = filename
         self.tokens = None
         self.text = text
-        self.pos = Position(-1, 0, -1, filename, text)
+        if source is None:
+            source = Source(filename, text) if isinstance(text, str) else MappedSource(filename, text)
+        self.source = source
+        self.pos = Position(-1, self.source)
         self.current_char = None
 
     def __str__(self):
@@ -176,7 +344,7 @@ char: {self.current_char}""")
                 case ")":
                     tokens.append(token_list["paren_r"].set_post(pos_start=self.pos))
                     self.advance()
-                case "~", "!":
+                case "~" | "!":
                     token, error = self.make_not_equals()
                     if error:
                         return [], error
@@ -282,4 +450,146 @@ char: {self.current_char}""")
             self.advance()
             token = token_list["gte"]
 
-        return token.set_post(pos_start=pos_start, pos_end=self.pos), None
\ No newline at end of file
+        return token.set_post(pos_start=pos_start, pos_end=self.pos), None
+
+
+# single pass lexer
+
+operator_tokens = {
+    "+": "plus",
+    "-": "minus",
+    "*": "mul",
+    "/": "div",
+    "^": "pow",
+    "(": "paren_l",
+    ")": "paren_r",
+    "=": "equals",
+    "==": "eq",
+    "!=": "neq",
+    "~=": "neq",
+    "<": "lt",
+    ">": "gt",
+    "<=": "lte",
+    ">=": "gte",
+}
+
+keywords = frozenset(keywords_list)
+
+token_regex = re.compile(r"""
+    (?P<skip>[ \t\r]+)
+  | (?P<newline>\n)
+  | (?P<number>[0-9]+(?:\.[0-9]*)?)
+  | (?P<identifier>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<operator>[=!~<>]=|[-+*/^()=<>])
+  | (?P<not_equals>[!~])
+  | (?P<illegal>.)
+""", re.VERBOSE)
+
+# the same, for lexing bytes. an illegal character is matched with all of its UTF-8 bytes, to show it in the error
+bytes_token_regex = re.compile(
+    token_regex.pattern.replace("(?P<illegal>.)", r"(?P<illegal>[\xc0-\xff][\x80-\xbf]*|.)").encode(),
+    re.VERBOSE
+)
+bytes_operator_tokens = {operator.encode(): token for operator, token in operator_tokens.items()}
+
+
+class RegexLexer(Lexer):
+    """
+    Makes the same tokens and errors as `Lexer`, but in one pass of a compiled regex instead of one `advance()` per
+    character.
+    """
+    def parse(self):
+        """
+        Turns `self.text` into a `list` of `Tokens`.
+        :return: a list of Tokens
+        """
+        text = self.text
+        source = self.source
+        binary = not isinstance(text, str)
+        if binary:
+            regex, operators, dot = bytes_token_regex, bytes_operator_tokens, b"."
+        else:
+            regex, operators, dot = token_regex, operator_tokens, "."
+        span = Token.span
+        keyword_type = token_list["keyword"].type
+        identifier_type = token_list["identifier"].type
+        tokens = []
+        append = tokens.append
+
+        for match in regex.finditer(text):
+            kind = match.lastgroup
+            if kind == "skip":
+                continue
+
+            start, end = match.span()
+            if kind == "operator":
+                append(span(operators[match.group()], None, source, start, end))
+            elif kind == "identifier":
+                value = match.group()
+                if binary:
+                    value = value.decode()
+                append(span(keyword_type if value in keywords else identifier_type, value, source, start, end))
+            elif kind == "number":
+                value = match.group()
+                if dot in value:
+                    append(span(token_list["float"].type, float(value), source, start, end))
+                else:
+                    append(span(token_list["int"].type, int(value), source, start, end))
+            elif kind == "newline":
+                append(span(token_list["newline"].type, None, source, start, end))
+            elif kind == "not_equals":
+                # like `Lexer.make_not_equals`, the error ends after the character that should have been a '='
+                return [], ExpectedCharError(Position(start, source), Position(end + 1, source),
+                                             "equals sign expected after '!' or '~'")
+            else:
+                pos_start = Position(start, source)
+                character = match.group()
+                if binary:
+                    character = character.decode("utf-8", "replace")
+                return [], IllegalCharError(pos_start, pos_start, f"character not recognized: '{character}'")
+
+        append(span(token_list["eof"].type, None, source, len(text), len(text) + 1))
+        return tokens, []
+
+
+class StreamLexer:
+    """
+    Lexes a source line by line as it's read, so `Parser` can take tokens from it as they're made. Tokens never span
+    lines, so the tokens are the same as `RegexLexer` makes for the whole text, but only the line being lexed and the
+    tokens not parsed yet are kept.
+
+    Iterate over it to get the tokens. A lex error ends them early with an eof, and is then in `error`.
+    """
+    def __init__(self, filename, lines):
+        """
+        :param lines: the source, as an iterable of lines that each end with their newline, like an open file gives.
+        A string is split into lines.
+        """
+        self.filename = filename
+        self.lines = io.StringIO(lines) if isinstance(lines, str) else lines
+        self.error = None
+
+    def __iter__(self):
+        newline_type = token_list["newline"].type
+        eof_type = token_list["eof"].type
+        source = StreamLine(self.filename, "", 0)
+
+        for number, line in enumerate(self.lines):
+            newline = line.endswith("\n")
+            if newline:
+                line = line[:-1]
+            source = StreamLine(self.filename, line, number)
+            tokens, error = RegexLexer(self.filename, line, source).parse()
+            if error:
+                self.error = error
+                yield Token.span(eof_type, None, source, len(line), len(line) + 1)
+                return
+
+            tokens.pop()  # the eof
+            yield from tokens
+            if not newline:
+                break
+            yield Token.span(newline_type, None, source, len(line), len(line) + 1)
+            source = StreamLine(self.filename, "", number + 1)  # where the eof is if this was the last line
+
+        yield Token.span(eof_type, None, source, len(source.text), len(source.text) + 1)
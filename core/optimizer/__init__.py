@@ -0,0 +1,253 @@
+from core.interpreter import Interpreter, Context, SymbolTable
+from core.lexer import Token, token_list
+from core.parser import NumberNode, BinaryOpNode, UnaryOpNode, VarAssignNode, IfNode, ForNode, WhileNode, BlockNode
+
+# powers whose result would be bigger than this many bits are left for run time
+max_fold_bits = 4096
+
+
+def literal(node):
+    """
+    :return: the NumberNode a node always gives, looking through the ifs `DeadBranchEliminator` leaves in place of the
+    ones it prunes, or None if it isn't one.
+    """
+    while type(node) is IfNode and node.only_case() is not None:
+        node = node.only_case()
+    return node if type(node) is NumberNode else None
+
+
+class OptimizerPass:
+    """
+    Base class for optimizer passes. Visiting a node returns the node to use in its place, and the default for every
+    node is to visit its children and keep it. Subclasses override the `visit_` methods for the nodes they rewrite, and
+    set `self.changed` whenever they do.
+    """
+    def __init__(self):
+        self.changed = False
+
+    def run(self, node):
+        self.changed = False
+        return self.visit(node)
+
+    def visit(self, node):
+        method_name = f"visit_{type(node).__name__}"
+        method = getattr(self, method_name, self.no_visit_method)
+        return method(node)
+
+    def no_visit_method(self, node):  # nodes we don't know about are left alone
+        return node
+
+    @staticmethod
+    def rebuilt(new, old):
+        """
+        Gives a rebuilt node the span of the one it replaces. Spans are worked out from children, which may have been
+        rewritten into smaller ones, and errors have to point at the same source as without optimizing.
+        :return: the new node.
+        """
+        new.pos_start, new.pos_end = old.pos_start, old.pos_end
+        return new
+
+    def visit_BlockNode(self, node):
+        statements = [self.visit(statement) for statement in node.statements]
+        if all(new is old for new, old in zip(statements, node.statements)):
+            return node
+        return self.rebuilt(BlockNode(statements), node)
+
+    def visit_NumberNode(self, node):
+        return node
+
+    def visit_VarAccessNode(self, node):
+        return node
+
+    def visit_VarAssignNode(self, node):
+        value_node = self.visit(node.value_node)
+        if value_node is node.value_node:
+            return node
+        return self.rebuilt(VarAssignNode(node.var_name_token, value_node, node.const), node)
+
+    def visit_BinaryOpNode(self, node):
+        left_node = self.visit(node.left_node)
+        right_node = self.visit(node.right_node)
+        if left_node is node.left_node and right_node is node.right_node:
+            return node
+        return self.rebuilt(BinaryOpNode(left_node, node.op_token, right_node), node)
+
+    def visit_UnaryOpNode(self, node):
+        operand = self.visit(node.node)
+        if operand is node.node:
+            return node
+        return self.rebuilt(UnaryOpNode(node.op_token, operand), node)
+
+    def visit_IfNode(self, node):
+        cases = [(self.visit(condition), self.visit(expr)) for condition, expr in node.cases]
+        else_case = self.visit(node.else_case) if node.else_case else None
+        if else_case is node.else_case and all(
+                new[0] is old[0] and new[1] is old[1] for new, old in zip(cases, node.cases)):
+            return node
+        return self.rebuilt(IfNode(cases, else_case), node)
+
+    def visit_ForNode(self, node):
+        start_value = self.visit(node.start_value_node)
+        end_value = self.visit(node.end_value_node)
+        step_value = self.visit(node.step_value_node) if node.step_value_node else None
+        body = self.visit(node.body_node)
+        if start_value is node.start_value_node and end_value is node.end_value_node \
+                and step_value is node.step_value_node and body is node.body_node:
+            return node
+        return self.rebuilt(ForNode(node.var_name_token, start_value, end_value, step_value, body), node)
+
+    def visit_WhileNode(self, node):
+        condition = self.visit(node.condition_node)
+        body = self.visit(node.body_node)
+        if condition is node.condition_node and body is node.body_node:
+            return node
+        return self.rebuilt(WhileNode(condition, body), node)
+
+
+class ConstantFolder(OptimizerPass):
+    """
+    Replaces operations on literal numbers with their result. Anything that would fail, like a division by zero, is left
+    alone so the error still happens at run time, in the same place.
+    """
+    def __init__(self, constants=None):
+        """
+        :param constants: a dict of variable names that are known to be constant, to their values.
+        """
+        super().__init__()
+        self.constants = constants or {}
+        self.interpreter = Interpreter()
+        self.context = Context("<optimizer>")
+        self.context.symbol_table = SymbolTable()
+
+    def number(self, value, node):
+        """
+        Makes a NumberNode for a folded value, spanning the node it replaces.
+        :return: the NumberNode, or None if the value isn't something the lexer could have made.
+        """
+        if type(value) is int:
+            token_type = token_list["int"].type
+        elif type(value) is float:
+            token_type = token_list["float"].type
+        else:
+            return None
+        token = Token(token_type, value, node.pos_start, node.pos_end)
+        self.changed = True
+        return NumberNode(token)
+
+    def evaluate(self, node):
+        """
+        Evaluates a node whose operands are all literals, with the interpreter so the semantics can't drift.
+        :return: the folded NumberNode, or None if it can't be folded.
+        """
+        try:
+            result = self.interpreter.visit(node, self.context)
+        except (ArithmeticError, ValueError):  # e.g. 0^-1 or a float overflow
+            return None
+        if result.error or result.value is None:
+            return None
+        return self.number(result.value.value, node)
+
+    def visit_VarAccessNode(self, node):
+        var_name = node.var_name_token.value
+        if var_name in self.constants:
+            return self.number(self.constants[var_name], node) or node
+        return node
+
+    def visit_BinaryOpNode(self, node):
+        node = super().visit_BinaryOpNode(node)
+        op_token = node.op_token
+        left, right = literal(node.left_node), literal(node.right_node)
+        if left is not None and op_token.type == token_list["keyword"].type \
+                and op_token.value in ("and", "or") and (left.token.value != 0) == (op_token.value == "or"):
+            return self.evaluate(node) or node  # the left side decides it, so the right side never runs
+        if left is None or right is None:
+            return node
+
+        if node.op_token.type == token_list["pow"].type:
+            base, exponent = left.token.value, right.token.value
+            if type(base) is int and type(exponent) is int and exponent > 1 \
+                    and max(abs(base), 2).bit_length() * exponent > max_fold_bits:
+                return node
+
+        return self.evaluate(node) or node
+
+    def visit_UnaryOpNode(self, node):
+        node = super().visit_UnaryOpNode(node)
+        if literal(node.node) is None:
+            return node
+        if node.op_token.type != token_list["minus"].type and not node.op_token.matches("keyword", "not"):
+            return node
+        return self.evaluate(node) or node
+
+
+class DeadBranchEliminator(OptimizerPass):
+    """
+    Drops the cases of an if whose condition is a literal: false ones are removed, and a true one becomes the else.
+
+    An if that's left with only its else still stands in for it, as an if that always runs it, so errors about the if
+    (like a condition or a step that isn't a number) point at the same source as without optimizing. The engines run
+    those as just the expression.
+    """
+    def visit_BlockNode(self, node):
+        node = super().visit_BlockNode(node)
+        # a statement's own span is never shown, only its value's, so an if that always runs its case can go
+        statements = []
+        for statement in node.statements:
+            while type(statement) is IfNode and statement.only_case() is not None:
+                statement = statement.only_case()
+            statements.append(statement)
+        if all(new is old for new, old in zip(statements, node.statements)):
+            return node
+        self.changed = True
+        return self.rebuilt(BlockNode(statements), node)
+
+    def visit_IfNode(self, node):
+        node = super().visit_IfNode(node)
+        if node.only_case() is not None:
+            return node
+        cases = []
+        else_case = node.else_case
+
+        for condition, expr in node.cases:
+            value = literal(condition)
+            if value is None:
+                cases.append((condition, expr))
+            elif value.token.value != 0:
+                else_case = expr
+                break
+
+        if len(cases) == len(node.cases) and else_case is node.else_case:
+            return node
+        if not cases and not else_case:
+            if len(node.cases) == 1:
+                return node
+            cases = node.cases[:1]  # nothing runs, but the if still has to give back nothing
+        self.changed = True
+        if not cases:
+            always = NumberNode(Token(token_list["int"].type, 1, node.pos_start, node.pos_end))
+            return self.rebuilt(IfNode([(always, else_case)], None), node)
+        return self.rebuilt(IfNode(cases, else_case), node)
+
+
+class Optimizer:
+    """
+    Runs a list of passes over an AST, over and over until none of them change anything.
+    """
+    def __init__(self, passes, max_rounds=4):
+        self.passes = passes
+        self.max_rounds = max_rounds
+
+    def optimize(self, node):
+        """
+        Optimizes an AST. Nodes that don't change are reused, so the original tree is never modified.
+        :param node: the root node, as returned by `Parser.parse`.
+        :return: the optimized root node.
+        """
+        for _ in range(self.max_rounds):
+            changed = False
+            for optimizer_pass in self.passes:
+                node = optimizer_pass.run(node)
+                changed = changed or optimizer_pass.changed
+            if not changed:
+                break
+        return node
@@ -1,3 +1,4 @@
+from core.classes.fuse_classes.number import FuseNumber
 from core.lexer import token_list
 from core.classes.errors import *
 
@@ -5,6 +6,7 @@ from core.classes.errors import *
 class NumberNode:
     def __init__(self, token):
         self.token = token
+        self.number = FuseNumber(token.value)  # made once and shared by every run, so it must never be changed
 
         self.pos_start = self.token.pos_start
         self.pos_end = self.token.pos_end
@@ -18,6 +20,13 @@ class BinaryOpNode:
         self.left_node = left_node
         self.op_token = op_token
         self.right_node = right_node
+        self.op = op_token.value if op_token.type == token_list["keyword"].type else op_token.type
+
+        # the interpreter's quickening state, see `Interpreter.visit_BinaryOpNode`. only ops whose operands are
+        # literals, variables or other such ops can be quickened, and the others have no warmup
+        self.quick = None  # the quickened version, once there is one
+        self.seen = None   # the operand types of the last visits
+        self.warmup = 0 if self.op not in ("and", "or") and pure(left_node) and pure(right_node) else None
 
         self.pos_start = self.left_node.pos_start
         self.pos_end = self.right_node.pos_end
@@ -47,6 +56,14 @@ class VarAccessNode:
     def __repr__(self):
         return f"({self.var_name_token})"
 
+def pure(node):
+    """
+    :return: whether a node is a literal, a variable, or an op on them that can be quickened, which can all be evaluated
+    without changing anything.
+    """
+    return type(node) in (NumberNode, VarAccessNode) or type(node) is BinaryOpNode and node.warmup is not None
+
+
 class VarAssignNode:
     def __init__(self, var_name_token, value_node, const=False):
         self.var_name_token = var_name_token
@@ -67,17 +84,54 @@ class IfNode:
         self.pos_start = self.cases[0][0].pos_start
         self.pos_end = (self.else_case or self.cases[-1][0]).pos_end
 
+    def only_case(self):
+        """
+        :return: the expression of an if that always runs its one case and has no else, like the ones the optimizer
+        leaves in place of the ifs it prunes, or None for any other if.
+        """
+        if self.else_case is None and len(self.cases) == 1:
+            condition, expr = self.cases[0]
+            if type(condition) is NumberNode and condition.token.value != 0:
+                return expr
+        return None
+
+class ForNode:
+    def __init__(self, var_name_token, start_value_node, end_value_node, step_value_node, body_node):
+        self.var_name_token = var_name_token
+        self.start_value_node = start_value_node
+        self.end_value_node = end_value_node
+        self.step_value_node = step_value_node  # None for the default of 1
+        self.body_node = body_node
+
+        self.pos_start = self.var_name_token.pos_start
+        self.pos_end = self.body_node.pos_end
+
+    def __repr__(self):
+        step = f", {self.step_value_node}" if self.step_value_node else ""
+        return f"(for {self.var_name_token}, {self.start_value_node}, {self.end_value_node}{step}, {self.body_node})"
+
+class WhileNode:
+    def __init__(self, condition_node, body_node):
+        self.condition_node = condition_node
+        self.body_node = body_node
+
+        self.pos_start = self.condition_node.pos_start
+        self.pos_end = self.body_node.pos_end
+
+    def __repr__(self):
+        return f"(while {self.condition_node}, {self.body_node})"
+
 class BlockNode:
-    def __init__(self, lead, rest=None):
-        self.lead = lead
-        self.rest = rest
+    def __init__(self, statements):
+        self.statements = statements
 
-        self.pos_start = self.lead.pos_start
-        self.pos_end = self.rest.pos_end if rest else self.lead.pos_end
+        self.pos_start = self.statements[0].pos_start
+        self.pos_end = self.statements[-1].pos_end
 
     def __repr__(self):
-        if self.rest: return f"({self.lead} {self.rest})"
-        return f"({self.lead})"
+        if len(self.statements) == 1:
+            return repr(self.statements[0])
+        return f"({' '.join(repr(statement) for statement in self.statements)})"
 
 # parse result
 
@@ -111,27 +165,60 @@ class ParseResult:
 
 class Parser:
     def __init__(self, tokens):
+        """
+        :param tokens: a list of tokens, or any iterable of them, like a `StreamLexer`. They're read one at a time, as
+        the parser gets to them, and the last one has to be the eof.
+        """
         self.current_token = None
-        self.tokens = tokens
-        self.token_index = -1
+        self.tokens = iter(tokens)
         self.advance()
 
     def advance(self):
-        self.token_index += 1
-        if self.token_index < len(self.tokens):
-            self.current_token = self.tokens[self.token_index]
+        token = next(self.tokens, None)
+        if token is not None:
+            self.current_token = token
         return self.current_token
 
     def parse(self):
         res = self.block()
         if not res.error and self.current_token.type != token_list["eof"].type:
-            return res.failure(
-                InvalidSyntaxError(
-                    self.current_token.pos_start, self.current_token.pos_end,
-                    "Expected an operation"
-                ))
+            return res.failure(self.expected_operation())
         return res
 
+    def statements(self):
+        """
+        Parses a program like `parse`, but one top-level statement at a time, reading no further ahead than the newline
+        after it. Statements can then be run before the rest of the program has even been lexed.
+        :return: a generator of `ParseResult`s, one per statement. If there's an error, it's in the last one.
+        """
+        while self.current_token.type == token_list["newline"].type:
+            self.advance()
+
+        while True:
+            result = self.expression()
+            yield result
+            if result.error:
+                return
+
+            if self.current_token.type != token_list["newline"].type:
+                break
+            while self.current_token.type == token_list["newline"].type:
+                self.advance()
+            if self.current_token.type == token_list["eof"].type:
+                return
+
+        if self.current_token.type != token_list["eof"].type:
+            yield ParseResult().failure(self.expected_operation())
+
+    def expected_operation(self):
+        """
+        :return: the error for a statement that's followed by something other than a newline.
+        """
+        return InvalidSyntaxError(
+            self.current_token.pos_start, self.current_token.pos_end,
+            "Expected an operation"
+        )
+
     def if_expr(self):
         result = ParseResult()
         cases = []
@@ -196,7 +283,82 @@ class Parser:
 
         return result.success(IfNode(cases, else_case))
 
+    def expect_keyword(self, result, keyword):
+        """
+        Steps over a keyword, or fails if it isn't there.
+        :return: True if the keyword was there.
+        """
+        if not self.current_token.matches("keyword", keyword):
+            result.failure(InvalidSyntaxError(
+                self.current_token.pos_start, self.current_token.pos_end,
+                f"Expected a '{keyword}'"
+            ))
+            return False
+        result.register_advancement()
+        self.advance()
+        return True
+
+    def for_expr(self):
+        result = ParseResult()
+        if not self.expect_keyword(result, "for"):
+            return result
+
+        if self.current_token.type != token_list["identifier"].type:
+            return result.failure(InvalidSyntaxError(
+                self.current_token.pos_start, self.current_token.pos_end,
+                "Expected identifier"
+            ))
+        var_name = self.current_token
+        result.register_advancement()
+        self.advance()
+
+        if self.current_token.type != token_list["equals"].type:
+            return result.failure(InvalidSyntaxError(
+                self.current_token.pos_start, self.current_token.pos_end,
+                "Expected '='"
+            ))
+        result.register_advancement()
+        self.advance()
+
+        start_value = result.register(self.expression())
+        if result.error or not self.expect_keyword(result, "to"):
+            return result
+
+        end_value = result.register(self.expression())
+        if result.error:
+            return result
+
+        step_value = None
+        if self.current_token.matches("keyword", "step"):
+            result.register_advancement()
+            self.advance()
+            step_value = result.register(self.expression())
+            if result.error:
+                return result
+
+        if not self.expect_keyword(result, "then"):
+            return result
+
+        body = result.register(self.expression())
+        if result.error:
+            return result
+
+        return result.success(ForNode(var_name, start_value, end_value, step_value, body))
+
+    def while_expr(self):
+        result = ParseResult()
+        if not self.expect_keyword(result, "while"):
+            return result
+
+        condition = result.register(self.expression())
+        if result.error or not self.expect_keyword(result, "then"):
+            return result
+
+        body = result.register(self.expression())
+        if result.error:
+            return result
 
+        return result.success(WhileNode(condition, body))
 
     def atom(self):
         result = ParseResult()
@@ -234,6 +396,18 @@ class Parser:
                 return result
             return result.success(if_expr)
 
+        elif token.matches("keyword", "for"):
+            for_expr = result.register(self.for_expr())
+            if result.error:
+                return result
+            return result.success(for_expr)
+
+        elif token.matches("keyword", "while"):
+            while_expr = result.register(self.while_expr())
+            if result.error:
+                return result
+            return result.success(while_expr)
+
         return result.failure(InvalidSyntaxError(
             token.pos_start, token.pos_end,
             "Expected an integer, float, identifier, '-', or parenthesis"
@@ -339,26 +513,27 @@ class Parser:
 
     def block(self):
         result = ParseResult()
+        statements = []
 
-        lead = result.register(self.expression())
-        result.register_advancement()
-        self.advance()
-        token = self.current_token
-        rest = None
+        while self.current_token.type == token_list["newline"].type:
+            result.register_advancement()
+            self.advance()
 
-        if token.type != token_list["eof"].type:
-            rest = result.register(self.block())
-        if result.error:
-            return result.failure(
-                InvalidSyntaxError(
-                    self.current_token.pos_start, self.current_token.pos_end,
-                    "???"
-                )
-            )
-        if rest:
-            return result.success(BlockNode(lead, rest))
+        while True:
+            statement = result.register(self.expression())
+            if result.error:
+                return result
+            statements.append(statement)
+
+            if self.current_token.type != token_list["newline"].type:
+                break
+            while self.current_token.type == token_list["newline"].type:
+                result.register_advancement()
+                self.advance()
+            if self.current_token.type == token_list["eof"].type:
+                break
 
-        return result.success(BlockNode(lead))
+        return result.success(BlockNode(statements))
 
     def bin_op(self, func_a, ops, func_b=None):
         if func_b is None:
@@ -0,0 +1,209 @@
+from time import perf_counter
+
+from core.interpreter import Interpreter
+from core.parser import BlockNode, BinaryOpNode
+
+
+class ProfileEntry:
+    __slots__ = ("calls", "total", "self_time")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0      # seconds spent in it, including its children. recursive visits are only counted once
+        self.self_time = 0.0  # seconds spent in it, not counting its children
+
+    def as_dict(self):
+        return {"calls": self.calls, "total": self.total, "self": self.self_time}
+
+    def __repr__(self):
+        return f"<ProfileEntry: {self.calls} calls, {self.total * 1e3:.3f}ms total, {self.self_time * 1e3:.3f}ms self>"
+
+
+class QuickeningEntry:
+    __slots__ = ("hits", "misses", "quickened")
+
+    def __init__(self):
+        self.hits = 0       # visits that ran quickened
+        self.misses = 0     # visits where the quickened version didn't fit the operands, so it was dropped
+        self.quickened = 0  # times a node was quickened
+
+    def as_dict(self):
+        return {"hits": self.hits, "misses": self.misses, "quickened": self.quickened}
+
+    def __repr__(self):
+        return f"<QuickeningEntry: {self.hits} hits, {self.misses} misses, {self.quickened} quickened>"
+
+
+class Profiler:
+    """
+    Collects where the time goes while running a script. Pass one to `run(..., profiler=Profiler())`, then read
+    `node_types` and `lines`, or print `table()`.
+    """
+    def __init__(self):
+        self.node_types = {}  # node class name -> ProfileEntry
+        self.lines = {}       # (filename, line number) -> ProfileEntry
+        self.line_text = {}   # (filename, line number) -> the source of that line, for the table
+        self.active = {}      # keys with a visit in progress -> how many, so recursion isn't counted twice
+        self.child_times = []
+        self.quickening = {}  # the kind of a quickened op, like "int mul int" -> QuickeningEntry
+        self.binary_ops = 0   # binary op visits, quickened or not
+
+    def start(self, node):
+        """
+        Starts timing a visit.
+        :return: the keys the node is recorded under, to pass to `stop`.
+        """
+        keys = [(self.node_types, type(node).__name__)]
+        if node.pos_start is not None and type(node) is not BlockNode:  # blocks cover many lines, so they have none
+            key = (node.pos_start.filename, node.pos_start.line + 1)
+            if key not in self.line_text:
+                self.line_text[key] = node.pos_start.source.line_text(key[1] - 1).strip()
+            keys.append((self.lines, key))
+
+        for _, key in keys:
+            self.active[key] = self.active.get(key, 0) + 1
+        self.child_times.append(0.0)
+        return keys
+
+    def stop(self, keys, elapsed):
+        """
+        Records a finished visit.
+        :param keys: what `start` returned.
+        :param elapsed: how long the visit took, in seconds.
+        """
+        self_time = elapsed - self.child_times.pop()
+        if self.child_times:
+            self.child_times[-1] += elapsed
+
+        for entries, key in keys:
+            self.active[key] -= 1
+            entry = entries.get(key)
+            if entry is None:
+                entry = entries[key] = ProfileEntry()
+            entry.calls += 1
+            entry.self_time += self_time
+            if not self.active[key]:  # a recursive visit's time is already part of the outermost one
+                entry.total += elapsed
+
+    def record_quickening(self, node, before):
+        """
+        Records whether a binary op visit ran quickened.
+        :param before: the node's quickened version before the visit, or None.
+        """
+        self.binary_ops += 1
+        after = node.quick
+        if before is None and after is None:
+            return
+        kind = (before or after).kind
+        entry = self.quickening.get(kind)
+        if entry is None:
+            entry = self.quickening[kind] = QuickeningEntry()
+        if before is None:
+            entry.quickened += 1
+        elif after is before:
+            entry.hits += 1
+        else:
+            entry.misses += 1
+
+    def record_skipped(self, node):
+        """
+        Records the visits a quickened op skipped by reading its operands itself, as calls that took no time of their
+        own, so the counts are the same as without quickening.
+        :param node: the binary op that ran quickened.
+        """
+        pending = [node.left_node, node.right_node]
+        while pending:
+            operand = pending.pop()
+            self.stop(self.start(operand), 0.0)
+            if type(operand) is BinaryOpNode:  # an op on operands like these, so it ran quickened too
+                self.record_quickening(operand, operand.quick)
+                pending += (operand.left_node, operand.right_node)
+
+    @property
+    def quickening_hit_rate(self):
+        """
+        :return: the fraction of binary op visits that ran quickened.
+        """
+        if not self.binary_ops:
+            return 0.0
+        return sum(entry.hits for entry in self.quickening.values()) / self.binary_ops
+
+    def as_dict(self):
+        """
+        :return: the results as plain dicts, e.g. for json.
+        """
+        return {
+            "node_types": {name: entry.as_dict() for name, entry in self.node_types.items()},
+            "lines": [
+                {"filename": filename, "line": line, "source": self.line_text[(filename, line)], **entry.as_dict()}
+                for (filename, line), entry in self.lines.items()
+            ],
+            "quickening": {kind: entry.as_dict() for kind, entry in self.quickening.items()},
+            "binary_ops": self.binary_ops,
+        }
+
+    def table(self, sort="self", limit=20):
+        """
+        Formats the results as a human-readable table.
+        :param sort: the column to sort by: "self", "total" or "calls".
+        :param limit: the most rows to show in each section.
+        :return: the table, as a string.
+        """
+        keys = {
+            "self": lambda item: item[1].self_time,
+            "total": lambda item: item[1].total,
+            "calls": lambda item: item[1].calls,
+        }
+        if sort not in keys:
+            raise ValueError(f"can't sort by '{sort}', expected one of {', '.join(keys)}")
+
+        header = f"{'calls':>9}{'total ms':>12}{'self ms':>12}  "
+        result = [header + "node type"]
+        for name, entry in sorted(self.node_types.items(), key=keys[sort], reverse=True)[:limit]:
+            result.append(self.row(entry) + name)
+
+        result.append("")
+        result.append(header + "line")
+        for (filename, line), entry in sorted(self.lines.items(), key=keys[sort], reverse=True)[:limit]:
+            source = self.line_text[(filename, line)]
+            if len(source) > 40:
+                source = source[:37] + "..."
+            result.append(self.row(entry) + f"{filename}:{line}  {source}")
+
+        if self.quickening:
+            result.append("")
+            result.append(f"{'hits':>9}{'misses':>12}{'quickened':>12}  quickened op")
+            for kind, entry in sorted(self.quickening.items(), key=lambda item: item[1].hits, reverse=True)[:limit]:
+                result.append(f"{entry.hits:>9}{entry.misses:>12}{entry.quickened:>12}  {kind}")
+            result.append(f"{self.quickening_hit_rate:.1%} of {self.binary_ops} binary op visits ran quickened")
+
+        return "\n".join(result)
+
+    @staticmethod
+    def row(entry):
+        return f"{entry.calls:>9}{entry.total * 1e3:>12.3f}{entry.self_time * 1e3:>12.3f}  "
+
+    def __str__(self):
+        return self.table()
+
+
+class ProfilingInterpreter(Interpreter):
+    """
+    An `Interpreter` that times every visit for a `Profiler`. Kept separate so the normal interpreter pays nothing
+    when profiling is off.
+    """
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    def visit(self, node, context):
+        keys = self.profiler.start(node)
+        quick = node.quick if type(node) is BinaryOpNode else None
+        start = perf_counter()
+        try:
+            return super().visit(node, context)
+        finally:
+            self.profiler.stop(keys, perf_counter() - start)
+            if type(node) is BinaryOpNode:
+                self.profiler.record_quickening(node, quick)
+                if quick is not None and node.quick is quick:
+                    self.profiler.record_skipped(node)
@@ -0,0 +1,150 @@
+from core.parser import NumberNode, BinaryOpNode, UnaryOpNode, VarAccessNode, VarAssignNode, IfNode, ForNode, \
+    WhileNode, BlockNode
+
+
+class Resolver:
+    """
+    Gives every variable a program uses a slot number, and stores it on the nodes that use the variable as `slot`. A
+    `Frame` built from the names then lets the interpreter find variables by index instead of by name.
+
+    Slots only depend on the program, not on what's defined when it runs, so a resolved AST can be cached and run
+    against any symbol table.
+    """
+    def resolve(self, node):
+        """
+        :return: the names of the slots, in slot order.
+        """
+        self.slots = {}
+        self.visit(node)
+        return list(self.slots)
+
+    def slot(self, name):
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.slots)
+        return slot
+
+    def visit(self, node):
+        method_name = f"visit_{type(node).__name__}"
+        method = getattr(self, method_name, self.no_visit_method)
+        method(node)
+
+    def no_visit_method(self, node):
+        raise Exception(f"no visit method for {type(node).__name__}")
+
+    def visit_BlockNode(self, node):
+        for statement in node.statements:
+            self.visit(statement)
+
+    def visit_NumberNode(self, node):
+        pass
+
+    def visit_VarAccessNode(self, node):
+        node.slot = self.slot(node.var_name_token.value)
+
+    def visit_VarAssignNode(self, node):
+        self.visit(node.value_node)
+        node.slot = self.slot(node.var_name_token.value)
+
+    def visit_BinaryOpNode(self, node):
+        # walk down the left side of chains like 1+2+3+... without recursing, since the parser builds them left-nested
+        chain = []
+        while isinstance(node, BinaryOpNode):
+            chain.append(node)
+            node = node.left_node
+        self.visit(node)
+
+        for node in reversed(chain):
+            self.visit(node.right_node)
+
+    def visit_UnaryOpNode(self, node):
+        self.visit(node.node)
+
+    def visit_IfNode(self, node):
+        for condition, expr in node.cases:
+            self.visit(condition)
+            self.visit(expr)
+        if node.else_case:
+            self.visit(node.else_case)
+
+    def visit_ForNode(self, node):
+        self.visit(node.start_value_node)
+        self.visit(node.end_value_node)
+        if node.step_value_node:
+            self.visit(node.step_value_node)
+        node.slot = self.slot(node.var_name_token.value)
+        self.visit(node.body_node)
+
+    def visit_WhileNode(self, node):
+        self.visit(node.condition_node)
+        self.visit(node.body_node)
+
+
+def can_be_none(node, nullable):
+    """
+    Works out whether a node's value could be None, which is what an if gives when none of its cases run. Ops never
+    give None, they fail instead.
+    :param nullable: the variables that might hold None, from `nullable_names`.
+    """
+    while True:
+        node_type = type(node)
+        if node_type is NumberNode or node_type is BinaryOpNode or node_type is UnaryOpNode:
+            return False
+        if node_type is VarAccessNode:
+            return node.var_name_token.value in nullable
+        if node_type is VarAssignNode:
+            node = node.value_node
+        elif node_type is BlockNode:
+            node = node.statements[-1]
+        elif node_type is IfNode:
+            if node.else_case is None and node.only_case() is None:
+                return True
+            branches = [expr for _, expr in node.cases] + ([node.else_case] if node.else_case else [])
+            return any(can_be_none(expr, nullable) for expr in branches)
+        else:  # loops
+            return True
+
+
+def nullable_names(node):
+    """
+    Finds the variables a program might set to None. The engines that keep values as plain numbers only check for None
+    where these are read, and where `can_be_none` says an operand could be it.
+    :return: a set of names.
+    """
+    assignments = []
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        node_type = type(node)
+        if node_type is VarAssignNode:
+            assignments.append(node)
+            pending.append(node.value_node)
+        elif node_type is BinaryOpNode:
+            pending += (node.left_node, node.right_node)
+        elif node_type is UnaryOpNode:
+            pending.append(node.node)
+        elif node_type is BlockNode:
+            pending += node.statements
+        elif node_type is IfNode:
+            for condition, expr in node.cases:
+                pending += (condition, expr)
+            if node.else_case:
+                pending.append(node.else_case)
+        elif node_type is ForNode:
+            pending += (node.start_value_node, node.end_value_node, node.body_node)
+            if node.step_value_node:
+                pending.append(node.step_value_node)
+        elif node_type is WhileNode:
+            pending += (node.condition_node, node.body_node)
+
+    # a variable set from another one that might be None might be None too, so this goes until nothing changes
+    nullable = set()
+    changed = True
+    while changed:
+        changed = False
+        for assignment in assignments:
+            name = assignment.var_name_token.value
+            if name not in nullable and can_be_none(assignment.value_node, nullable):
+                nullable.add(name)
+                changed = True
+    return nullable
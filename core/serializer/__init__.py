@@ -0,0 +1,451 @@
+"""
+Saves parsed programs in a compact binary format, `.fusec`, and loads them again without lexing or parsing.
+
+A file is a header (`magic`, `format_version` and flags) followed by a zlib-compressed body: the source's filename and
+text, which errors are shown from, and then the AST as columns. The nodes are stored in post-order, so loading builds
+each node from the ones on a stack instead of recursing. Every column is a typed array, as small a type as its values
+fit in, stored little-endian:
+
+- the node types, one byte each, and a count for the nodes that need one: the statements of a block, the cases and else
+  of an if, whether a for has a step, whether a var is const
+- for every token of a node, in order: its type, the step from the last token's start offset to its own, and its
+  length. Tokens with no source start at -1
+- the token values: indexes into a table of names for identifiers and keywords, the ints, and the floats
+- the table of names
+
+`format_version` goes up whenever the layout, `node_types` or `token_types` change, and files of other versions are
+refused.
+"""
+import gc
+import struct
+import sys
+import zlib
+from array import array
+from itertools import accumulate, repeat
+from operator import add
+
+from core.lexer import Source, MappedSource, Token
+from core.parser import NumberNode, VarAccessNode, BinaryOpNode, UnaryOpNode, VarAssignNode, IfNode, ForNode, \
+    WhileNode, BlockNode
+
+magic = b"FUSEC\0"
+format_version = 1
+
+header = struct.Struct("<6sHB")
+column_header = struct.Struct("<cQ")
+blob_header = struct.Struct("<Q")
+
+compression_level = 6
+
+# the order of these is part of the format
+node_types = (NumberNode, VarAccessNode, BinaryOpNode, UnaryOpNode, VarAssignNode, IfNode, ForNode, WhileNode, BlockNode)
+token_types = ("plus", "minus", "div", "mul", "pow", "int", "float", "paren_l", "paren_r", "keyword", "identifier",
+               "equals", "eq", "neq", "lt", "gt", "lte", "gte", "newline", "eof")
+
+node_tags = {node_type: tag for tag, node_type in enumerate(node_types)}
+token_type_indexes = {token_type: index for index, token_type in enumerate(token_types)}
+named_types = frozenset(("identifier", "keyword"))
+
+binary_text = 1  # flag: the source was bytes, like a mapped file, rather than a str
+
+integer_typecodes = {
+    "unsigned": ("B", "H", "I", "Q"),
+    "signed": ("b", "h", "i", "q"),
+}
+
+
+def children(node):
+    """
+    :return: a node's child nodes, in the order they're stored.
+    """
+    node_type = type(node)
+    if node_type is BinaryOpNode:
+        return node.left_node, node.right_node
+    if node_type is NumberNode or node_type is VarAccessNode:
+        return ()
+    if node_type is BlockNode:
+        return node.statements
+    if node_type is VarAssignNode:
+        return node.value_node,
+    if node_type is UnaryOpNode:
+        return node.node,
+    if node_type is IfNode:
+        nodes = [child for case in node.cases for child in case]
+        if node.else_case is not None:
+            nodes.append(node.else_case)
+        return nodes
+    if node_type is ForNode:
+        nodes = [node.start_value_node, node.end_value_node, node.step_value_node, node.body_node]
+        return [child for child in nodes if child is not None]
+    if node_type is WhileNode:
+        return node.condition_node, node.body_node
+    raise ValueError(f"can't serialize a {node_type.__name__}")
+
+
+def tokens(node):
+    """
+    :return: the tokens a node stores itself, not counting its children's.
+    """
+    node_type = type(node)
+    if node_type is NumberNode:
+        return node.token,
+    if node_type is VarAccessNode or node_type is VarAssignNode or node_type is ForNode:
+        return node.var_name_token,
+    if node_type is BinaryOpNode or node_type is UnaryOpNode:
+        return node.op_token,
+    return ()
+
+
+def count(node):
+    """
+    :return: the count stored for a node, or None if it doesn't need one.
+    """
+    node_type = type(node)
+    if node_type is BlockNode:
+        return len(node.statements)
+    if node_type is IfNode:
+        return len(node.cases) * 2 + (node.else_case is not None)
+    if node_type is ForNode:
+        return int(node.step_value_node is not None)
+    if node_type is VarAssignNode:
+        return int(node.const)
+    return None
+
+
+def post_order(node):
+    """
+    :return: a generator of a tree's nodes, each after its children, without recursing.
+    """
+    stack = [(node, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            yield node
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(children(node)))
+
+
+def fits(typecode, smallest, largest):
+    """
+    :return: whether an integer `array` typecode can hold values from smallest to largest.
+    """
+    try:
+        array(typecode, (smallest, largest))
+    except OverflowError:
+        return False
+    return True
+
+
+def pack_column(kind, values):
+    """
+    :param kind: an `array` typecode, "unsigned" or "signed" for the smallest integer type the values fit in, or
+    "strings".
+    :return: the column's bytes.
+    """
+    if kind == "strings":
+        data = "\0".join(values).encode("utf-8", "surrogatepass")
+        return column_header.pack(b"s", len(data)) + data
+    if kind in integer_typecodes:
+        smallest, largest = min(values, default=0), max(values, default=0)
+        kind = next(code for code in integer_typecodes[kind] if fits(code, smallest, largest))
+    column = array(kind, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column_header.pack(kind.encode(), len(column)) + column.tobytes()
+
+
+def unpack_column(data, offset):
+    """
+    :return: a tuple of (the column's values as a list, the offset after it).
+    """
+    if offset + column_header.size > len(data):
+        raise ValueError
+    typecode, length = column_header.unpack_from(data, offset)
+    offset += column_header.size
+    typecode = typecode.decode()
+
+    if typecode == "s":
+        end = offset + length
+        text = str(data[offset:end], "utf-8", "surrogatepass")
+        values = text.split("\0") if length else []
+    else:
+        column = array(typecode)
+        end = offset + length * column.itemsize
+        column.frombytes(data[offset:end])
+        if sys.byteorder == "big":
+            column.byteswap()
+        values = column.tolist()
+    if end > len(data):
+        raise ValueError
+    return values, end
+
+
+def pack_blob(data):
+    return blob_header.pack(len(data)) + data
+
+
+def unpack_blob(data, offset):
+    if offset + blob_header.size > len(data):
+        raise ValueError
+    length, = blob_header.unpack_from(data, offset)
+    offset += blob_header.size
+    if offset + length > len(data):
+        raise ValueError
+    return data[offset:offset + length], offset + length
+
+
+def dumps(node):
+    """
+    Serializes an AST, like `Parser.parse` or the optimizer makes, with the source its tokens point into.
+    :param node: the root of the AST. All its tokens have to be from one `Source`, or have no source.
+    :return: the `.fusec` bytes.
+    """
+    tags, counts = [], []
+    types, start_steps, lengths = [], [], []
+    name_indexes, ints, floats = [], [], []
+    names = {}
+    source = None
+    last_start = 0
+
+    for child in post_order(node):
+        tags.append(node_tags[type(child)])
+        child_count = count(child)
+        if child_count is not None:
+            counts.append(child_count)
+
+        for token in tokens(child):
+            types.append(token_type_indexes[token.type])
+            if token.source is not None:
+                if source is None:
+                    source = token.source
+                elif token.source is not source:
+                    raise ValueError("can't serialize an AST whose tokens are from more than one source")
+            # tokens are mostly in source order, so the steps between their starts are small
+            start_steps.append(token.start - last_start)
+            lengths.append(token.end - token.start)
+            last_start = token.start
+
+            value = token.value
+            if token.type in named_types:
+                name_indexes.append(names.setdefault(value, len(names)))
+            elif token.type == "int":
+                ints.append(value)
+            elif token.type == "float":
+                floats.append(value)
+            elif value is not None:
+                raise ValueError(f"can't serialize a {token.type} token with a value")
+
+    if source is None:
+        source = Source("<unknown>", "")
+    flags = 0
+    text = source.text
+    if isinstance(text, str):
+        text = text.encode("utf-8", "surrogatepass")
+    else:
+        text = bytes(text)
+        flags |= binary_text
+
+    # ints bigger than 64 bits are rare enough, e.g. from constant folding, to store all of them as strings then
+    if all(-1 << 63 <= value < 1 << 63 for value in ints):
+        int_column = pack_column("q", ints)
+    else:
+        int_column = pack_column("strings", [str(value) for value in ints])
+
+    body = b"".join((
+        pack_blob(source.filename.encode("utf-8", "surrogatepass")),
+        pack_blob(text),
+        pack_column("B", tags),
+        pack_column("unsigned", counts),
+        pack_column("B", types),
+        pack_column("signed", start_steps),
+        pack_column("unsigned", lengths),
+        pack_column("unsigned", name_indexes),
+        int_column,
+        pack_column("d", floats),
+        pack_column("strings", list(names)),
+    ))
+    return header.pack(magic, format_version, flags) + zlib.compress(body, compression_level)
+
+
+def loads(data):
+    """
+    Loads an AST saved by `dumps`. Its tokens point into a new `Source` of the saved text, so errors show like they did
+    for the original.
+    :param data: the `.fusec` bytes, or any buffer of them.
+    :return: the root node.
+    """
+    data = memoryview(data)
+    if len(data) < header.size or header.unpack_from(data)[0] != magic:
+        raise ValueError("not a compiled Fuse program")
+    _, version, flags = header.unpack_from(data)
+    if version != format_version:
+        raise ValueError(f"compiled program has format version {version}, but only version {format_version} can be "
+                         f"loaded")
+
+    # loading makes lots of objects but no cycles, so the garbage collector would only slow it down
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        return read_body(memoryview(zlib.decompress(data[header.size:])), flags)
+    except (zlib.error, StopIteration, IndexError, KeyError, ValueError):
+        raise ValueError("compiled program is corrupt") from None
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def read_body(data, flags):
+    """
+    :param data: the decompressed body of a `.fusec` file.
+    :param flags: the flags from its header.
+    :return: the root node.
+    """
+    filename, offset = unpack_blob(data, 0)
+    text, offset = unpack_blob(data, offset)
+    filename = str(filename, "utf-8", "surrogatepass")
+    if flags & binary_text:
+        source = MappedSource(filename, bytes(text))
+    else:
+        source = Source(filename, str(text, "utf-8", "surrogatepass"))
+
+    columns = []
+    for _ in range(9):
+        column, offset = unpack_column(data, offset)
+        columns.append(column)
+    tags, counts, types, start_steps, lengths, name_indexes, ints, floats, names = columns
+    if ints and isinstance(ints[0], str):
+        ints = [int(value) for value in ints]
+
+    tokens = iter(make_tokens(types, start_steps, lengths, name_indexes, ints, floats, names, source))
+    counts = iter(counts)
+    node = build(tags, counts, tokens)
+    if offset != len(data) or next(tokens, None) is not None or next(counts, None) is not None:
+        raise ValueError
+    return node
+
+
+def make_tokens(types, start_steps, lengths, name_indexes, ints, floats, names, source):
+    """
+    Makes all the tokens of `loads`'s columns at once, a column at a time.
+    :return: a list of the tokens, in the order the nodes take them.
+    """
+    if not len(types) == len(start_steps) == len(lengths):
+        raise ValueError
+    type_names = [token_types[index] for index in types]
+    values = [None] * len(types)
+    named = [index for index, type_ in enumerate(type_names) if type_ in named_types]
+    numbers = [(index, type_ == "int") for index, type_ in enumerate(type_names) if type_ in ("int", "float")]
+    if len(named) != len(name_indexes) or len(numbers) != len(ints) + len(floats):
+        raise ValueError
+
+    for index, name_index in zip(named, name_indexes):
+        values[index] = names[name_index]
+    ints, floats = iter(ints), iter(floats)
+    for index, is_int in numbers:
+        values[index] = next(ints) if is_int else next(floats)
+
+    starts = list(accumulate(start_steps))
+    ends = list(map(add, starts, lengths))
+    tokens = list(map(Token.span, type_names, values, repeat(source), starts, ends))
+    for token in tokens:
+        if token.start < 0:
+            token.source = None
+    return tokens
+
+
+def build(tags, counts, tokens):
+    """
+    Builds the nodes of `loads`'s columns with their constructors, so they're set up exactly like the parser's.
+    :param tags: the node tags, in post-order.
+    :param counts: an iterator over the counts.
+    :param tokens: an iterator over the tokens.
+    :return: the root node.
+    """
+    number, var_access, binary_op, unary_op, var_assign, if_, for_, while_, block = range(len(node_types))
+    stack = []
+    push, pop = stack.append, stack.pop
+    for tag in tags:
+        if tag == binary_op:
+            right = pop()
+            push(BinaryOpNode(pop(), next(tokens), right))
+        elif tag == number:
+            push(NumberNode(next(tokens)))
+        elif tag == var_access:
+            push(VarAccessNode(next(tokens)))
+        elif tag == var_assign:
+            push(VarAssignNode(next(tokens), pop(), bool(next(counts))))
+        elif tag == unary_op:
+            push(UnaryOpNode(next(tokens), pop()))
+        elif tag == block:
+            size = next(counts)
+            if not 0 < size <= len(stack):
+                raise IndexError
+            statements = stack[-size:]
+            del stack[-size:]
+            push(BlockNode(statements))
+        elif tag == if_:
+            size = next(counts)
+            if not 0 < size <= len(stack):
+                raise IndexError
+            nodes = stack[-size:]
+            del stack[-size:]
+            else_case = nodes.pop() if size % 2 else None
+            push(IfNode(list(zip(nodes[::2], nodes[1::2])), else_case))
+        elif tag == for_:
+            body = pop()
+            step = pop() if next(counts) else None
+            end = pop()
+            push(ForNode(next(tokens), pop(), end, step, body))
+        elif tag == while_:
+            body = pop()
+            push(WhileNode(pop(), body))
+        else:
+            raise IndexError
+    if len(stack) != 1:
+        raise IndexError
+    return stack[0]
+
+
+def equivalent(a, b):
+    """
+    Checks that two ASTs are the same: the same nodes, with the same token types, values and offsets.
+    :return: True if they are.
+    """
+    pairs = [(a, b)]
+    while pairs:
+        a, b = pairs.pop()
+        if type(a) is not type(b) or count(a) != count(b):
+            return False
+        for token_a, token_b in zip(tokens(a), tokens(b)):
+            # values are compared by repr, so that a folded nan is the same as itself
+            if (token_a.type, type(token_a.value), repr(token_a.value), token_a.start, token_a.end) != \
+                    (token_b.type, type(token_b.value), repr(token_b.value), token_b.start, token_b.end):
+                return False
+        children_a, children_b = children(a), children(b)
+        if len(children_a) != len(children_b):
+            return False
+        pairs.extend(zip(children_a, children_b))
+    return True
+
+
+def save(path, node):
+    """
+    Saves an AST to a `.fusec` file, after checking that it loads back the same.
+    :param path: the file to write.
+    :param node: the root of the AST.
+    """
+    data = dumps(node)
+    if not equivalent(loads(data), node):
+        raise ValueError("AST didn't serialize to an equivalent one")
+    with open(path, "wb") as file:
+        file.write(data)
+
+
+def load(path):
+    """
+    Loads an AST from a `.fusec` file.
+    :return: the root node.
+    """
+    with open(path, "rb") as file:
+        return loads(file.read())
@@ -0,0 +1,186 @@
+from itertools import repeat
+
+from core.bytecode import *
+from core.classes.fuse_classes.number import FuseNumber
+from core.classes.fuse_classes.range import FuseRange
+from core.classes.errors import *
+
+
+class VM:
+    """
+    Runs `Code` from `BytecodeCompiler` in a single dispatch loop, so nothing recurses and values on the stack stay as
+    plain python numbers.
+    """
+    def execute(self, code, context):
+        """
+        Runs bytecode against `context.symbol_table`.
+        :param code: the `Code` object to run.
+        :param context: the `Context` to run in.
+        :return: a tuple of (FuseNumber or None, error or None), like `Interpreter.visit` would give.
+        """
+        steps = self.steps(code, context)
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+    def steps(self, code, context, yield_every=None):
+        """
+        Runs bytecode like `execute`, but pauses after every `yield_every` instructions by yielding, so the caller can
+        do other work in between. Send True into the generator to stop it with an `EvaluationCancelledError` instead of
+        carrying on; sending None or False, or calling `next`, resumes it.
+        :param yield_every: how many instructions to run between pauses, or None to never pause.
+        :return: the result tuple `execute` gives, as the generator's return value.
+        """
+        ops = code.code
+        consts = code.consts
+        names = code.names
+        get = context.symbol_table.get
+        set_ = context.symbol_table.set
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        divisor_position = -1
+        done = object()  # what FOR_ITER gets from `next` once a loop is over
+        ip = 0
+        ticks = repeat(None) if yield_every is None else None  # the loop below then never stops
+
+        while True:
+            for _ in ticks or repeat(None, yield_every):
+                op = ops[ip]
+                arg = ops[ip + 1]
+                ip += 2
+
+                if op == LOAD_NAME:
+                    variable = get(names[arg])
+                    if not variable:
+                        details = f"{names[arg]} is not defined"
+                        return None, self.error(VariableUndefinedError, code, ip, details, context)
+                    try:
+                        push(variable.value.value)
+                    except AttributeError:  # it was set to None, by an if where no case ran
+                        push(None)
+                elif op == LOAD_CONST:
+                    push(consts[arg])
+                # loops are mostly these, so they're checked early
+                elif op == STORE_VAR or op == STORE_CONST:
+                    value = stack[-1]
+                    if set_(names[arg], None if value is None else FuseNumber(value), op == STORE_CONST):
+                        details = f"'{names[arg]}' is a constant"
+                        return None, self.error(ConstantAssignmentError, code, ip, details, context)
+                elif op == POP_TOP:
+                    pop()
+                elif op == FOR_ITER:
+                    value = next(stack[-1], done)
+                    if value is done:
+                        pop()
+                        ip = arg
+                    else:
+                        push(value)
+                elif op == JUMP:
+                    ip = arg
+                elif op == BINARY_ADD:
+                    right = pop()
+                    stack[-1] = stack[-1] + right
+                elif op == BINARY_SUB:
+                    right = pop()
+                    stack[-1] = stack[-1] - right
+                elif op == BINARY_MUL:
+                    right = pop()
+                    stack[-1] = stack[-1] * right
+                elif op == BINARY_DIV:
+                    right = pop()
+                    if right == 0:
+                        position = divisor_position if arg < 0 else arg
+                        pos_start, pos_end = code.positions[position]
+                        return None, FuseRuntimeError(pos_start, pos_end, "Division by zero", context)
+                    stack[-1] = stack[-1] / right
+                elif op == BINARY_POW:
+                    right = pop()
+                    stack[-1] = stack[-1] ** right
+                elif op == POP_JUMP_IF_FALSE:
+                    value = pop()
+                    if value == 0:
+                        ip = arg
+                    elif value is None:
+                        return None, self.not_a_number(code, ip, "the condition", context)
+                elif op == COMPARE_EQ:
+                    right = pop()
+                    stack[-1] = 1 if stack[-1] == right else 0
+                elif op == COMPARE_NEQ:
+                    right = pop()
+                    stack[-1] = 0 if stack[-1] == right else 1
+                elif op == COMPARE_LT:
+                    right = pop()
+                    stack[-1] = 1 if stack[-1] < right else 0
+                elif op == COMPARE_LTE:
+                    right = pop()
+                    stack[-1] = 0 if stack[-1] > right else 1
+                elif op == COMPARE_GT:
+                    right = pop()
+                    stack[-1] = 1 if stack[-1] > right else 0
+                elif op == COMPARE_GTE:
+                    right = pop()
+                    stack[-1] = 0 if stack[-1] < right else 1
+                elif op == JUMP_IF_FALSE_OR_KEEP:
+                    if stack[-1] == 0:
+                        stack[-1] = 0
+                        ip = arg
+                elif op == JUMP_IF_TRUE_OR_KEEP:
+                    if stack[-1] != 0:
+                        stack[-1] = 1
+                        ip = arg
+                elif op == LOGIC_AND:
+                    right = pop()
+                    stack[-1] = 1 if stack[-1] and right else 0
+                elif op == LOGIC_OR:
+                    right = pop()
+                    stack[-1] = 1 if stack[-1] or right else 0
+                elif op == LOGIC_XOR:
+                    right = pop()
+                    stack[-1] = 1 if bool(stack[-1]) + bool(right) == 1 else 0
+                elif op == UNARY_NEGATIVE:
+                    stack[-1] = stack[-1] * -1
+                elif op == UNARY_NOT:
+                    stack[-1] = 1 if stack[-1] == 0 else 0
+                elif op == GET_RANGE:
+                    step = pop()
+                    end = pop()
+                    if step == 0:
+                        details = "The step of a for loop can't be 0"
+                        return None, self.error(FuseRuntimeError, code, ip, details, context)
+                    stack[-1] = iter(FuseRange(end, stack[-1], step))
+                elif op == CHECK_NUMBER:
+                    if stack[-1] is None:
+                        return None, self.not_a_number(code, ip, number_checks[arg], context)
+                elif op == SET_POS:
+                    divisor_position = arg
+                elif op == RETURN_VALUE:
+                    value = pop()
+                    if value is None:
+                        return None, None
+                    pos_start, pos_end = code.positions[code.position]
+                    return FuseNumber(value).set_context(context).set_pos(pos_start, pos_end), None
+                else:
+                    raise Exception(f"unknown opcode {op}")
+
+            if (yield):
+                return None, self.error(EvaluationCancelledError, code, ip, "The evaluation was cancelled", context)
+
+    def error(self, error_class, code, ip, details, context):
+        """
+        Makes an error at the instruction before `ip`, or the closest one before it with a position.
+        """
+        pos_start, pos_end = self.position(code, ip)
+        return error_class(pos_start, pos_end, details, context)
+
+    def not_a_number(self, code, ip, what, context):
+        pos_start, pos_end = self.position(code, ip)
+        return not_a_number(None, pos_start, pos_end, what, context)
+
+    @staticmethod
+    def position(code, ip):
+        index = ip // 2 - 1
+        while index >= 0 and code.line_table[index] < 0:
+            index -= 1
+        return code.positions[code.line_table[index] if index >= 0 else code.position]
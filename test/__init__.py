@@ -1,8 +1,34 @@
+import asyncio
+import io
+import os
+import pickle
+import sys
+import tempfile
+import threading
 import unittest
-from core.interpreter import Interpreter, Context, SymbolTable, FuseNumber
-from core.lexer import Lexer, Token, Position
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from core.interpreter import Interpreter, Context, SymbolTable, Frame, FuseNumber, max_layers
+from core.classes.fuse_classes.number import true, false
+from core.lexer import Lexer, RegexLexer, Token, Position
 from core.parser import Parser, NumberNode, BinaryOpNode, VarAssignNode
-from core.executor import run
+from core.executor import run, run_batch, run_many, run_async, run_stream, run_file, run_compiled, save_compiled, \
+    new_symbol_table, thread_symbol_table
+from core.cache import CompileCache
+from core.profiler import Profiler, ProfilingInterpreter
+from core.budget import Budget
+from core.document import Document
+from core.resolver import Resolver
+from core import serializer
+from core.classes.fuse_classes.vector import FuseVector
+from core.classes.fuse_classes.range import FuseRange
+from core.compiler import Compiler
+from core.bytecode import BytecodeCompiler, disassemble
+from core.vm import VM
+from core.optimizer import Optimizer, ConstantFolder, DeadBranchEliminator
 
 global_symbol_table = SymbolTable()
 
@@ -43,5 +69,554 @@ class Tests(unittest.TestCase):
         out = run(context, "if true or false then 1000 else 2000")
         self.assertEqual(1000, out[0].value)
 
+    def test_compiled_assign(self):
+        lexer = Lexer("<test>", "var a = 1+(3*2)^3\nif a > 200 then a / 7 else 0")
+        parser = Parser(lexer.parse()[0])
+        context = Context("<shell>")
+        context.symbol_table = SymbolTable()
+        out, error = Compiler().compile(parser.parse().node).execute(context)
+        self.assertEqual(31, out.value)
+        self.assertEqual(217, context.symbol_table.get("a").value.value)
+    def test_compiled_errors(self):
+        for text in ("1/0", "4/(if 1 then 0 else 2)", "var x = undefined_name"):
+            self.assertEqual(repr(run("<test>", text)[1]), repr(run("<test>", text, engine="compiled")[1]))
+
+    def test_vm_deep_chain(self):
+        lexer = Lexer("<test>", "var a = 2\n" + "+".join(["a*3"] * 5000))
+        code = BytecodeCompiler().compile(Parser(lexer.parse()[0]).parse().node)
+        context = Context("<shell>")
+        context.symbol_table = SymbolTable()
+        out, error = VM().execute(code, context)
+        self.assertEqual(30000, out.value)
+        self.assertIn("BINARY_ADD", disassemble(code))
+    def test_vm_errors(self):
+        for text in ("1/0", "4/(if 1 then (if 0 then 1 else 0) else 2)", "var y = undefined_name"):
+            self.assertEqual(repr(run("<test>", text)[1]), repr(run("<test>", text, engine="vm")[1]))
+
+    def test_if_condition_not_a_number(self):
+        texts = ("if (if 0 then 1) then 2", "var x = 0\nif x then 1 elif (if x then 1) then 2 else 3",
+                 "var x = 1\nif x == 0 then 1 elif (var y = (if x == 0 then 1)) then 2")
+        for text in texts:
+            expected = run("<test>", text, cache=None)[1]
+            self.assertIn("Expected a number as the condition, not a NoneType", expected.details)
+            for engine in ("compiled", "vm"):
+                self.assertEqual(repr(expected), repr(run("<test>", text, engine, cache=None)[1]))
+
+    def test_none_operands(self):
+        texts = ("var false = 6 xor 1 xor (if false then 7)", "1 + (if 0 then 1)", "-(if 0 then 1)",
+                 "(if 0 then 1) or 1", "not (if 0 then 1)", "var x = if 0 then 1\nx + 1", "2 * (var y = if 0 then 1)",
+                 "var x = 0\nwhile x < 2 then var x = x + 1\n(while 0 then 1) and 1")
+        for text in texts:
+            expected = run("<test>", text, symbol_table=new_symbol_table(), cache=None)[1]
+            self.assertIn("not a NoneType", expected.details)
+            for engine in ("compiled", "vm"):
+                error = run("<test>", text, engine, symbol_table=new_symbol_table(), cache=None)[1]
+                self.assertEqual(repr(expected), repr(error), (text, engine))
+
+    def test_short_circuit(self):
+        for engine in ("interpreter", "compiled", "vm"):
+            symbol_table = new_symbol_table()
+            for text, expected in (("0 and undefined", false), ("2 or 1/0", true), ("0.0 or 1", true),
+                                   ("1 and (var c = 0)", false), ("0 and (var c = 1)", false)):
+                result, error = run("<test>", text, engine, symbol_table=symbol_table)
+                self.assertIsNone(error)
+                self.assertEqual(expected.value, result.value)
+            self.assertEqual(0, symbol_table.get("c").value.value)
+
+            # an error in an operand stops the operation, instead of the error being dropped
+            for text in ("undefined + 1", "1 and undefined", "(1/0) or undefined", "-undefined", "not (1/0)"):
+                self.assertEqual(repr(run("<test>", text, "compiled")[1]), repr(run("<test>", text, engine)[1]))
+
+        # vectors still work elementwise, so their right side always runs
+        if numpy is None:
+            return
+        context = Context("<test>")
+        context.symbol_table = new_symbol_table()
+        context.symbol_table.set("v", FuseVector([0, 1, 2]))
+        result = Interpreter().visit(Parser(RegexLexer("<test>", "v and 1 or 0").parse()[0]).parse().node, context)
+        self.assertEqual([0, 1, 1], result.value.value.tolist())
+
+    def test_optimizer_folding(self):
+        lexer = Lexer("<test>", "var a = 1+(3*2)^3\nif true then a else 1/0")
+        optimizer = Optimizer([ConstantFolder({"true": 1}), DeadBranchEliminator()])
+        self.assertEqual("((identifier:a, (int:217)) (identifier:a))", str(optimizer.optimize(Parser(lexer.parse()[0]).parse().node)))
+    def test_optimizer_keeps_errors(self):
+        for text in ("7/(3-3)", "10/(if true then 0 else 1)"):
+            self.assertEqual(repr(run("<test>", text)[1]), repr(run("<test>", text, optimize=True)[1]))
+
+    def test_optimizer_pruned_if_errors(self):
+        # the spans of pruned ifs and of what encloses them stay the same, so errors point at the same source
+        texts = ("var true = if 1 then 2 else 3", "const k = 1\nvar k = if 0 then 5 elif 2 then 3 else 4",
+                 "if (if 1 then (if 0 then 1) else 2) then 3", "for i = 0 to 3 step (if 1 then 0 else 1) then i",
+                 "var y = 0\n7 / (if 1 then y else 2)")
+        for text in texts:
+            for engine in ("interpreter", "compiled", "vm"):
+                expected = repr(run("<test>", text, engine, cache=None, symbol_table=new_symbol_table())[1])
+                self.assertEqual(expected, repr(run("<test>", text, engine, optimize=True, cache=None,
+                                                    symbol_table=new_symbol_table())[1]))
+
+    def test_optimizer_negative_literals(self):
+        # folded negatives have to stay grouped, e.g. in the compiled engine's python
+        for text in ("var x = 2\n(-2) ^ x", "var x = 2\n(1-3) ^ x", "var x = 0.5\n(-8) ^ x"):
+            expected = repr(run("<test>", text, symbol_table=new_symbol_table())[0])
+            for engine in ("interpreter", "compiled", "vm"):
+                self.assertEqual(expected, repr(run("<test>", text, engine, optimize=True, symbol_table=new_symbol_table())[0]))
+        result, error = run_batch("<test>", "(-2) ^ x", {"x": [2, 3]}, optimize=True, vectorize=False)
+        self.assertEqual([4, -8], result.values)
+
+    def test_regex_lex(self):
+        def dump(lexer):
+            tokens, error = lexer.parse()
+            positions = lambda token: (token.pos_start.index, token.pos_start.line, token.pos_start.column,
+                                       token.pos_end.index, token.pos_end.line, token.pos_end.column)
+            return [(repr(token), positions(token)) for token in tokens], repr(error) if error else None
+        for text in ("var a = 1+(3*2)^3\n\nif a != 2 then 1.5 elif a ~= 3 then 2. else 0\n", "a <= b >= c", "1 ! 2", "a !\nb", "1 $"):
+            self.assertEqual(dump(Lexer("<test>", text)), dump(RegexLexer("<test>", text)))
+    def test_not_equals_lex(self):
+        self.assertEqual("[int:1, neq, int:2, neq, int:3, eof]", str(RegexLexer("<test>", "1 != 2 ~= 3").parse()[0]))
+
+    def test_offset_positions(self):
+        tokens, error = RegexLexer("<test>", "1\n22 +\n").parse()
+        newline, plus, eof = tokens[1], tokens[3], tokens[-1]
+        self.assertEqual((0, 1, 0, 2), (newline.pos_start.line, newline.pos_start.column, newline.pos_end.line, newline.pos_end.column))
+        self.assertEqual("line 2, column 4", str(plus.pos_start))
+        self.assertEqual((2, 0, 2, 1), (eof.pos_start.line, eof.pos_start.column, eof.pos_end.line, eof.pos_end.column))
+        self.assertIs(tokens[0].source, eof.source)
+
+    def test_block_scaling(self):
+        # counts the work done rather than timing it, which bench.scaling does
+        def parse_and_run(count):
+            text = "\n".join(f"var a{i % 100} = {i} * 2 + 1" for i in range(count))
+            node = Parser(RegexLexer("<test>", text).parse()[0]).parse().node
+            self.assertEqual(count, len(node.statements))  # one flat block, not nested ones
+            context = Context("<shell>")
+            context.symbol_table = SymbolTable()
+            profiler = Profiler()
+            out = ProfilingInterpreter(profiler).visit(node, context)
+            return {name: entry.calls for name, entry in profiler.node_types.items()}, out.value.value
+        small, _ = parse_and_run(1000)
+        large, value = parse_and_run(4000)
+        self.assertEqual(7999, value)
+        self.assertEqual(1, large.pop("BlockNode"))
+        self.assertEqual({name: calls * 4 for name, calls in small.items() if name != "BlockNode"}, large)
+
+    def test_shared_booleans(self):
+        self.assertIs(true, run("<test>", "2 < 3")[0])
+        self.assertIs(false, run("<test>", "1 == 2 or not 4")[0])
+        self.assertEqual(1, true.set_pos(None, None).value)
+        self.assertIsNone(true.pos_start)
+        self.assertEqual("3", repr(run("<test>", "+3")[0]))
+        error = run("<test>", "var y = 0\n7 / (if 1 then y)")[1]
+        self.assertEqual("line 2, column 16", str(error.pos_start))
+
+    def test_compile_cache(self):
+        cache = CompileCache(max_entries=2)
+        for engine in ("interpreter", "compiled", "vm"):
+            self.assertEqual(9, run("a.fuse", "var q = 4\nq + 5", engine, cache=cache)[0].value)
+        self.assertEqual({"entries": 1, "hits": 2, "misses": 1, "evictions": 0}, {
+            key: value for key, value in cache.stats().items() if key != "bytes"})
+
+        for engine in ("interpreter", "compiled", "vm"):
+            run("a.fuse", "1/0", engine, cache=cache)
+            error = run("b.fuse", "1/0", engine, cache=cache)[1]
+            self.assertEqual("b.fuse", error.pos_start.filename)
+            self.assertEqual("line 1, column 3", str(error.pos_start))
+
+        run("c.fuse", "1", cache=cache)
+        run("d.fuse", "2", cache=cache)
+        self.assertEqual(2, len(cache))
+        self.assertEqual(2, cache.evictions)
+
+        # with every entry used, a new one still gets in, in place of the oldest
+        cache = CompileCache(max_entries=2)
+        for text in ("1", "2", "1", "2", "3"):
+            run("c.fuse", text, cache=cache)
+        self.assertIsNotNone(cache.get(cache.key("3", False)))
+        self.assertIsNotNone(cache.get(cache.key("2", False)))
+        self.assertIsNone(cache.get(cache.key("1", False)))
+
+    def test_profiler(self):
+        profiler = Profiler()
+        self.assertEqual(16, run("p.fuse", "var n = 2\nn * (n + 1)\nn ^ 4", profiler=profiler)[0].value)
+        self.assertEqual(3, profiler.node_types["BinaryOpNode"].calls)
+        self.assertEqual(1, profiler.node_types["BlockNode"].calls)
+        self.assertEqual({1: 2, 2: 5, 3: 3}, {line: entry.calls for (_, line), entry in profiler.lines.items()})
+        self.assertGreaterEqual(profiler.lines[("p.fuse", 2)].total, profiler.lines[("p.fuse", 2)].self_time)
+        self.assertIn("p.fuse:2  n * (n + 1)", profiler.table())
+        self.assertRaises(ValueError, run, "p.fuse", "1", "vm", profiler=profiler)
+
+    def test_quickening(self):
+        # x switches from int to float halfway, so the quickened ops on it have to go back to the generic path
+        text = "var t = 0\nvar x = 1\nfor i = 0 to 40 then var t = t + i * 3 - x / 2 + (var x = if i > 20 then 0.5 else 1)\nt"
+        profiler = Profiler()
+        result, error = run("<test>", text, symbol_table=new_symbol_table(), profiler=profiler)
+        self.assertIsNone(error)
+        self.assertGreater(profiler.quickening["int mul int"].hits, 0)
+        self.assertGreater(profiler.quickening["int div int"].misses, 0)
+        self.assertGreater(profiler.quickening_hit_rate, 0)
+        self.assertIn("quickened op", profiler.table())
+
+        Interpreter.quicken = False
+        try:
+            unquickened = Profiler()
+            unquickened_result = run("<test>", text, cache=None, symbol_table=new_symbol_table(), profiler=unquickened)
+            self.assertEqual(unquickened_result[0].value, result.value)
+        finally:
+            Interpreter.quicken = True
+        # the visits quickened ops skip are still counted
+        self.assertEqual({name: entry.calls for name, entry in unquickened.node_types.items()},
+                         {name: entry.calls for name, entry in profiler.node_types.items()})
+        self.assertEqual({key: entry.calls for key, entry in unquickened.lines.items()},
+                         {key: entry.calls for key, entry in profiler.lines.items()})
+
+    @unittest.skipUnless(numpy, "numpy isn't installed")
+    def test_vector_ops(self):
+        def evaluate(text):
+            context = Context("<test>")
+            context.symbol_table = SymbolTable()
+            context.symbol_table.set("x", FuseVector([1, 2, 3, 4]))
+            result = Interpreter().visit(Parser(RegexLexer("<test>", text).parse()[0]).parse().node, context)
+            return result.value, result.error
+
+        self.assertEqual([3, 5, 7, 9], evaluate("x * 2 + 1")[0].value.tolist())
+        self.assertEqual([9, 8, 7, 6], evaluate("10 - x")[0].value.tolist())
+        self.assertEqual([0.5, 0.25], evaluate("2 ^ -x")[0].value.tolist()[:2])
+        self.assertEqual([0, 0, 1, 0], evaluate("x > 2 and x != 4")[0].value.tolist())
+        self.assertEqual([1, 0, 0, 0], evaluate("not (x - 1)")[0].value.tolist())
+
+        error = evaluate("12 / (x - 2)")[1]
+        self.assertEqual("Division by zero in 1 of 4 elements, first at 1", error.details)
+        self.assertEqual("line 1, column 7", str(error.pos_start))
+        self.assertIn("shapes (2,) and (4,)", FuseVector([1, 2]).add(FuseVector([1, 2, 3, 4]))[1].details)
+        self.assertEqual("Expected a number as the condition, not a FuseVector", evaluate("if x then 1")[1].details)
+
+    @unittest.skipUnless(numpy, "numpy isn't installed")
+    def test_vector_engines(self):
+        # the compiled and vm engines hand programs with vectors to the interpreter
+        def evaluate(text, engine):
+            symbol_table = new_symbol_table()
+            symbol_table.set("v", FuseVector([1, 2, 3]))
+            symbol_table.set("w", FuseVector([1, 0, 2]))
+            if engine == "async":
+                result, error = asyncio.run(run_async("<test>", text, symbol_table=symbol_table))
+            else:
+                result, error = run("<test>", text, engine, symbol_table=symbol_table)
+            return None if result is None else result.value.tolist(), repr(error)
+
+        for text in ("v == 2", "v / w", "if v then 1 else 2", "v and 0", "v ^ -1", "var u = v * 2\nu + 1"):
+            expected = evaluate(text, "interpreter")
+            for engine in ("compiled", "vm", "async"):
+                self.assertEqual(expected, evaluate(text, engine), (text, engine))
+        self.assertEqual([1, 0.5, 1 / 3], evaluate("v ^ -1", "vm")[0])
+
+    @unittest.skipUnless(numpy, "numpy isn't installed")
+    def test_batch(self):
+        columns = {"x": [1, 2, 0, 4], "y": [3, 4, 5, 6]}
+        text = "var z = y - 1\nif x > 1 then 10 / (x - 2) else x * z"
+        vectorized, error = run_batch("<test>", text, columns)
+        self.assertIsNone(error)
+        self.assertTrue(vectorized.vectorized)
+        self.assertEqual([2, None, 0, 5.0], vectorized.values)
+        self.assertEqual("Division by zero", vectorized.errors[1].details)
+        self.assertEqual("line 2, column 21", str(vectorized.errors[1].pos_start))
+
+        by_row = run_batch("<test>", text, columns, vectorize=False)[0]
+        self.assertFalse(by_row.vectorized)
+        self.assertEqual(vectorized.values, by_row.values)
+        self.assertEqual([repr(error) for error in vectorized.errors], [repr(error) for error in by_row.errors])
+
+        looped = run_batch("<test>", "var t = 0\nfor i = 0 to x then var t = t + i\nt", columns)[0]
+        self.assertFalse(looped.vectorized)
+        self.assertEqual([0, 1, 0, 6], looped.values)
+        self.assertRaises(ValueError, run_batch, "<test>", "x", {"x": [1], "y": [1, 2]})
+
+        # columns numpy would turn into floats or objects run row by row instead, so the results don't change
+        columns = {"x": [2 ** 53, 1], "y": [1, 0.5], "w": [2 ** 63, -1]}
+        for text in ("x + y", "(y + 2) ^ 60", "w - 1"):
+            mixed = run_batch("<test>", text, columns)[0]
+            self.assertFalse(mixed.vectorized)
+            self.assertEqual(run_batch("<test>", text, columns, vectorize=False)[0].values, mixed.values)
+
+    def test_run_many(self):
+        jobs = [(f"job{i}.fuse", f"var x = {i}\nx * 2") for i in range(20)]
+        jobs += [("reads.fuse", "x"), ("zero.fuse", "var y = 0\n1 / y")]
+        results = list(run_many(jobs, workers=2, chunk_size=3))
+
+        self.assertEqual(list(range(22)), [result.index for result in results])
+        self.assertEqual([i * 2 for i in range(20)], [result.result.value for result in results[:20]])
+        self.assertEqual("x is not defined", results[20].error.details)  # jobs don't share variables
+
+        error = pickle.loads(pickle.dumps(results[21].error))
+        self.assertEqual("Division by zero", error.details)
+        self.assertEqual("zero.fuse", error.pos_start.filename)
+        self.assertEqual("line 2, column 5", str(error.pos_start))
+        self.assertIn("1 / y", repr(error))
+
+        unordered = run_many(jobs, workers=2, chunk_size=3, ordered=False)
+        self.assertEqual(list(range(22)), sorted(result.index for result in unordered))
+        self.assertRaises(ValueError, list, run_many(jobs, engine="vm", budget=Budget(fuel=10)))
+
+    def test_run_async(self):
+        text = "var total = 0\nfor i = 0 to 2000 then var total = total + i\ntotal"
+
+        async def main():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0)
+
+            task = asyncio.ensure_future(ticker())
+            result, error = await run_async("<test>", text, symbol_table=new_symbol_table(), yield_every=100)
+            self.assertIsNone(error)
+            self.assertEqual(1999000, result.value)
+            self.assertGreater(ticks, 10)  # the ticker kept running while the program did
+            task.cancel()
+
+            cancel = asyncio.Event()
+            cancel.set()
+            result, error = await run_async("<test>", text, symbol_table=new_symbol_table(), yield_every=100, cancel=cancel)
+            self.assertIsNone(result)
+            self.assertEqual("EvaluationCancelledError", error.key)
+            self.assertEqual(2, error.pos_start.line + 1)
+
+            with self.assertRaises(TypeError):
+                await run_async("<test>", text, yield_every=Budget(fuel=10))
+
+        asyncio.run(main())
+
+    def test_budgets(self):
+        loop = "var total = 0\nfor i = 0 to 100000 then var total = total + i\ntotal"
+
+        def run_with(text, **limits):
+            return run("<test>", text, symbol_table=new_symbol_table(), budget=Budget(**limits))
+
+        result, error = run_with(loop, fuel=1000)
+        self.assertEqual("ResourceExhaustedError", error.key)
+        self.assertEqual("Ran out of fuel after 1000 node visits", error.details)
+        self.assertIn("line 2, in <shell>", error.generate_traceback())
+        self.assertEqual("Ran out of time after 0.01s", run_with(loop, timeout=0.01)[1].details)
+
+        error = run_with("var x = 3\n1 + x ^ 999999999", max_int_bits=4096)[1]
+        self.assertEqual("The result would be more than 4096 bits long", error.details)
+        self.assertEqual("line 2, column 5", str(error.pos_start))
+        self.assertEqual("ResourceExhaustedError", run_with("var x = 2 ^ 3000\nx * x", max_int_bits=4096)[1].key)
+
+        self.assertEqual(2 ** 4000, run_with("2 ^ 4000", fuel=10, max_int_bits=4096)[0].value)
+        self.assertEqual(1, run_with("1", fuel=2)[0].value)
+        self.assertRaises(ValueError, run, "<test>", "1", engine="vm", budget=Budget(fuel=10))
+
+    def test_document(self):
+        def full(text):
+            tokens, error = RegexLexer("<test>", text).parse()
+            result = Parser(tokens).parse() if not error else None
+            return (
+                [(repr(token), str(token.pos_start), str(token.pos_end)) for token in tokens],
+                repr(error or result.error) if error or result.error else repr(result.node),
+            )
+
+        def incremental(document):
+            tokens, error = document.lex()
+            result = document.parse()
+            return (
+                [(repr(token), str(token.pos_start), str(token.pos_end)) for token in tokens],
+                repr(result.error) if result.error else repr(result.node),
+            )
+
+        text = "var x = 1\n\nvar y = x * 2\nx + y"
+        document = Document("<test>", text)
+        self.assertEqual(full(text), incremental(document))
+
+        edits = [
+            (2, 12, 2, 13, "(3 - x)", "var x = 1\n\nvar y = x * (3 - x)\nx + y"),
+            (0, 9, 1, 0, "\nvar z = 4\n", "var x = 1\nvar z = 4\n\nvar y = x * (3 - x)\nx + y"),
+            (3, 9, 3, 9, " +", "var x = 1\nvar z = 4\n\nvar y = x + * (3 - x)\nx + y"),  # a parse error
+            (4, 0, 4, 0, "$", "var x = 1\nvar z = 4\n\nvar y = x + * (3 - x)\n$x + y"),  # a lex error wins
+            (3, 9, 3, 11, "", "var x = 1\nvar z = 4\n\nvar y = x * (3 - x)\n$x + y"),
+            (3, 19, 4, 1, "", "var x = 1\nvar z = 4\n\nvar y = x * (3 - x)x + y"),
+            (3, 19, 3, 19, "\n", "var x = 1\nvar z = 4\n\nvar y = x * (3 - x)\nx + y"),
+        ]
+        for start_line, start_column, end_line, end_column, new, expected in edits:
+            document.edit(start_line, start_column, end_line, end_column, new)
+            self.assertEqual(expected, document.text)
+            self.assertEqual(full(expected), incremental(document))
+
+    def test_run_stream(self):
+        programs = [
+            "var x = 1\n\nvar y = x * 2\nif y > 1 then x + y else 0\n",
+            "var x = 1\nx + * 2",   # a parse error
+            "var x = 1\nx $ 2",     # a lex error
+            "var x = 1\nx / 0",
+        ]
+        for text in programs:
+            expected_result, expected_error = run("<test>", text, symbol_table=new_symbol_table())
+            result, error = run_stream("<test>", io.StringIO(text), symbol_table=new_symbol_table())
+            self.assertEqual(repr(expected_result), repr(result))
+            self.assertEqual(repr(expected_error), repr(error))
+
+        # statements before an error have run already
+        symbol_table = new_symbol_table()
+        result, error = run_stream("<test>", "var x = 1\nx + * 2", symbol_table=symbol_table)
+        self.assertEqual("InvalidSyntaxError", error.key)
+        self.assertEqual(1, symbol_table.get("x").value.value)
+
+    def test_run_file(self):
+        programs = [
+            "var x = 1\n\nvar y = x * 2.5\nif y > 1 then x + y else 0\n",
+            "var x = 1\n\nx + * 2",
+            "var x = 1\nx + é",  # the error shows the whole character, not its first byte
+            "var x = 1\nx !é",
+            "",
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "test.fuse")
+            for text in programs:
+                with open(path, "w", encoding="utf-8") as file:
+                    file.write(text)
+                expected_result, expected_error = run(path, text, cache=None, symbol_table=new_symbol_table())
+                result, error = run_file(path, symbol_table=new_symbol_table())
+                self.assertEqual(repr(expected_result), repr(result))
+                self.assertEqual(repr(expected_error), repr(error))
+
+    def test_compiled_files(self):
+        text = "var a = 2^70\nfor i = 0 to 3 then var a = a - 1.5\nwhile a > 10 then var a = -a\nif a < 2 then 1 elif not a then 2 else a / (a - a)"
+        node = Parser(RegexLexer("p.fuse", text).parse()[0]).parse().node
+        self.assertTrue(serializer.equivalent(node, serializer.loads(serializer.dumps(node))))
+        folded = Optimizer([ConstantFolder({})]).optimize(node)
+        self.assertTrue(serializer.equivalent(folded, serializer.loads(serializer.dumps(folded))))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "p.fusec")
+            self.assertIsNone(save_compiled(path, "p.fuse", text))
+            for engine in ("interpreter", "compiled", "vm"):
+                # the same error, shown from the saved source
+                expected = run("p.fuse", text, engine, symbol_table=new_symbol_table())
+                self.assertEqual(str(expected[1]), str(run_compiled(path, engine, symbol_table=new_symbol_table())[1]))
+
+            self.assertIsNotNone(save_compiled(path, "p.fuse", "1 +"))
+            data = serializer.dumps(node)
+            for corrupt in (b"", data[:-3], data.replace(b"FUSEC", b"FUSEX"), data[:6] + b"\xff" + data[7:]):
+                self.assertRaises(ValueError, serializer.loads, corrupt)
+
+    def test_forked_sessions(self):
+        base = new_symbol_table()
+        run("<test>", "var rate = 3\nconst limit = 10", symbol_table=base)
+        base.freeze()
+        for engine in ("interpreter", "compiled", "vm"):
+            # the assignment fails as it runs, on every engine, and a run that doesn't assign anything is left alone
+            self.assertRaises(ValueError, run, "<test>", "var rate = 4\n1/0", engine, symbol_table=base)
+            self.assertEqual("Division by zero", run("<test>", "rate / 0", engine, symbol_table=base)[1].details)
+        frame = Frame(["rate"], base.fork())
+        frame.set(0, FuseNumber(4))
+        frame.symbol_table.freeze()
+        frame.store()  # doesn't raise over the error that stopped the run
+
+        context = Context("<test>")
+        context.symbol_table = base
+        for engine in ("interpreter", "compiled", "vm"):
+            first, second = base.fork(), context.fork().symbol_table
+            self.assertEqual(4, run("<test>", "var rate = rate + 1\nrate", engine, symbol_table=first)[0].value)
+            self.assertEqual(3, run("<test>", "rate", engine, symbol_table=second)[0].value)
+            # the base's constants, and the builtin ones under it, stay constant in forks
+            self.assertIsNotNone(run("<test>", "var limit = 1", engine, symbol_table=first)[1])
+            self.assertIsNotNone(run("<test>", "var true = 0", engine, symbol_table=first)[1])
+
+        # a fork of a table that's still changing sees it as it was when forked
+        session = base.fork()
+        run("<test>", "var x = 1", symbol_table=session)
+        fork = session.fork()
+        run("<test>", "var x = 2", symbol_table=session)
+        self.assertEqual(1, run("<test>", "x", symbol_table=fork)[0].value)
+        for _ in range(20):
+            fork = fork.fork()
+            run("<test>", "var x = x + 1", symbol_table=fork)
+        self.assertEqual(21, fork.get("x").value.value)
+        self.assertLessEqual(fork.layers(), max_layers + 1)
+
+    def test_threads(self):
+        cache = CompileCache(max_entries=4)  # small, so entries get evicted while other threads use them
+        programs = [("a + 2 * 3", 13), ("if a > 5 then a - 5 else 0", 2), ("var s = 0\nfor i = 0 to a then var s = s + i\ns", 21),
+                    ("a / 2 + (a ^ 2 - 1) / 8", 9.5), ("(a == 7 and 1) or 1/0", 1), ("not (a < 3)", 1)]
+        errors = []
+
+        def work(index):
+            try:
+                symbol_table = thread_symbol_table()
+                run("<thread>", "var a = 7\nvar count = 0", symbol_table=symbol_table)
+                for step in range(60):
+                    text, expected = programs[(index + step) % len(programs)]
+                    engine = ("interpreter", "compiled", "vm")[step % 3]
+                    result, error = run("<thread>", text, engine, optimize=step % 2 == 0, cache=cache,
+                                        symbol_table=symbol_table)
+                    self.assertIsNone(error)
+                    self.assertEqual(expected, result.value)
+                    run("<thread>", "var count = count + 1", cache=cache, symbol_table=symbol_table)
+                self.assertEqual(60, symbol_table.get("count").value.value)  # no other thread's runs counted
+            except Exception as exception:
+                errors.append(exception)
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # switch threads as often as possible
+        try:
+            threads = [threading.Thread(target=work, args=(index,)) for index in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual([], errors)
+        self.assertLessEqual(len(cache), 4)
+
+    def test_resolved_slots(self):
+        node = Parser(RegexLexer("<test>", "var a = b\nfor i = 0 to a then const c = i + a\nc").parse()[0]).parse().node
+        self.assertEqual(["b", "a", "i", "c"], Resolver().resolve(node))
+        self.assertEqual(1, node.statements[0].slot)
+
+        symbol_table = new_symbol_table()
+        symbol_table.set("b", FuseNumber(3))  # a global from the host, found by name when the frame is made
+        result, error = run("<test>", "var a = b\nfor i = 0 to a then var c = i + a\nconst d = c", symbol_table=symbol_table)
+        self.assertEqual(5, result.value)
+        self.assertEqual([3, 3, 2, 5, 5], [symbol_table.get(name).value.value for name in ("b", "a", "i", "c", "d")])
+        self.assertTrue(symbol_table.get("d").constant)
+
+        # assignments before an error are still saved, and constants from earlier runs still can't be assigned
+        result, error = run("<test>", "var e = 1\nvar d = 2", symbol_table=symbol_table)
+        self.assertEqual("'d' is a constant", error.details)
+        self.assertEqual(1, symbol_table.get("e").value.value)
+
+        # a variable set to nothing is still defined, and only the interpreter needs a program resolved
+        deep = "1" + "+1" * 5000
+        for engine in ("interpreter", "compiled", "vm"):
+            self.assertEqual((None, None), run("<test>", "var x = if 0 then 1\nx", engine, cache=None))
+            if engine != "interpreter":
+                self.assertEqual(5001, run("<test>", deep, engine, cache=None)[0].value)
+        self.assertEqual(["x"], Resolver().resolve(Parser(RegexLexer("<test>", deep + "+x").parse()[0]).parse().node))
+
+    def test_loops(self):
+        programs = {
+            "var t = 0\nfor i = 0 to 10 then var t = t + i\nt": 45,
+            "var t = 0\nfor i = 10 to 0 step -2 then var t = t * 10 + i\nt": 108642,
+            "var c = 0\nfor x = 0 to 1 step 0.25 then var c = c + x\nc": 1.5,
+            "var n = 0\nwhile n < 5 then var n = n + 1\nn": 5,
+        }
+        for engine in ("interpreter", "compiled", "vm"):
+            for text, value in programs.items():
+                self.assertEqual(value, run("<test>", text, engine, cache=None)[0].value)
+            error = run("<test>", "for i = 0 to 3 step 0 then 1", engine)[1]
+            self.assertEqual("The step of a for loop can't be 0", error.details)
+            self.assertIsNone(run("<test>", "for i = 0 to 3 then i", engine)[0])
+        for text, what in (("while (if 0 then 1) then 1", "the condition"), ("for i = (if 0 then 1) to 3 then i", "the start"),
+                           ("for i = 0 to (if 0 then 1) then i", "the end"),
+                           ("for i = 0 to 3 step (if 0 then 1) then i", "the step")):
+            expected = run("<test>", text, cache=None)[1]
+            self.assertEqual(f"Expected a number as {what}, not a NoneType", expected.details)
+            for engine in ("compiled", "vm"):
+                self.assertEqual(repr(expected), repr(run("<test>", text, engine, cache=None)[1]))
+        self.assertEqual([0, 2, 4], list(FuseRange(5, 0, 2)))
+        self.assertEqual([3, 2, 1], list(FuseRange(0, 3, -1)))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file